@@ -0,0 +1,325 @@
+"""
+A tree-walker that runs as an asyncio coroutine, so many Lox programs can
+share one event loop.
+
+AsyncInterpreter.interpret_async() gives control back to the loop every
+`yield_every` statements, and whenever a native returns an awaitable (a
+native written as `async def`, such as `sleep` below). Only statements, and
+the expressions that contain a call, go through the async visitors; every
+other expression is evaluated by the ordinary, synchronous Interpreter
+methods it inherits, since it can never need to wait.
+"""
+import asyncio
+import inspect
+
+import expr as Expr
+import quickening
+import stmt as Stmt
+from environment import Environment
+from expr import Visitor as ExprVisitor
+from stmt import Visitor as StmtVisitor
+from interpreter import Interpreter
+from lox_callable import LoxCallable, LoxFunction, NativeFunction
+from return_value import Return
+from runtime_error import LoxRuntimeError
+from tokentype import TokenType
+
+DEFAULT_YIELD_EVERY = 100
+
+
+async def _sleep(seconds):
+    await asyncio.sleep(seconds)
+
+
+# natives only the async interpreter can run
+ASYNC_NATIVES = {
+    'sleep': lambda: NativeFunction('sleep', _sleep, 1),
+}
+
+
+class _CallFinder(ExprVisitor, StmtVisitor):
+    """Collects the expressions that contain a call, in statements of any depth."""
+
+    def __init__(self):
+        self.found = set()
+
+    def find(self, statements):
+        for statement in statements:
+            statement.accept(self)
+        return self.found
+
+    def visit_BlockStmt(self, stmt):
+        self.find(stmt.statements)
+
+    def visit_ExpressionStmt(self, stmt):
+        self._expr(stmt.expression)
+
+    def visit_ForStmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self._expr(stmt.condition)
+        self._expr(stmt.increment)
+        stmt.body.accept(self)
+
+    def visit_FunctionStmt(self, stmt):
+        self.find(stmt.body)
+
+    def visit_IfStmt(self, stmt):
+        self._expr(stmt.condition)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_PrintStmt(self, stmt):
+        self._expr(stmt.expression)
+
+    def visit_ReturnStmt(self, stmt):
+        self._expr(stmt.value)
+
+    def visit_VarStmt(self, stmt):
+        self._expr(stmt.initializer)
+
+    def visit_WhileStmt(self, stmt):
+        self._expr(stmt.condition)
+        stmt.body.accept(self)
+
+    def _expr(self, expr):
+        """True if `expr` contains a call."""
+        if expr is None:
+            return False
+        if expr.accept(self):
+            self.found.add(expr)
+            return True
+        return False
+
+    def visit_AssignExpr(self, expr):
+        return self._expr(expr.value)
+
+    def visit_BinaryExpr(self, expr):
+        # (no short circuit: both sides have to be visited)
+        return self._expr(expr.left) | self._expr(expr.right)
+
+    def visit_CallExpr(self, expr):
+        self._expr(expr.callee)
+        for argument in expr.arguments:
+            self._expr(argument)
+        return True
+
+    def visit_GroupingExpr(self, expr):
+        return self._expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        return False
+
+    def visit_LogicalExpr(self, expr):
+        return self._expr(expr.left) | self._expr(expr.right)
+
+    def visit_UnaryExpr(self, expr):
+        return self._expr(expr.right)
+
+    def visit_VariableExpr(self, expr):
+        return False
+
+
+def calling_expressions(statements):
+    """
+    The set of expressions in `statements` that contain a call. Interpreters
+    running the same program can share it.
+    """
+    return _CallFinder().find(statements)
+
+
+class AsyncInterpreter(Interpreter):
+    def __init__(self, yield_every=DEFAULT_YIELD_EVERY, calling=None, output=None):
+        """
+        `calling` is calling_expressions() of the program, when the caller
+        already has it; otherwise interpret_async() works it out.
+        """
+        super().__init__(output=output)
+        self.yield_every = yield_every
+        self.calling = calling
+        self._steps = 0
+
+        for name, native in ASYNC_NATIVES.items():
+            self.globals.define(name, native())
+
+        self._async_visit = {
+            Stmt.Block: self._block,
+            Stmt.Expression: self._expression_stmt,
+            Stmt.For: self._for_stmt,
+            Stmt.Function: self._function_stmt,
+            Stmt.If: self._if_stmt,
+            Stmt.Print: self._print_stmt,
+            Stmt.Return: self._return_stmt,
+            Stmt.Var: self._var_stmt,
+            Stmt.While: self._while_stmt,
+            Expr.Assign: self._assign,
+            Expr.Binary: self._binary_async,
+            Expr.Call: self._call_expr,
+            Expr.Grouping: self._grouping,
+            Expr.Logical: self._logical,
+            Expr.Unary: self._unary_async,
+        }
+        # for trees a synchronous Interpreter has already run and quickened
+        for cls in quickening.VISIT_METHODS:
+            base = Expr.Binary if issubclass(cls, Expr.Binary) else Expr.Unary
+            self._async_visit[cls] = self._async_visit[base]
+
+    async def interpret_async(self, statements):
+        """Runs `statements`; False if a runtime error stopped them."""
+        from main import run_time_error
+
+        if self.calling is None:
+            self.calling = calling_expressions(statements)
+        try:
+            for statement in statements:
+                await self._execute(statement)
+        except LoxRuntimeError as e:
+            self.output.flush()
+            run_time_error(e)
+            return False
+        finally:
+            self.output.flush()
+        return True
+
+    async def _execute(self, stmt):
+        self._steps += 1
+        if self._steps >= self.yield_every:
+            self._steps = 0
+            await asyncio.sleep(0)
+        await self._async_visit[stmt.__class__](stmt)
+
+    async def _execute_block(self, statements, environment):
+        previous_environment = self.environment
+        try:
+            self.environment = environment
+            for statement in statements:
+                await self._execute(statement)
+        finally:
+            self.environment = previous_environment
+
+    async def _eval(self, expr):
+        if expr in self.calling:
+            return await self._async_visit[expr.__class__](expr)
+        return self._visit[expr.__class__](expr)
+
+    # -- statements -----------------------------------------------------
+
+    async def _block(self, stmt):
+        if not stmt.scope_size:
+            for statement in stmt.statements:
+                await self._execute(statement)
+        else:
+            await self._execute_block(stmt.statements, Environment(self.environment, stmt.scope_size))
+
+    async def _expression_stmt(self, stmt):
+        await self._eval(stmt.expression)
+
+    async def _for_stmt(self, stmt):
+        previous_environment = self.environment
+        try:
+            if stmt.scope_size:
+                self.environment = Environment(self.environment, stmt.scope_size)
+            if stmt.initializer is not None:
+                await self._execute(stmt.initializer)
+            while self._is_truthy(await self._eval(stmt.condition)):
+                await self._execute(stmt.body)
+                if stmt.increment is not None:
+                    await self._eval(stmt.increment)
+        finally:
+            self.environment = previous_environment
+
+    async def _function_stmt(self, stmt):
+        self.visit_FunctionStmt(stmt)
+
+    async def _if_stmt(self, stmt):
+        if self._is_truthy(await self._eval(stmt.condition)):
+            await self._execute(stmt.then_branch)
+        elif stmt.else_branch is not None:
+            await self._execute(stmt.else_branch)
+
+    async def _print_stmt(self, stmt):
+        value = await self._eval(stmt.expression)
+        self.output.write_line(self._stringify(value))
+
+    async def _return_stmt(self, stmt):
+        value = None
+        if stmt.value is not None:
+            value = await self._eval(stmt.value)
+        raise Return(value)
+
+    async def _var_stmt(self, stmt):
+        value = None
+        if stmt.initializer is not None:
+            value = await self._eval(stmt.initializer)
+        self._define(stmt, value)
+
+    async def _while_stmt(self, stmt):
+        condition, body = stmt.condition, stmt.body
+        while self._is_truthy(await self._eval(condition)):
+            await self._execute(body)
+
+    # -- expressions that contain a call --------------------------------
+
+    async def _assign(self, expr):
+        value = await self._eval(expr.value)
+
+        if expr.depth is None:
+            self.globals.assign(expr.name, value)
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
+        return value
+
+    async def _binary_async(self, expr):
+        left = await self._eval(expr.left)
+        right = await self._eval(expr.right)
+        return self._binary(expr, left, right)
+
+    async def _grouping(self, expr):
+        return await self._eval(expr.expression)
+
+    async def _logical(self, expr):
+        left = await self._eval(expr.left)
+
+        if expr.operator.type == TokenType.OR:
+            if self._is_truthy(left):
+                return left
+        else:
+            if not self._is_truthy(left):
+                return left
+
+        return await self._eval(expr.right)
+
+    async def _unary_async(self, expr):
+        return self._unary(expr, await self._eval(expr.right))
+
+    async def _call_expr(self, expr):
+        callee = await self._eval(expr.callee)
+        arguments = [await self._eval(argument) for argument in expr.arguments]
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+            )
+
+        try:
+            if isinstance(callee, LoxFunction):
+                return await self._call_function(callee, arguments)
+            value = callee.call(self, arguments)
+            if inspect.isawaitable(value):
+                value = await value
+            return value
+        except RecursionError:
+            raise LoxRuntimeError(expr.paren, "Stack overflow.")
+
+    async def _call_function(self, function, arguments):
+        env = Environment(function.closure, function.declaration.scope_size)
+        env.values[:len(arguments)] = arguments
+
+        try:
+            await self._execute_block(function.declaration.body, env)
+        except Return as return_value:
+            return return_value.value
+        return None
@@ -0,0 +1,123 @@
+"""
+Runs many Lox scripts across a pool of worker processes, for
+`main.py --batch`. Each worker imports the interpreter once and runs a tiny
+program before taking work, so no script pays for start-up.
+
+Every script runs with fresh error flags and its own captured stdout and
+stderr, and its result comes back as a ScriptResult. Results are printed in
+the order the scripts were given, followed by a summary on stderr.
+"""
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+
+OK = 'ok'
+COMPILE_ERROR = 'compile error'
+RUNTIME_ERROR = 'runtime error'
+CRASHED = 'crashed'
+
+_WARM_UP = "fun f(n) { return n + 1; } var x = f(1);"
+
+
+class ScriptResult():
+    def __init__(self, path, status, stdout, stderr, seconds):
+        self.path = path
+        self.status = status
+        self.stdout = stdout
+        self.stderr = stderr
+        self.seconds = seconds
+
+
+def expand(patterns):
+    """Script paths for file names, glob patterns and directories (every .lox below them)."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '**', '*.lox'), recursive=True))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        paths.extend(matches)
+    return paths
+
+
+def _reset():
+    main.hasError = False
+    main.hasRuntimeError = False
+
+
+def _warm_up(options):
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        main.run(_WARM_UP, **options)
+    _reset()
+
+
+def run_script(path, options):
+    _reset()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            main.run_file(path, **options)
+        except Exception:
+            # the interpreter itself failed (or the file could not be read)
+            traceback.print_exc()
+            status = CRASHED
+        else:
+            if main.hasError:
+                status = COMPILE_ERROR
+            elif main.hasRuntimeError:
+                status = RUNTIME_ERROR
+            else:
+                status = OK
+    seconds = time.perf_counter() - start
+    _reset()
+    return ScriptResult(path, status, stdout.getvalue(), stderr.getvalue(), seconds)
+
+
+def run_batch(paths, jobs=None, out=sys.stdout, err=sys.stderr, **options):
+    """
+    Runs `paths` on `jobs` worker processes (default: one per CPU), passing
+    `options` on to main.run_file, and writes each script's output to `out`
+    and the summary to `err`. Returns the results, in the order of `paths`.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    # (the options only run_file knows about)
+    run_options = {name: value for name, value in options.items() if name not in ('cache', 'map_source')}
+    # many small scripts are dominated by the cost of handing each to a
+    # worker, so hand them out a few at a time
+    chunksize = max(1, len(paths) // (jobs * 8))
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs, initializer=_warm_up, initargs=(run_options,)) as executor:
+        for result in executor.map(run_script, paths, [options] * len(paths), chunksize=chunksize):
+            out.write("==> {} <==\n".format(result.path))
+            out.write(result.stdout)
+            out.flush()
+            err.write(result.stderr)
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    report(results, elapsed, jobs, err)
+    return results
+
+
+def report(results, elapsed, jobs, err):
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+
+    err.write("ran {} scripts in {:.2f} s ({:.1f} scripts/s) on {} workers: {}\n".format(
+        len(results), elapsed, len(results) / elapsed if elapsed else 0.0, jobs,
+        ", ".join("{} {}".format(counts[status], status)
+                  for status in (OK, COMPILE_ERROR, RUNTIME_ERROR, CRASHED) if status in counts)))
+    for result in results:
+        if result.status != OK:
+            err.write("  {}: {}\n".format(result.path, result.status))
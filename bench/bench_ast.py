@@ -0,0 +1,107 @@
+"""
+Compares the AST node classes emitted by tool/generate_ast.py: plain classes
+with a per-instance __dict__ (--plain) against __slots__ classes, and walking
+a tree through accept() against the generated dispatch table.
+
+Each class variant runs in a child process, with the plain modules generated
+into a temporary directory that shadows the repository's expr.py and stmt.py.
+
+Run from the repository root:  python bench/bench_ast.py [statements]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, '..')
+
+LOOPS = """
+var total = 0;
+for (var i = 0; i < 150; i = i + 1) {
+  for (var j = 0; j < 150; j = j + 1) {
+    if (i > j) total = total + i * j - j; else total = total - 1;
+  }
+}
+print total;
+"""
+
+
+def child(statements):
+    import tracemalloc
+
+    # before bench_backends, which puts the repository first on sys.path
+    import expr
+    import stmt
+
+    from bench_backends import best_of, parse
+    from bench_stream import generate
+    from interpreter import Interpreter
+
+    source = generate(statements)
+    start = time.perf_counter()
+    parse(source)
+    parse_time = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    program = parse(source)
+    ast_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    loops = parse(LOOPS)
+    run_time = best_of(3, lambda: Interpreter().interpret(loops))
+    print('__slots__' in vars(expr.Binary), ast_bytes, parse_time, run_time)
+
+
+def measure(path, statements):
+    code = "import sys; sys.path[:0] = {!r}; import bench_ast; bench_ast.child({!r})".format(
+        path, statements)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    slots, ast_bytes, parse_time, run_time = output.stdout.split()
+    return slots == 'True', int(ast_bytes), float(parse_time), float(run_time)
+
+
+def compare_dispatch(statements):
+    sys.path.insert(0, ROOT)
+    import expr as Expr
+    import stmt as Stmt
+    from bench_backends import parse
+    from bench_stream import generate
+    from optimizer import NodeCounter
+
+    class TableCounter(NodeCounter):
+        def __init__(self):
+            self.visit = {**Expr.dispatch_table(self), **Stmt.dispatch_table(self)}
+
+        def count(self, statements):
+            visit = self.visit
+            return sum(visit[statement.__class__](statement) for statement in statements)
+
+        def _count(self, *nodes):
+            visit = self.visit
+            return sum(visit[node.__class__](node) for node in nodes if node is not None)
+
+    program = parse(generate(statements))
+    for label, counter in (("accept()", NodeCounter()), ("dispatch table", TableCounter())):
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            counter.count(program)
+            best = min(best, time.perf_counter() - start)
+        print("walk via {:<15} {:6.1f} ms".format(label, best * 1000))
+
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print("{} generated statements; run time is a nested loop".format(statements))
+    with tempfile.TemporaryDirectory() as plain_dir:
+        subprocess.run([sys.executable, 'generate_ast.py', plain_dir, '--plain'],
+                       cwd=os.path.join(ROOT, 'tool'), check=True)
+        for label, path in (("plain", [plain_dir, ROOT, BENCH]), ("__slots__", [ROOT, BENCH])):
+            slots, ast_bytes, parse_time, run_time = measure(path, statements)
+            assert slots == (label == "__slots__")
+            print("{:<10} AST {:6.1f} MB  parse {:5.2f} s  run {:6.1f} ms".format(
+                label, ast_bytes / 1e6, parse_time, run_time * 1000))
+    compare_dispatch(statements)
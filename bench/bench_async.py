@@ -0,0 +1,97 @@
+"""
+Runs many Lox programs at once on one asyncio event loop (see
+async_interpreter) and reports programs per second and scheduling latency:
+how late a 1 ms timer on the same loop fires while the programs run.
+
+CPU-bound programs are run with several `yield_every` settings, next to the
+plain Interpreter running them one after another; I/O-bound programs spend
+their time in the `sleep` native.
+
+Run from the repository root:  python bench/bench_async.py [programs]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from async_interpreter import AsyncInterpreter, calling_expressions
+from bench_backends import parse
+from interpreter import Interpreter
+
+CPU_BOUND = """
+fun step(x) { return x * 2 + 1; }
+var total = 0;
+for (var i = 0; i < 300; i = i + 1) {
+  total = total + step(i);
+}
+print total;
+"""
+
+IO_BOUND = """
+var total = 0;
+for (var i = 0; i < 5; i = i + 1) {
+  sleep(0.01);
+  total = total + i;
+}
+print total;
+"""
+
+TICK = 0.001
+
+
+async def _monitor(lags, done):
+    loop = asyncio.get_running_loop()
+    while not done.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - start - TICK)
+
+
+async def _run_all(statements, count, yield_every):
+    calling = calling_expressions(statements)
+    lags, done = [], asyncio.Event()
+    monitor = asyncio.create_task(_monitor(lags, done))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(AsyncInterpreter(yield_every, calling).interpret_async(statements)
+                           for _ in range(count)))
+    elapsed = time.perf_counter() - start
+
+    done.set()
+    await monitor
+    return elapsed, sorted(lags)
+
+
+def report(label, count, elapsed, lags=None):
+    line = "{:<26} {:7.0f} programs/s".format(label, count / elapsed)
+    if lags:
+        line += "  timer lag p50 {:6.1f} ms  p99 {:6.1f} ms  max {:6.1f} ms".format(
+            lags[len(lags) // 2] * 1000, lags[int(len(lags) * 0.99)] * 1000, lags[-1] * 1000)
+    print(line)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with contextlib.redirect_stdout(io.StringIO()):
+        statements = parse(CPU_BOUND)
+        start = time.perf_counter()
+        for _ in range(count):
+            Interpreter().interpret(statements)
+        sequential = time.perf_counter() - start
+        cpu = {yield_every: asyncio.run(_run_all(statements, count, yield_every))
+               for yield_every in (10, 100, 1000)}
+
+        io_count = count * 5
+        io_elapsed, io_lags = asyncio.run(_run_all(parse(IO_BOUND), io_count, 100))
+
+    print("{} CPU-bound programs".format(count))
+    report("Interpreter, one by one", count, sequential)
+    for yield_every, (elapsed, lags) in cpu.items():
+        report("async, yield_every={}".format(yield_every), count, elapsed, lags)
+    print("{} I/O-bound programs (5 x sleep(0.01) each)".format(io_count))
+    report("async, yield_every=100", io_count, io_elapsed, io_lags)
@@ -0,0 +1,90 @@
+"""
+Compares the execution backends (tree-walker, closure compiler, bytecode VM,
+Python transpiler) on loop- and call-heavy programs.
+
+Run from the repository root:  python bench/bench_backends.py [repeat]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from compiler import Compiler
+from interpreter import Interpreter
+from parse import Parser
+from resolver import Resolver
+from scanner import Scanner
+from vm import VM
+import transpiler
+
+LOOPS = """
+var total = 0;
+for (var i = 0; i < 200; i = i + 1) {
+  for (var j = 0; j < 200; j = j + 1) {
+    total = total + i * j - j;
+  }
+}
+print total;
+"""
+
+CALLS = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(20);
+"""
+
+HELPERS = """
+fun square(x) { return x * x; }
+fun add(a, b) { return a + b; }
+var sum = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  sum = add(sum, square(i));
+}
+print sum;
+"""
+
+WORKLOADS = [("loops", LOOPS), ("fib", CALLS), ("helper calls", HELPERS)]
+
+
+def _fail(*args):
+    raise SystemExit("benchmark script failed to compile: {}".format(args))
+
+
+def parse(source):
+    statements = Parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    Resolver(_fail).resolve(statements)
+    return statements
+
+
+def best_of(repeat, run):
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        statements = parse(source)
+        function = Compiler(_fail).compile(statements)
+        code = transpiler.compile_program(statements)
+        timings = [
+            ("tree", best_of(repeat, lambda: Interpreter().interpret(statements))),
+            ("closure", best_of(repeat, lambda: Interpreter(compile_closures=True).interpret(statements))),
+            ("vm", best_of(repeat, lambda: VM().interpret(function))),
+            ("python", best_of(repeat, lambda: transpiler.execute(code))),
+        ]
+        tree = timings[0][1]
+        print("{:<14}".format(label) + "".join(
+            "  {} {:7.1f} ms ({:.2f}x)".format(name, timing * 1000, tree / timing)
+            for name, timing in timings))
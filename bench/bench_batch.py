@@ -0,0 +1,51 @@
+"""
+Compares running a batch of small Lox scripts one `main.py` process at a
+time with a single `main.py --batch` over the whole batch.
+
+Run from the repository root:  python bench/bench_batch.py [scripts] [jobs]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MAIN = os.path.join(ROOT, 'main.py')
+
+SCRIPT = """
+fun square(x) {{ return x * x; }}
+var total = 0;
+for (var i = 0; i < {}; i = i + 1) {{
+  total = total + square(i);
+}}
+print total;
+"""
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    jobs = sys.argv[2] if len(sys.argv) > 2 else str(os.cpu_count() or 1)
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(count):
+            paths.append(os.path.join(directory, 'script{}.lox'.format(i)))
+            with open(paths[-1], 'w') as f:
+                f.write(SCRIPT.format(100 + i))
+
+        start = time.perf_counter()
+        for path in paths:
+            subprocess.run([sys.executable, MAIN, '--no-cache', path], stdout=subprocess.DEVNULL, check=True)
+        one_by_one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, '--no-cache', '--batch', '--jobs', jobs, directory],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        batched = time.perf_counter() - start
+
+        print("{} scripts  one process each {:6.2f} s ({:6.1f}/s)  --batch --jobs {} {:6.2f} s ({:6.1f}/s)".format(
+            count, one_by_one, count / one_by_one, jobs, batched, count / batched))
+    finally:
+        shutil.rmtree(directory)
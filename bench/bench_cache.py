@@ -0,0 +1,60 @@
+"""
+Cold-start versus warm-start latency of `python main.py script` with the
+.loxc cache (and, on the python backend, the .loxpyc one): cold runs delete
+the caches first, warm runs reuse them. Both are compared with --no-cache.
+
+Run from the repository root:  python bench/bench_cache.py [statements] [repeat]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(BENCH, '..', 'main.py')
+
+sys.path.insert(0, BENCH)
+
+from bench_stream import generate
+
+
+def latency(script, args, repeat, before=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN] + args + [script], stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, 'generated.lox')
+        cache = os.path.join(directory, 'generated.loxc')
+        code_cache = os.path.join(directory, 'generated.loxpyc')
+        with open(script, 'w') as f:
+            f.write(generate(statements))
+
+        def remove_cache():
+            for path in (cache, code_cache):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        def cache_size():
+            return sum(os.path.getsize(path) for path in (cache, code_cache) if os.path.exists(path))
+
+        print("{} statements, {:.1f} MB of source".format(statements, os.path.getsize(script) / 1e6))
+        for label, args in (("tree", []), ("tree -O", ['-O']), ("vm", ['--backend=vm']),
+                            ("python", ['--backend=python'])):
+            remove_cache()
+            no_cache = latency(script, args + ['--no-cache'], repeat)
+            cold = latency(script, args, repeat, before=remove_cache)
+            warm = latency(script, args, repeat)
+            print("{:<8} no cache {:6.2f} s  cold {:6.2f} s  warm {:6.2f} s ({:.2f}x)  cache {:.1f} MB".format(
+                label, no_cache, cold, warm, no_cache / warm, cache_size() / 1e6))
@@ -0,0 +1,89 @@
+"""
+Compares `for` loops run as For nodes (a counting loop where possible, see
+quickening.counting_loop) with the Block/While/Expression statements the
+parser used to desugar them into.
+
+Run from the repository root:  python bench/bench_for.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import expr as Expr
+import stmt as Stmt
+from bench_backends import LOOPS, _fail, best_of
+from interpreter import Interpreter
+from parse import Parser
+from resolver import Resolver
+from scanner import Scanner
+from tokentype import TokenType
+
+COUNTING = """
+var total = 0;
+for (var i = 0; i < 100000; i = i + 1) {
+  total = total + i;
+}
+print total;
+"""
+
+# `<=` and a doubling step are not counting loops, but still run as For nodes
+GENERIC = """
+var total = 0;
+for (var round = 0; round <= 2000; round = round + 1) {
+  for (var i = 1; i <= 1000000; i = i * 2) {
+    total = total + 1;
+  }
+}
+print total;
+"""
+
+WORKLOADS = [("nested loops", LOOPS), ("counting", COUNTING), ("generic", GENERIC)]
+
+
+class DesugaringParser(Parser):
+    """Parses `for` into a While, as before For nodes."""
+
+    def for_statement(self):
+        self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
+        if self.match(TokenType.SEMICOLON):
+            initializer = None
+        elif self.match(TokenType.VAR):
+            initializer = self.var_declaration()
+        else:
+            initializer = self.expression_statement()
+
+        condition = None
+        if not self.check(TokenType.SEMICOLON):
+            condition = self.expression()
+        self.consume(TokenType.SEMICOLON, "Expect ';' after loop condition.")
+
+        increment = None
+        if not self.check(TokenType.RIGHT_PAREN):
+            increment = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+
+        body = self.statement()
+        if increment is not None:
+            body = Stmt.Block([body, Stmt.Expression(increment)])
+        body = Stmt.While(Expr.Literal(True) if condition is None else condition, body)
+        if initializer is not None:
+            body = Stmt.Block([initializer, body])
+        return body
+
+
+def parse(source, parser):
+    statements = parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    Resolver(_fail).resolve(statements)
+    return statements
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        desugared = parse(source, DesugaringParser)
+        loops = parse(source, Parser)
+        before = best_of(repeat, lambda: Interpreter().interpret(desugared))
+        after = best_of(repeat, lambda: Interpreter().interpret(loops))
+        print("{:<13} while {:7.1f} ms  for {:7.1f} ms ({:.2f}x)".format(
+            label, before * 1000, after * 1000, before / after))
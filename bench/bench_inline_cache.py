@@ -0,0 +1,62 @@
+"""
+Measures the call-site inline caches in Interpreter.visit_CallExpr against
+the previous uncached call path, on recursive fib and on loops calling
+small helpers.
+
+Run from the repository root:  python bench/bench_inline_cache.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import CALLS, HELPERS, best_of, parse
+from interpreter import Interpreter
+from lox_callable import LoxCallable
+from runtime_error import LoxRuntimeError
+
+CLOSURES = """
+fun make_adder(n) {
+  fun add(x) { return x + n; }
+  return add;
+}
+var add = make_adder(3);
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  total = add(total);
+}
+print total;
+"""
+
+WORKLOADS = [("fib", CALLS), ("helper calls", HELPERS), ("local closure", CLOSURES)]
+
+
+class UncachedInterpreter(Interpreter):
+    """The call path before inline caches."""
+
+    def visit_CallExpr(self, expr):
+        callee = self._evaluate(expr.callee)
+        arguments = [self._evaluate(arg) for arg in expr.arguments]
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+            )
+
+        return callee.call(self, arguments)
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        # sharing one tree is fine: caches filled by one interpreter never
+        # validate against another's globals
+        statements = parse(source)
+        uncached = best_of(repeat, lambda: UncachedInterpreter().interpret(statements))
+        cached = best_of(repeat, lambda: Interpreter().interpret(statements))
+        print("{:<14} uncached {:7.1f} ms  cached {:7.1f} ms ({:.2f}x)".format(
+            label, uncached * 1000, cached * 1000, uncached / cached))
@@ -0,0 +1,36 @@
+"""
+Compares the tree-walker with and without --jit (compiling hot functions and
+loops to Python, see jit) on loop- and call-heavy programs. Every --jit run
+starts cold, so its time includes counting, compiling and the walked runs
+before the threshold; the compile time of the last run is shown apart.
+
+Run from the repository root:  python bench/bench_jit.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import CALLS, HELPERS, LOOPS, best_of, parse
+from interpreter import Interpreter
+from jit import Jit
+
+WORKLOADS = [("loops", LOOPS), ("fib", CALLS), ("helper calls", HELPERS)]
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        statements = parse(source)
+        walked = best_of(repeat, lambda: Interpreter().interpret(statements))
+        jits = []
+
+        def tiered():
+            jits.append(Jit())
+            Interpreter(jit=jits[-1]).interpret(statements)
+
+        compiled = best_of(repeat, tiered)
+        compiling = sum(tier.seconds for tier in jits[-1].tiers.values())
+        print("{:<13} tree {:7.1f} ms  jit {:7.1f} ms ({:.2f}x), {:.1f} ms of it compiling".format(
+            label, walked * 1000, compiled * 1000, walked / compiled, compiling * 1000))
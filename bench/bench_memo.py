@@ -0,0 +1,63 @@
+"""
+Measures memoization of pure functions (see memo and purity): recursive
+fib, and a loop calling small numeric helpers with few distinct arguments,
+with and without a memo; plus what the purity analysis itself costs.
+
+Run from the repository root:  python bench/bench_memo.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import best_of, parse
+from bench_stream import generate
+from interpreter import GLOBALS, Interpreter
+from memo import Memo
+from purity import PurityAnalyzer
+
+FIB = """
+fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 1) + fib(n - 2);
+}
+print fib(22);
+"""
+
+HELPERS = """
+fun square(x) { return x * x; }
+fun poly(x) { return square(x) * 3 + square(x + 1) - x; }
+var sum = 0;
+var x = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  sum = sum + poly(x);
+  x = x + 1;
+  if (x == 50) x = 0;
+}
+print sum;
+"""
+
+WORKLOADS = [("fib", FIB), ("helper calls", HELPERS)]
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        statements = parse(source)
+        PurityAnalyzer(GLOBALS).analyze(statements)
+        plain = best_of(repeat, lambda: Interpreter().interpret(statements))
+        memos = []
+
+        def memoized():
+            memos.append(Memo())
+            Interpreter(memo=memos[-1]).interpret(statements)
+        memoized_time = best_of(repeat, memoized)
+        hits = sum(stats[0] for stats in memos[-1].stats.values())
+        misses = sum(stats[1] for stats in memos[-1].stats.values())
+        print("{:<13} plain {:8.1f} ms  memoized {:7.1f} ms ({:.1f}x)  {} hits, {} misses".format(
+            label, plain * 1000, memoized_time * 1000, plain / memoized_time, hits, misses))
+
+    statements = parse(generate(20000))
+    analysis = best_of(repeat, lambda: PurityAnalyzer(GLOBALS).analyze(statements))
+    print("purity analysis of a 20000 statement script: {:.1f} ms".format(analysis * 1000))
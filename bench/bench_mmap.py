@@ -0,0 +1,72 @@
+"""
+Scans a large generated script read into a str (Scanner) and from an mmap of
+its bytes (ByteScanner, as with --mmap), reporting the time and the peak of
+Python allocations. Tokens are either consumed one at a time, as with
+--stream, or all kept in a list.
+
+Run from the repository root:  python bench/bench_mmap.py [statements] [repeat]
+"""
+import collections
+import mmap
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_stream import generate
+from scanner import ByteScanner, Scanner
+
+
+def _fail(line, message):
+    raise AssertionError("[line {}] {}".format(line, message))
+
+
+def read_str(path):
+    with open(path) as f:
+        return Scanner(f.read(), _fail)
+
+
+def read_mmap(path):
+    with open(path, 'rb') as f:
+        return ByteScanner(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), _fail)
+
+
+def stream(scanner):
+    collections.deque(scanner.iter_tokens(), maxlen=0)
+
+
+def keep(scanner):
+    return scanner.scan_tokens()
+
+
+def measure(path, read, consume, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        consume(read(path))
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    tokens = consume(read(path))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tokens
+    return best, peak
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.NamedTemporaryFile('w', suffix='.lox', delete=False) as f:
+        f.write(generate(count))
+    try:
+        print("{} statements, {:.1f} MB of source".format(count, os.path.getsize(f.name) / 1e6))
+        for mode, consume in (("stream", stream), ("list", keep)):
+            for name, read in (("str", read_str), ("mmap", read_mmap)):
+                seconds, peak = measure(f.name, read, consume, repeat)
+                print("{:<6} {:<4}  {:7.3f} s  peak {:7.1f} MB".format(mode, name, seconds, peak / 1e6))
+    finally:
+        os.unlink(f.name)
@@ -0,0 +1,60 @@
+"""
+Compares the tree-walker with and without the optimizer pass on loops full
+of constant subexpressions, the shape of our generated scripts.
+
+Run from the repository root:  python bench/bench_optimizer.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import _fail, best_of
+from interpreter import Interpreter
+from optimizer import NodeCounter, Optimizer
+from parse import Parser
+from resolver import Resolver
+from scanner import Scanner
+
+CONSTANTS = """
+var total = 0;
+var debug = false;
+for (var i = 0; i < 20000; i = i + 1) {
+  total = total + (60 * 60 * 24) / (2 + 2) * 1;
+  if (debug and i > 0) print "iteration";
+  if (1 < 2) { total = total - (1 + 1); }
+  while (false) print "never";
+}
+print total;
+"""
+
+LABELS = """
+var s = "";
+for (var i = 0; i < 5000; i = i + 1) {
+  s = "prefix-" + "-" + "suffix";
+  if (!!(i < 0)) print s;
+}
+print s;
+"""
+
+WORKLOADS = [("constants", CONSTANTS), ("strings", LABELS)]
+
+
+def parse(source, optimize):
+    statements = Parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    if optimize:
+        statements = Optimizer().optimize(statements)
+    Resolver(_fail).resolve(statements)
+    return statements
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        plain = parse(source, False)
+        optimized = parse(source, True)
+        before = best_of(repeat, lambda: Interpreter().interpret(plain))
+        after = best_of(repeat, lambda: Interpreter().interpret(optimized))
+        print("{:<10}  nodes {:4} -> {:4}  {:7.1f} ms -> {:7.1f} ms ({:.2f}x)".format(
+            label, NodeCounter().count(plain), NodeCounter().count(optimized),
+            before * 1000, after * 1000, before / after))
@@ -0,0 +1,56 @@
+"""
+Runs a print-heavy script with stdout going to /dev/null (block-buffered,
+like a pipe), printing through one print() call per Lox `print`, as before
+output sinks, and through an output.OutputSink with each flush policy.
+
+Run from the repository root:  python bench/bench_output.py [repeat]
+"""
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import best_of, parse
+from interpreter import Interpreter
+from output import FLUSH_POLICIES, OutputSink
+
+
+REPORT = """
+for (var i = 0; i < {lines}; i = i + 1) {{
+  print "id";
+  print i;
+  print "name";
+  print "widget";
+  print "price";
+  print i * 2.5;
+  print "in stock";
+  print true;
+}}
+"""
+
+
+class PrintInterpreter(Interpreter):
+    """Prints each line with its own print() call."""
+
+    def visit_PrintStmt(self, stmt):
+        print(self._stringify(self._evaluate(stmt.expression)))
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for lines in (2000, 10000):
+            statements = parse(REPORT.format(lines=lines))
+            timings = [("print()", best_of(repeat, lambda: PrintInterpreter().interpret(statements)))]
+            for policy in FLUSH_POLICIES:
+                timings.append((policy, best_of(
+                    repeat, lambda: Interpreter(output=OutputSink(flush=policy)).interpret(statements))))
+            results.append((lines * 8, timings))
+
+    for count, timings in results:
+        baseline = timings[0][1]
+        print("{:>6} lines  ".format(count) + "  ".join(
+            "{} {:7.1f} ms ({:.2f}x)".format(name, seconds * 1000, baseline / seconds)
+            for name, seconds in timings))
@@ -0,0 +1,26 @@
+"""
+Measures what `--profile` costs: the plain Interpreter against the
+ProfilingInterpreter on the backend benchmarks. The plain Interpreter is not
+touched by the profiler, so the first column is also the cost with it off.
+
+Run from the repository root:  python bench/bench_profiler.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import WORKLOADS, best_of, parse
+from interpreter import Interpreter
+from profiler import ProfilingInterpreter
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        statements = parse(source)
+        plain = best_of(repeat, lambda: Interpreter().interpret(statements))
+        profiled = best_of(repeat, lambda: ProfilingInterpreter().interpret(statements))
+        print("{:<14} plain {:7.1f} ms  profiled {:7.1f} ms ({:.2f}x slower)".format(
+            label, plain * 1000, profiled * 1000, profiled / plain))
@@ -0,0 +1,58 @@
+"""
+Measures the latency of prompt inputs: run() per input, which builds a new
+Interpreter every time (as the prompt used to), against run_prompt's one
+session, which compiles each distinct input once. Inputs are self-contained
+so both give the same output; "distinct" never repeats one, "repeated"
+cycles through a few, as when timing a snippet over and over.
+
+Run from the repository root:  python bench/bench_prompt.py [inputs] [repeat]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+
+SNIPPET = "var x{0} = {0}; for (var i = 0; i < 10; i = i + 1) x{0} = x{0} + i; print x{0};"
+
+
+def per_input(run, inputs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run(inputs)
+            best = min(best, time.perf_counter() - start)
+    return best / len(inputs)
+
+
+def one_run_each(inputs):
+    for source in inputs:
+        main.run(source)
+
+
+def session(inputs):
+    lines = iter(inputs)
+
+    def read(prompt):
+        for line in lines:
+            return line
+        raise EOFError()
+
+    main.run_prompt(read=read)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    workloads = [("distinct", [SNIPPET.format(n) for n in range(count)]),
+                 ("repeated", [SNIPPET.format(n % 5) for n in range(count)])]
+    for label, inputs in workloads:
+        before = per_input(one_run_each, inputs, repeat)
+        after = per_input(session, inputs, repeat)
+        print("{:<9} run() {:7.1f} us/input  session {:7.1f} us/input ({:.2f}x)".format(
+            label, before * 1e6, after * 1e6, before / after))
@@ -0,0 +1,51 @@
+"""
+Measures quickened Binary and Unary nodes (see quickening) against the
+generic operator path they replace, on arithmetic-heavy loops.
+
+Run from the repository root:  python bench/bench_quickening.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import CALLS, LOOPS, best_of, parse
+from interpreter import Interpreter
+
+ARITHMETIC = """
+var x = 0;
+var y = 1;
+var i = 0;
+while (i < 30000) {
+  x = (x + i * 3 - y) / 2;
+  y = -y;
+  if (x >= 1000 and !(y == 1)) x = x - 1000;
+  i = i + 1;
+}
+print x;
+"""
+
+WORKLOADS = [("loops", LOOPS), ("arithmetic", ARITHMETIC), ("fib", CALLS)]
+
+
+class GenericInterpreter(Interpreter):
+    """Never specializes: every operator takes the generic path."""
+
+    def visit_BinaryExpr(self, expr):
+        return self.visit_GenericBinaryExpr(expr)
+
+    def visit_UnaryExpr(self, expr):
+        return self.visit_GenericUnaryExpr(expr)
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        # separate trees, since quickening rewrites the nodes it runs
+        generic_statements = parse(source)
+        quickened_statements = parse(source)
+        generic = best_of(repeat, lambda: GenericInterpreter().interpret(generic_statements))
+        quickened = best_of(repeat, lambda: Interpreter().interpret(quickened_statements))
+        print("{:<12} generic {:7.1f} ms  quickened {:7.1f} ms ({:.2f}x)".format(
+            label, generic * 1000, quickened * 1000, generic / quickened))
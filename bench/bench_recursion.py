@@ -0,0 +1,74 @@
+"""
+Deep recursion on the bytecode VM's explicit frame stack: time and peak
+traced memory for non-tail recursion at increasing depths, and the same
+depths as tail calls, which run in constant frame space. The tree-walker's
+limit is shown for comparison.
+
+Run from the repository root:  python bench/bench_recursion.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import parse
+from compiler import Compiler
+from interpreter import Interpreter
+from vm import VM
+
+DEPTH = """
+fun depth(n) {{ if (n == 0) return 0; return 1 + depth(n - 1); }}
+print depth({n});
+"""
+
+TAIL = """
+fun count(n, acc) {{ if (n == 0) return acc; return count(n - 1, acc + 1); }}
+print count({n}, 0);
+"""
+
+
+def _fail(*args):
+    raise SystemExit("benchmark script failed to compile: {}".format(args))
+
+
+def run_vm(source):
+    """Returns the program's output, its run time, and its peak traced memory (from a second run)."""
+    function = Compiler(_fail).compile(parse(source))
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        VM().interpret(function)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        VM().interpret(function)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out.getvalue().splitlines()[0], elapsed, peak
+
+
+def tree_limit():
+    """The deepest non-tail recursion the tree-walker manages (by doubling)."""
+    n = 8
+    while True:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            Interpreter().interpret(parse(DEPTH.format(n=n * 2)))
+        if "Stack overflow" in out.getvalue():
+            return n
+        n *= 2
+
+
+if __name__ == '__main__':
+    print("tree-walker: overflows between {} and {} frames".format(tree_limit(), tree_limit() * 2))
+    # at the default memory budget 1,000,000 non-tail frames overflow
+    for n in (1000, 10000, 100000, 1000000):
+        for label, template in (("recursion", DEPTH), ("tail calls", TAIL)):
+            result, elapsed, peak = run_vm(template.format(n=n))
+            print("vm {:<10} depth {:>8}  {:>15}  {:7.1f} ms  peak {:7.1f} MB".format(
+                label, n, result, elapsed * 1000, peak / 1e6))
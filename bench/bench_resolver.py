@@ -0,0 +1,187 @@
+"""
+Compares variable lookup through resolved (depth, slot) environments against
+the old approach of walking a chain of dicts keyed by name.
+
+Run from the repository root:  python bench/bench_resolver.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from interpreter import Interpreter
+from lox_callable import LoxCallable, LoxFunction
+from parse import Parser
+from resolver import Resolver
+from return_value import Return
+from runtime_error import LoxRuntimeError
+from scanner import Scanner
+
+NESTED_LOOPS = """
+var total = 0;
+for (var i = 0; i < 60; i = i + 1) {
+  var a = i;
+  {
+    var b = a + 1;
+    {
+      for (var j = 0; j < 60; j = j + 1) {
+        var c = b + j;
+        { { total = total + c - a - b; } }
+      }
+    }
+  }
+}
+print total;
+"""
+
+CLOSURES = """
+fun makeCounter() {
+  var count = 0;
+  fun level1() {
+    fun level2() {
+      fun level3() {
+        count = count + 1;
+        return count;
+      }
+      return level3();
+    }
+    return level2();
+  }
+  return level1;
+}
+var counter = makeCounter();
+var n = 0;
+while (n < 3000) {
+  counter();
+  n = n + 1;
+}
+print counter();
+"""
+
+WORKLOADS = [("nested loops", NESTED_LOOPS), ("closures", CLOSURES)]
+
+
+class _DictEnvironment():
+    def __init__(self, enclosing=None):
+        self.values = {}
+        self.enclosing = enclosing
+
+    def define(self, name, value):
+        self.values[name] = value
+
+    def get(self, name):
+        if name.lexeme in self.values:
+            return self.values[name.lexeme]
+        if self.enclosing is not None:
+            return self.enclosing.get(name)
+        raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
+
+    def assign(self, name, value):
+        if name.lexeme in self.values:
+            self.values[name.lexeme] = value
+            return
+        if self.enclosing is not None:
+            self.enclosing.assign(name, value)
+            return
+        raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
+
+
+class _DictFunction(LoxFunction):
+    def call(self, interpreter, args):
+        env = _DictEnvironment(self.closure)
+        for param, arg in zip(self.declaration.params, args):
+            env.define(param.lexeme, arg)
+        try:
+            interpreter.execute_block(self.declaration.body, env)
+        except Return as return_value:
+            return return_value.value
+        return None
+
+
+class DictChainInterpreter(Interpreter):
+    """The interpreter as it was before the resolver: every scope is a dict."""
+
+    def __init__(self):
+        super().__init__()
+        natives = self.globals.values
+        self.globals = _DictEnvironment()
+        self.globals.values.update(natives)
+        self.environment = self.globals
+
+    def visit_BlockStmt(self, stmt):
+        self.execute_block(stmt.statements, _DictEnvironment(self.environment))
+
+    def visit_ForStmt(self, stmt):
+        previous = self.environment
+        self.environment = _DictEnvironment(previous)
+        try:
+            if stmt.initializer is not None:
+                self.execute(stmt.initializer)
+            while self._is_truthy(self._evaluate(stmt.condition)):
+                self.execute(stmt.body)
+                if stmt.increment is not None:
+                    self._evaluate(stmt.increment)
+        finally:
+            self.environment = previous
+
+    def visit_CallExpr(self, expr):
+        # (no inline cache: those depend on the globals' epochs)
+        callee = self._evaluate(expr.callee)
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+        arguments = [self._evaluate(arg) for arg in expr.arguments]
+        if len(arguments) != callee.arity():
+            raise LoxRuntimeError(
+                expr.paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee.call(self, arguments)
+
+    def visit_FunctionStmt(self, stmt):
+        self.environment.define(stmt.name.lexeme, _DictFunction(stmt, self.environment))
+
+    def visit_VarStmt(self, stmt):
+        value = None
+        if stmt.initializer is not None:
+            value = self._evaluate(stmt.initializer)
+        self.environment.define(stmt.name.lexeme, value)
+
+    def visit_AssignExpr(self, expr):
+        value = self._evaluate(expr.value)
+        self.environment.assign(expr.name, value)
+        return value
+
+    def visit_VariableExpr(self, expr):
+        return self.environment.get(expr.name)
+
+
+def _fail(*args):
+    raise SystemExit("benchmark script failed to compile: {}".format(args))
+
+
+def parse(source):
+    statements = Parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    Resolver(_fail).resolve(statements)
+    return statements
+
+
+def best_of(repeat, interpreter_class, statements):
+    best = float('inf')
+    for _ in range(repeat):
+        interpreter = interpreter_class()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            interpreter.interpret(statements)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        statements = parse(source)
+        dict_chain = best_of(repeat, DictChainInterpreter, statements)
+        slots = best_of(repeat, Interpreter, statements)
+        print("{:<14} dict chain {:8.1f} ms   slots {:8.1f} ms   speedup {:.2f}x".format(
+            label, dict_chain * 1000, slots * 1000, dict_chain / slots))
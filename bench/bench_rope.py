@@ -0,0 +1,53 @@
+"""
+Builds strings of up to 1 MB with `s = s + chunk;` in a loop, with ropes
+(see rope) and with the plain str concatenation they replace.
+
+Run from the repository root:  python bench/bench_rope.py [repeat]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import best_of, parse
+from interpreter import Interpreter
+from tokentype import TokenType
+
+
+BUILD = """
+var chunk = "{chunk}";
+var s = "";
+for (var i = 0; i < {count}; i = i + 1) {{
+  s = s + chunk;
+}}
+print s == s + "";
+"""
+
+
+class FlatStringInterpreter(Interpreter):
+    """Concatenates strings with str + str, as before ropes."""
+
+    def visit_StringAddExpr(self, expr):
+        left = self._evaluate(expr.left)
+        right = self._evaluate(expr.right)
+        if left.__class__ is str and right.__class__ is str:
+            return left + right
+        return self._deoptimize_binary(expr, left, right)
+
+    def _binary(self, expr, left, right):
+        if expr.operator.type == TokenType.PLUS and left.__class__ is str and right.__class__ is str:
+            return left + right
+        return super()._binary(expr, left, right)
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    for chunk, sizes in (("0123456789" * 10, (256, 512, 1024)), ("ab", (64, 128, 256))):
+        for kilobytes in sizes:
+            source = BUILD.format(chunk=chunk, count=kilobytes * 1024 // len(chunk))
+            flat_statements = parse(source)
+            rope_statements = parse(source)
+            flat = best_of(repeat, lambda: FlatStringInterpreter().interpret(flat_statements))
+            rope = best_of(repeat, lambda: Interpreter().interpret(rope_statements))
+            print("{:>5} KB in {:>3} char chunks  str {:8.1f} ms  rope {:7.1f} ms ({:.1f}x)".format(
+                kilobytes, len(chunk), flat * 1000, rope * 1000, flat / rope))
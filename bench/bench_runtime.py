@@ -0,0 +1,66 @@
+"""
+Latency of many small evaluations: main.run per snippet (new Scanner,
+Parser and Interpreter each time, output captured) against LoxRuntime.eval
+on a warm runtime, both with a handful of snippets repeated (cache hits)
+and with every snippet distinct (cache misses).
+
+Run from the repository root:  python bench/bench_runtime.py [evaluations]
+"""
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import main
+from lox_runtime import LoxRuntime
+
+SNIPPETS = [
+    "1 + 2 * 3;",
+    "var x = rate * 100; x - 1;",
+    'var s = "ab"; s + "cd";',
+    "fun sq(n) { return n * n; } sq(12);",
+    "var t = 0; for (var i = 0; i < 10; i = i + 1) t = t + i; t;",
+]
+
+
+def distinct(i):
+    return "var x = {}; x * 2 + rate;".format(i)
+
+
+def measure(evaluate, sources):
+    latencies = []
+    for source in sources:
+        start = time.perf_counter()
+        evaluate(source)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_with_main(source):
+    main.hasError = main.hasRuntimeError = False
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.run("var rate = 0.2; " + source)
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    print("{:<22} mean {:7.1f} us  p50 {:7.1f} us  p99 {:7.1f} us  {:8.0f} evals/s".format(
+        label, statistics.mean(latencies) * 1e6, latencies[len(latencies) // 2] * 1e6,
+        latencies[int(len(latencies) * 0.99)] * 1e6, len(latencies) / sum(latencies)))
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeated = [SNIPPETS[i % len(SNIPPETS)] for i in range(count)]
+
+    report("main.run", measure(run_with_main, repeated))
+
+    runtime = LoxRuntime(globals={'rate': 0.2})
+    report("LoxRuntime (cached)", measure(runtime.eval, repeated))
+
+    runtime = LoxRuntime(globals={'rate': 0.2}, cache_size=0)
+    report("LoxRuntime (distinct)", measure(runtime.eval, [distinct(i) for i in range(count)]))
@@ -0,0 +1,198 @@
+"""
+Measures scanning throughput in MB/s of scanner.Scanner against the previous
+character-at-a-time scanner (kept below as CharScanner), and checks that the
+two produce the same token stream.
+
+Run from the repository root:  python bench/bench_scanner.py [megabytes] [repeat]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from scanner import KEYWORDS, Scanner
+from tokens import Token
+from tokentype import TokenType
+
+SAMPLE = '''
+// compute some totals
+fun add_all(first, second, third) {
+  var total = first + second * 2.5 - third / 4;
+  if (total >= 100 and !(total == 200)) {
+    print "big total: " + "yes";
+  } else {
+    print nil;
+  }
+  return total;
+}
+
+var counter = 0;
+while (counter <= 1000) { counter = counter + 1; add_all(counter, 0.75, -3); }
+for (var i = 0; i < 10; i = i + 1) print i != 3 or false;
+'''
+
+
+class CharScanner():
+    """The previous scanner: one elif chain, one call per character."""
+
+    def __init__(self, source, errCallback):
+        self.source = source
+        self.tokens = []
+        self.start = 0
+        self.current = 0
+        self.line = 0
+        self.error = errCallback
+
+    def scan_tokens(self):
+        while not self.is_at_end:
+            self.start = self.current
+            self.scan_token()
+        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
+        return self.tokens
+
+    def scan_token(self):
+        c = self.advance()
+
+        if c == '(': self.add_token(TokenType.LEFT_PAREN)
+        elif c == ')': self.add_token(TokenType.RIGHT_PAREN)
+        elif c == '{': self.add_token(TokenType.LEFT_BRACE)
+        elif c == '}': self.add_token(TokenType.RIGHT_BRACE)
+        elif c == ',': self.add_token(TokenType.COMMA)
+        elif c == '.': self.add_token(TokenType.DOT)
+        elif c == '-': self.add_token(TokenType.MINUS)
+        elif c == '+': self.add_token(TokenType.PLUS)
+        elif c == ';': self.add_token(TokenType.SEMICOLON)
+        elif c == '*': self.add_token(TokenType.STAR)
+        elif c == '!': self.add_token(TokenType.BANG_EQUAL if self.match('=') else TokenType.BANG)
+        elif c == '=': self.add_token(TokenType.EQUAL_EQUAL if self.match('=') else TokenType.EQUAL)
+        elif c == '<': self.add_token(TokenType.LESS_EQUAL if self.match('=') else TokenType.LESS)
+        elif c == '>': self.add_token(TokenType.GREATER_EQUAL if self.match('=') else TokenType.GREATER)
+
+        elif c == '/':
+            if self.match('/'):
+                while self.peek() != '\n' and not self.is_at_end:
+                    self.advance()
+            else:
+                self.add_token(TokenType.SLASH)
+
+        elif c in {' ', '\r', '\t'}:
+            pass
+        elif c == '\n':
+            self.line += 1
+
+        elif c == '"': self.string()
+        elif self.is_digit(c): self.number()
+        elif self.is_alpha(c): self.identifier()
+
+        else:
+            self.error(self.line, "unexpected character: {}".format(c))
+
+    def string(self):
+        while self.peek() != '"' and not self.is_at_end:
+            if self.peek() == '\n':
+                self.line += 1
+            self.advance()
+
+        if self.is_at_end:
+            self.error(self.line, "Unterminated string")
+            return
+
+        self.advance()
+
+        self.add_token(TokenType.STRING, self.source[self.start+1:self.current-1])
+
+    def number(self):
+        while self.is_digit(self.peek()):
+            self.advance()
+
+        if self.peek() == '.' and self.is_digit(self.peek(1)):
+            self.advance()
+
+            while self.is_digit(self.peek()):
+                self.advance()
+
+        self.add_token(TokenType.NUMBER, float(self.source[self.start:self.current]))
+
+    def identifier(self):
+        while self.is_alpha(self.peek()) or self.is_digit(self.peek()):
+            self.advance()
+
+        text = self.source[self.start:self.current]
+        self.add_token(KEYWORDS.get(text, TokenType.IDENTIFIER))
+
+    def is_digit(self, c):
+        return '0' <= c <= '9'
+
+    def is_alpha(self, c):
+        return 'a' <= c <= 'z' or 'A' <= c <= 'Z' or c == '_'
+
+    def match(self, expected):
+        if self.is_at_end: return False
+        if self.source[self.current] != expected: return False
+
+        self.current += 1
+        return True
+
+    def peek(self, ahead=0):
+        if self.current + ahead >= len(self.source):
+            return '\0'
+        return self.source[self.current + ahead]
+
+    def add_token(self, token_type, literal=None):
+        text = self.source[self.start:self.current]
+        self.tokens.append(Token(token_type, text, literal, self.line))
+
+    def advance(self):
+        self.current += 1
+        return self.source[self.current - 1]
+
+    @property
+    def is_at_end(self):
+        return self.current >= len(self.source)
+
+
+def _errors():
+    errors = []
+    return errors, lambda line, message: errors.append((line, message))
+
+
+def check_compatible(source):
+    char_errors, char_error = _errors()
+    regex_errors, regex_error = _errors()
+    expected = CharScanner(source, char_error).scan_tokens()
+    actual = Scanner(source, regex_error).scan_tokens()
+    if expected != actual or char_errors != regex_errors:
+        raise SystemExit("token streams differ")
+
+
+def throughput(scan, source, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scan(source)
+        best = min(best, time.perf_counter() - start)
+    return len(source.encode()) / best / 1e6
+
+
+def drain(source):
+    for _ in Scanner(source, print).iter_tokens():
+        pass
+
+
+if __name__ == '__main__':
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    source = SAMPLE * int(megabytes * 1e6 / len(SAMPLE))
+
+    for odd in ['"unterminated\n', 'a @ b', '1.5.x', '"multi\nline" x', '12. 3', 'var fun_1 = eof;']:
+        check_compatible(odd)
+    check_compatible(source)
+
+    print("{:.1f} MB of source".format(len(source) / 1e6))
+    char = throughput(lambda s: CharScanner(s, print).scan_tokens(), source, repeat)
+    regex = throughput(lambda s: Scanner(s, print).scan_tokens(), source, repeat)
+    streamed = throughput(drain, source, repeat)
+    print("char scanner    {:6.2f} MB/s".format(char))
+    print("regex scanner   {:6.2f} MB/s ({:.2f}x)".format(regex, regex / char))
+    print("  as generator  {:6.2f} MB/s ({:.2f}x)".format(streamed, streamed / char))
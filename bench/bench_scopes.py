@@ -0,0 +1,95 @@
+"""
+Measures what skipping scopes for declaration-free blocks, and reusing the
+environments of blocks and calls no closure can capture, saves on loop- and
+call-heavy programs: Environments created, peak traced memory and time,
+against a tree-walker that gives every block and call a new Environment.
+
+Run from the repository root:  python bench/bench_scopes.py [repeat]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import CALLS, HELPERS, LOOPS, _fail, best_of
+from environment import Environment
+from interpreter import Interpreter
+from parse import Parser
+from resolver import Resolver
+from scanner import Scanner
+
+LOCALS = """
+var total = 0;
+for (var i = 0; i < 20000; i = i + 1) {
+  var square = i * i;
+  var half = square / 2;
+  total = total + half;
+}
+print total;
+"""
+
+WORKLOADS = [("loops", LOOPS), ("loop locals", LOCALS), ("fib", CALLS), ("helper calls", HELPERS)]
+
+
+class ScopedResolver(Resolver):
+    """Gives every block a scope, and lets no environment be reused."""
+
+    def visit_BlockStmt(self, stmt):
+        self._begin_scope()
+        self.resolve(stmt.statements)
+        stmt.scope_size = self._end_scope()
+        stmt.captured = True
+
+    def _resolve_function(self, function, function_type):
+        super()._resolve_function(function, function_type)
+        function.captured = True
+
+
+class AllocatingInterpreter(Interpreter):
+    def visit_BlockStmt(self, stmt):
+        self.execute_block(stmt.statements, Environment(self.environment, stmt.scope_size))
+
+
+def parse(source, resolver):
+    statements = Parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    resolver(_fail).resolve(statements)
+    return statements
+
+
+def environments_created(run):
+    created = [0]
+    init = Environment.__init__
+
+    def counting_init(self, *args):
+        created[0] += 1
+        init(self, *args)
+
+    Environment.__init__ = counting_init
+    try:
+        best_of(1, run)
+    finally:
+        Environment.__init__ = init
+    return created[0]
+
+
+def peak_memory(run):
+    tracemalloc.start()
+    best_of(1, run)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, source in WORKLOADS:
+        before_statements = parse(source, ScopedResolver)
+        after_statements = parse(source, Resolver)
+        runs = [("every block", lambda: AllocatingInterpreter().interpret(before_statements)),
+                ("skip/reuse", lambda: Interpreter().interpret(after_statements))]
+        print(label)
+        for name, run in runs:
+            print("  {:<12} {:>8} Environments  peak {:7.1f} KB  {:7.1f} ms".format(
+                name, environments_created(run), peak_memory(run) / 1024, best_of(repeat, run) * 1000))
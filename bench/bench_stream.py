@@ -0,0 +1,66 @@
+"""
+Compares peak RSS of running a large generated script all at once and with
+--stream. Each run happens in a fresh child process.
+
+Run from the repository root:  python bench/bench_stream.py [statements]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def generate(statements):
+    lines = ["var total = 0;", "fun bump(n) { total = total + n; return total; }"]
+    for i in range(statements):
+        if i % 3 == 0:
+            lines.append("var v{} = {} * 2 + {};".format(i, i, i % 7))
+        elif i % 3 == 1:
+            lines.append("bump(v{});".format(i - 1))
+        else:
+            lines.append("if (total > {}) {{ total = total - 1; }}".format(i))
+    lines.append("print total;")
+    return "\n".join(lines) + "\n"
+
+
+def child(script, options):
+    import main
+
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        start = time.perf_counter()
+        main.run_file(script, **options)
+        elapsed = time.perf_counter() - start
+        sys.stdout = stdout
+
+    # ru_maxrss is in KiB on Linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed)
+
+
+def measure(script, backend, stream):
+    code = ("import sys; sys.path.insert(0, {!r}); sys.path.insert(0, {!r}); import bench_stream; "
+            "bench_stream.child({!r}, dict(backend={!r}, stream={!r}))").format(
+                ROOT, os.path.dirname(os.path.abspath(__file__)), script, backend, stream)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    rss, elapsed = output.stdout.split()
+    return int(rss) / 1024, float(elapsed)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.NamedTemporaryFile('w', suffix='.lox', delete=False) as f:
+        f.write(generate(count))
+    try:
+        print("{} statements, {:.1f} MB of source".format(count, os.path.getsize(f.name) / 1e6))
+        for backend in ('tree', 'vm'):
+            for stream in (False, True):
+                rss, elapsed = measure(f.name, backend, stream)
+                print("{:<5} {:<9} peak RSS {:7.1f} MB  {:6.2f} s".format(
+                    backend, "stream" if stream else "batch", rss, elapsed))
+    finally:
+        os.unlink(f.name)
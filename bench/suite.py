@@ -0,0 +1,207 @@
+"""
+The benchmark suite: runs every workload in bench/workloads, plus a few
+generated ones, through the tree-walking pipeline and times each phase
+(Scanner, Parser, Resolver, Interpreter) separately over repeated runs.
+One further run per workload, under tracemalloc, measures the peak memory
+allocated during each phase.
+
+Results are printed and saved as JSON, by default in bench/results/, so runs
+from different commits can be compared with --compare.
+
+Run from the repository root:
+
+    python bench/suite.py [workload ...] [--repeat N] [--output FILE] [--compare FILE]
+"""
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, '..')
+sys.path.insert(0, ROOT)
+
+from bench_backends import _fail
+from bench_stream import generate
+from interpreter import Interpreter
+from parse import Parser
+from resolver import Resolver
+from scanner import Scanner
+
+PHASES = ('scan', 'parse', 'resolve', 'interpret')
+
+
+def deep_blocks(depth, iterations):
+    """A loop whose body is `depth` nested blocks, each declaring a variable."""
+    inner = "total = total + a{};".format(depth - 1)
+    for level in reversed(range(depth)):
+        initializer = "i" if level == 0 else "a{} + 1".format(level - 1)
+        inner = "{{ var a{} = {}; {} }}".format(level, initializer, inner)
+    return ("var total = 0;\n"
+            "for (var i = 0; i < {}; i = i + 1) {}\n"
+            "print total;\n").format(iterations, inner)
+
+
+def workloads():
+    """name -> Lox source, the files in bench/workloads first."""
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(BENCH, 'workloads', '*.lox'))):
+        with open(path) as f:
+            sources[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    sources['deep_blocks'] = deep_blocks(100, 300)
+    sources['large_source'] = generate(20000)
+    return sources
+
+
+def run_phases(source, timer):
+    """Runs `source` through the pipeline inside a `with timer(phase)` per phase."""
+    with timer('scan'):
+        tokens = Scanner(source, _fail).scan_tokens()
+    with timer('parse'):
+        statements = Parser(tokens, _fail).parse()
+    with timer('resolve'):
+        Resolver(_fail).resolve(statements)
+    with timer('interpret'), contextlib.redirect_stdout(io.StringIO()):
+        Interpreter().interpret(statements)
+
+
+def time_phases(source):
+    """Seconds spent in each phase of one run."""
+    times = {}
+
+    @contextlib.contextmanager
+    def timer(phase):
+        start = time.perf_counter()
+        yield
+        times[phase] = time.perf_counter() - start
+
+    run_phases(source, timer)
+    return times
+
+
+def peak_memory(source):
+    """Peak bytes allocated (as seen by tracemalloc) during each phase of one run."""
+    peaks = {}
+
+    @contextlib.contextmanager
+    def timer(phase):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        yield
+        peaks[phase] = tracemalloc.get_traced_memory()[1] - base
+
+    tracemalloc.start()
+    try:
+        run_phases(source, timer)
+        peaks['total'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def summarize(samples):
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'runs': samples,
+    }
+
+
+def benchmark(source, repeat):
+    # one unmeasured run, so imports and caches are warm
+    time_phases(source)
+
+    runs = [time_phases(source) for _ in range(repeat)]
+    phases = {phase: summarize([run[phase] for run in runs]) for phase in PHASES}
+    phases['total'] = summarize([sum(run.values()) for run in runs])
+    return {
+        'source_bytes': len(source.encode('utf-8')),
+        'seconds': phases,
+        'peak_bytes': peak_memory(source),
+    }
+
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def report(name, result, baseline=None):
+    print(name)
+    for phase in PHASES + ('total',):
+        seconds = result['seconds'][phase]
+        line = "  {:<10} median {:9.2f} ms  min {:9.2f} ms  stdev {:7.2f} ms  peak {:8.2f} MB".format(
+            phase, seconds['median'] * 1000, seconds['min'] * 1000, seconds['stdev'] * 1000,
+            result['peak_bytes'][phase] / 1e6)
+        if baseline is not None and name in baseline['workloads']:
+            before = baseline['workloads'][name]['seconds'][phase]['median']
+            line += "  ({:.2f}x baseline speed)".format(before / seconds['median'])
+        print(line)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    arg_parser.add_argument('workloads', nargs='*', help='names of the workloads to run (default: all)')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='measured runs per workload (default %(default)s)')
+    arg_parser.add_argument('--output', metavar='FILE',
+                            help='where to save the JSON results (default: bench/results/<time>-<commit>.json)')
+    arg_parser.add_argument('--compare', metavar='FILE', help='a previous JSON result to compare medians against')
+    args = arg_parser.parse_args()
+
+    sources = workloads()
+    unknown = set(args.workloads) - set(sources)
+    if unknown:
+        arg_parser.error("unknown workloads: {} (choose from {})".format(
+            ", ".join(sorted(unknown)), ", ".join(sources)))
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # deep_blocks nests deeper than Python's default limit allows the parser and tree-walker
+    sys.setrecursionlimit(10000)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    commit = git_commit()
+    results = {
+        'timestamp': now.isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'workloads': {},
+    }
+    for name, source in sources.items():
+        if args.workloads and name not in args.workloads:
+            continue
+        results['workloads'][name] = benchmark(source, args.repeat)
+        report(name, results['workloads'][name], baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH, 'results'), exist_ok=True)
+        output = os.path.join(BENCH, 'results', '{}-{}.json'.format(
+            now.strftime('%Y%m%dT%H%M%S'), commit or 'unknown'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("results saved to {}".format(os.path.relpath(output)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+from array import array
+
+# Opcodes. Plain ints rather than an Enum so the VM's dispatch loop compares
+# against cached module globals instead of doing enum attribute lookups.
+OP_CONSTANT = 0
+OP_NIL = 1
+OP_TRUE = 2
+OP_FALSE = 3
+OP_POP = 4
+OP_GET_LOCAL = 5
+OP_SET_LOCAL = 6
+OP_GET_GLOBAL = 7
+OP_DEFINE_GLOBAL = 8
+OP_SET_GLOBAL = 9
+OP_GET_UPVALUE = 10
+OP_SET_UPVALUE = 11
+OP_EQUAL = 12
+OP_GREATER = 13
+OP_LESS = 14
+OP_ADD = 15
+OP_SUBTRACT = 16
+OP_MULTIPLY = 17
+OP_DIVIDE = 18
+OP_NOT = 19
+OP_NEGATE = 20
+OP_PRINT = 21
+OP_JUMP = 22
+OP_JUMP_IF_FALSE = 23
+OP_LOOP = 24
+OP_CALL = 25
+OP_CLOSURE = 26
+OP_CLOSE_UPVALUE = 27
+OP_RETURN = 28
+OP_NOT_EQUAL = 29
+OP_GREATER_EQUAL = 30
+OP_LESS_EQUAL = 31
+# a call in tail position: replaces the caller's frame (see compiler.visit_ReturnStmt)
+OP_TAIL_CALL = 32
+
+OP_NAMES = {value: name for name, value in globals().items() if name.startswith('OP_')}
+
+# number of operand bytes following each opcode (OP_CLOSURE is variable length)
+OPERAND_SIZES = {
+    OP_CONSTANT: 2,
+    OP_GET_LOCAL: 1,
+    OP_SET_LOCAL: 1,
+    OP_GET_GLOBAL: 2,
+    OP_DEFINE_GLOBAL: 2,
+    OP_SET_GLOBAL: 2,
+    OP_GET_UPVALUE: 1,
+    OP_SET_UPVALUE: 1,
+    OP_JUMP: 2,
+    OP_JUMP_IF_FALSE: 2,
+    OP_LOOP: 2,
+    OP_CALL: 1,
+    OP_TAIL_CALL: 1,
+    OP_CLOSURE: 2,
+}
+
+
+class Chunk():
+    """
+    A sequence of bytecode with its constant pool. `lines` holds the source
+    line of every byte in `code`, for runtime error reporting.
+    """
+
+    def __init__(self):
+        self.code = array('B')
+        self.lines = array('i')
+        self.constants = []
+        self._constant_indexes = {}
+
+    def write(self, byte, line):
+        self.code.append(byte)
+        self.lines.append(line)
+
+    def add_constant(self, value):
+        # Reuse pool entries for equal numbers/strings, but keep True/1.0 and
+        # the like apart since they compare equal in Python. repr() keeps -0
+        # and 0 apart too.
+        key = (type(value), repr(value) if type(value) is float else value)
+        try:
+            return self._constant_indexes[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable (not that any Lox constant is) - just append
+            self.constants.append(value)
+            return len(self.constants) - 1
+
+        self.constants.append(value)
+        self._constant_indexes[key] = len(self.constants) - 1
+        return len(self.constants) - 1
+
+    def freeze(self):
+        """Turn the code into immutable bytes, which index faster than an array."""
+        self.code = bytes(self.code)
+        self._constant_indexes = None
+
+
+class VMFunction():
+    """A compiled Lox function: its bytecode plus what is needed to call it."""
+
+    def __init__(self, name, arity=0):
+        self.name = name
+        self.arity = arity
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __repr__(self):
+        if self.name is None:
+            return "<script>"
+        return f"<fn {self.name} >"
+
+
+def disassemble(function, out=print):
+    chunk = function.chunk
+    out(f"== {function!r} ==")
+    offset = 0
+    while offset < len(chunk.code):
+        offset = disassemble_instruction(chunk, offset, out)
+
+    for constant in chunk.constants:
+        if isinstance(constant, VMFunction):
+            disassemble(constant, out)
+
+
+def disassemble_instruction(chunk, offset, out=print):
+    code = chunk.code
+    op = code[offset]
+    name = OP_NAMES.get(op, f"<unknown {op}>")
+    line = chunk.lines[offset]
+    size = OPERAND_SIZES.get(op, 0)
+
+    if size == 0:
+        out(f"{offset:04d} {line:4d} {name}")
+        return offset + 1
+
+    operand = code[offset + 1] if size == 1 else (code[offset + 1] << 8) | code[offset + 2]
+    if op in (OP_JUMP, OP_JUMP_IF_FALSE):
+        out(f"{offset:04d} {line:4d} {name:<16} {offset} -> {offset + 3 + operand}")
+    elif op == OP_LOOP:
+        out(f"{offset:04d} {line:4d} {name:<16} {offset} -> {offset + 3 - operand}")
+    elif op in (OP_CONSTANT, OP_GET_GLOBAL, OP_DEFINE_GLOBAL, OP_SET_GLOBAL, OP_CLOSURE):
+        out(f"{offset:04d} {line:4d} {name:<16} {operand:4d} {chunk.constants[operand]!r}")
+    else:
+        out(f"{offset:04d} {line:4d} {name:<16} {operand:4d}")
+
+    offset += 1 + size
+    if op == OP_CLOSURE:
+        for _ in range(chunk.constants[operand].upvalue_count):
+            is_local, index = code[offset], code[offset + 1]
+            out(f"{offset:04d}    |                     {'local' if is_local else 'upvalue'} {index}")
+            offset += 2
+    return offset
@@ -0,0 +1,468 @@
+import operator as ops
+
+from environment import FREE_LIST_SIZE, Environment
+from expr import Visitor as ExprVisitor
+from interpreter import stringify
+from lox_callable import LoxCallable
+from runtime_error import LoxRuntimeError
+from source_lines import first_line
+from stmt import Visitor as StmtVisitor
+from tokens import Token
+from tokentype import TokenType
+
+# Every expression compiles to a function taking the current Environment and
+# returning the expression's value. Every statement compiles to a function
+# taking the current Environment and returning None to fall through to the
+# next statement, or a 1-tuple holding the value of a `return`.
+
+
+class CompiledFunction(LoxCallable):
+    def __init__(self, declaration, closure, body):
+        self.declaration = declaration
+        self.closure = closure
+        self.body = body
+        # spare environments, as in LoxFunction
+        self.frames = [] if declaration.captured is False else None
+
+    def arity(self):
+        return len(self.declaration.params)
+
+    def call(self, interpreter, args):
+        frames = self.frames
+        env = frames.pop() if frames else Environment(self.closure, self.declaration.scope_size)
+        env.values[:len(args)] = args
+        try:
+            result = self.body(env)
+        finally:
+            if frames is not None and len(frames) < FREE_LIST_SIZE:
+                frames.append(env)
+        if result is not None:
+            return result[0]
+        return None
+
+    def __repr__(self):
+        return f"<fn {self.declaration.name.lexeme} >"
+
+
+def _local_getter(depth, slot):
+    if depth == 0:
+        return lambda env: env.values[slot]
+    if depth == 1:
+        return lambda env: env.enclosing.values[slot]
+    if depth == 2:
+        return lambda env: env.enclosing.enclosing.values[slot]
+
+    def get(env):
+        for _ in range(depth):
+            env = env.enclosing
+        return env.values[slot]
+    return get
+
+
+def _number_operands_error(operator):
+    return LoxRuntimeError(operator, "Operands must be numbers.")
+
+
+def _compile_arithmetic(operator, left, right, op):
+    """
+    `op` is one of the operator functions in NUMBER_OPS. When the right operand
+    is a number literal it is baked into the closure, which covers the very
+    common `i < 10` and `n - 1` shapes.
+    """
+    if isinstance(right, _Constant) and type(right.value) is float:
+        constant = right.value
+        left_fn = left.fn
+
+        def number_constant(env):
+            l = left_fn(env)
+            if type(l) is float:
+                return op(l, constant)
+            raise _number_operands_error(operator)
+        return number_constant
+
+    left_fn = left.fn
+    right_fn = right.fn
+
+    def number(env):
+        l = left_fn(env)
+        r = right_fn(env)
+        if type(l) is float and type(r) is float:
+            return op(l, r)
+        raise _number_operands_error(operator)
+    return number
+
+
+NUMBER_OPS = {
+    TokenType.MINUS: ops.sub,
+    TokenType.STAR: ops.mul,
+    TokenType.SLASH: ops.truediv,
+    TokenType.GREATER: ops.gt,
+    TokenType.GREATER_EQUAL: ops.ge,
+    TokenType.LESS: ops.lt,
+    TokenType.LESS_EQUAL: ops.le,
+}
+
+
+class _Constant():
+    """A compiled literal; remembered so parents can specialize on it."""
+
+    def __init__(self, value):
+        self.value = value
+        self.fn = lambda env: value
+
+
+class _Compiled():
+    def __init__(self, fn):
+        self.fn = fn
+
+
+class ClosureCompiler(ExprVisitor, StmtVisitor):
+    """
+    Turns a resolved statement list into nested Python closures, so running
+    the program is one direct call per node instead of accept() -> visit_*()
+    plus an if-chain over the operator type.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.globals = interpreter.globals.values
+
+    def compile(self, statements):
+        """
+        Yields each statement compiled, only as the previous one is taken, so
+        the statements before one too deep to compile run first, as on the
+        other backends.
+        """
+        for statement in statements:
+            try:
+                compiled = self._stmt(statement)
+            except RecursionError:
+                # compiling recurses once per level of the tree
+                line = first_line(statement)
+                raise LoxRuntimeError(Token(TokenType.EOF, "", None, 0 if line is None else line),
+                                      "Stack overflow.")
+            yield compiled
+
+    def _stmt(self, stmt):
+        return stmt.accept(self)
+
+    def _expr(self, expr):
+        return expr.accept(self)
+
+    def _expr_fn(self, expr):
+        return expr.accept(self).fn
+
+    def _run_block(self, statements):
+        statements = tuple(statements)
+        if len(statements) == 1:
+            return statements[0]
+
+        def run(env):
+            for statement in statements:
+                result = statement(env)
+                if result is not None:
+                    return result
+        return run
+
+    # -- statements -----------------------------------------------------
+
+    def visit_BlockStmt(self, stmt):
+        body = self._run_block(self._stmt(statement) for statement in stmt.statements)
+        if not stmt.scope_size:
+            return body
+        return self._scoped(body, stmt)
+
+    def _scoped(self, body, stmt):
+        """Runs `body` in a new Environment for the scope of the Block or For `stmt`."""
+        size = stmt.scope_size
+        if stmt.captured:
+            def scoped(env):
+                return body(Environment(env, size))
+            return scoped
+
+        frames = []
+
+        def reused_scope(env):
+            environment = frames.pop() if frames else Environment(None, size)
+            environment.enclosing = env
+            try:
+                return body(environment)
+            finally:
+                if len(frames) < FREE_LIST_SIZE:
+                    frames.append(environment)
+        return reused_scope
+
+    def visit_ExpressionStmt(self, stmt):
+        expression = self._expr_fn(stmt.expression)
+
+        def expression_stmt(env):
+            expression(env)
+        return expression_stmt
+
+    def visit_ForStmt(self, stmt):
+        initializer = None if stmt.initializer is None else self._stmt(stmt.initializer)
+        condition = self._expr_fn(stmt.condition)
+        increment = None if stmt.increment is None else self._expr_fn(stmt.increment)
+        body = self._stmt(stmt.body)
+
+        def for_stmt(env):
+            if initializer is not None:
+                initializer(env)
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return None
+                result = body(env)
+                if result is not None:
+                    return result
+                if increment is not None:
+                    increment(env)
+
+        if not stmt.scope_size:
+            return for_stmt
+        return self._scoped(for_stmt, stmt)
+
+    def visit_FunctionStmt(self, stmt):
+        body = self._run_block(self._stmt(statement) for statement in stmt.body)
+        define = self._definer(stmt)
+
+        def function(env):
+            define(env, CompiledFunction(stmt, env, body))
+        return function
+
+    def visit_IfStmt(self, stmt):
+        condition = self._expr_fn(stmt.condition)
+        then_branch = self._stmt(stmt.then_branch)
+
+        if stmt.else_branch is None:
+            def if_stmt(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+            return if_stmt
+
+        else_branch = self._stmt(stmt.else_branch)
+
+        def if_else_stmt(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+        return if_else_stmt
+
+    def visit_PrintStmt(self, stmt):
+        expression = self._expr_fn(stmt.expression)
+        write_line = self.interpreter.output.write_line
+
+        def print_stmt(env):
+            write_line(stringify(expression(env)))
+        return print_stmt
+
+    def visit_ReturnStmt(self, stmt):
+        if stmt.value is None:
+            return lambda env: (None,)
+
+        value = self._expr_fn(stmt.value)
+        return lambda env: (value(env),)
+
+    def visit_VarStmt(self, stmt):
+        define = self._definer(stmt)
+        if stmt.initializer is None:
+            return lambda env: define(env, None)
+
+        initializer = self._expr_fn(stmt.initializer)
+
+        def var_stmt(env):
+            define(env, initializer(env))
+        return var_stmt
+
+    def _definer(self, declaration):
+        slot = declaration.slot
+        if slot is None:
+            globals_ = self.globals
+            name = declaration.name.lexeme
+
+            def define_global(env, value):
+                globals_[name] = value
+            return define_global
+
+        def define_local(env, value):
+            env.values[slot] = value
+        return define_local
+
+    def visit_WhileStmt(self, stmt):
+        condition = self._expr_fn(stmt.condition)
+        body = self._stmt(stmt.body)
+
+        def while_stmt(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return None
+                result = body(env)
+                if result is not None:
+                    return result
+        return while_stmt
+
+    # -- expressions ----------------------------------------------------
+
+    def visit_AssignExpr(self, expr):
+        value_fn = self._expr_fn(expr.value)
+        depth, slot, name = expr.depth, expr.slot, expr.name
+
+        if depth is None:
+            globals_ = self.globals
+
+            def assign_global(env):
+                value = value_fn(env)
+                if name.lexeme not in globals_:
+                    raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
+                globals_[name.lexeme] = value
+                return value
+            return _Compiled(assign_global)
+
+        if depth == 0:
+            def assign_local(env):
+                value = env.values[slot] = value_fn(env)
+                return value
+            return _Compiled(assign_local)
+
+        def assign(env):
+            value = value_fn(env)
+            for _ in range(depth):
+                env = env.enclosing
+            env.values[slot] = value
+            return value
+        return _Compiled(assign)
+
+    def visit_BinaryExpr(self, expr):
+        operator = expr.operator
+        op_type = operator.type
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+
+        if op_type in NUMBER_OPS:
+            return _Compiled(_compile_arithmetic(operator, left, right, NUMBER_OPS[op_type]))
+
+        left_fn = left.fn
+        right_fn = right.fn
+
+        if op_type == TokenType.PLUS:
+            def add(env):
+                l = left_fn(env)
+                r = right_fn(env)
+                if type(l) is float and type(r) is float:
+                    return l + r
+                if type(l) is str and type(r) is str:
+                    return l + r
+                raise LoxRuntimeError(operator, "Operands must be two numbers or two strings")
+            return _Compiled(add)
+
+        if op_type == TokenType.EQUAL_EQUAL:
+            return _Compiled(lambda env: left_fn(env) == right_fn(env))
+        if op_type == TokenType.BANG_EQUAL:
+            return _Compiled(lambda env: left_fn(env) != right_fn(env))
+
+        return _Compiled(lambda env: None)
+
+    def visit_CallExpr(self, expr):
+        callee_fn = self._expr_fn(expr.callee)
+        argument_fns = tuple(self._expr_fn(argument) for argument in expr.arguments)
+        paren = expr.paren
+        interpreter = self.interpreter
+
+        def check(callee, arg_count):
+            if not isinstance(callee, LoxCallable):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+            if arg_count != callee.arity():
+                raise LoxRuntimeError(paren, f"Expected {callee.arity()} arguments but got {arg_count}.")
+
+        if len(argument_fns) == 0:
+            def call0(env):
+                callee = callee_fn(env)
+                check(callee, 0)
+                try:
+                    return callee.call(interpreter, [])
+                except RecursionError:
+                    raise LoxRuntimeError(paren, "Stack overflow.")
+            return _Compiled(call0)
+
+        if len(argument_fns) == 1:
+            argument_fn = argument_fns[0]
+
+            def call1(env):
+                callee = callee_fn(env)
+                args = [argument_fn(env)]
+                check(callee, 1)
+                try:
+                    return callee.call(interpreter, args)
+                except RecursionError:
+                    raise LoxRuntimeError(paren, "Stack overflow.")
+            return _Compiled(call1)
+
+        def call(env):
+            callee = callee_fn(env)
+            args = [argument_fn(env) for argument_fn in argument_fns]
+            check(callee, len(args))
+            try:
+                return callee.call(interpreter, args)
+            except RecursionError:
+                raise LoxRuntimeError(paren, "Stack overflow.")
+        return _Compiled(call)
+
+    def visit_GroupingExpr(self, expr):
+        # no node of its own at runtime
+        return self._expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        return _Constant(expr.value)
+
+    def visit_LogicalExpr(self, expr):
+        left_fn = self._expr_fn(expr.left)
+        right_fn = self._expr_fn(expr.right)
+
+        if expr.operator.type == TokenType.OR:
+            def logical_or(env):
+                left = left_fn(env)
+                if left is not None and left is not False:
+                    return left
+                return right_fn(env)
+            return _Compiled(logical_or)
+
+        def logical_and(env):
+            left = left_fn(env)
+            if left is None or left is False:
+                return left
+            return right_fn(env)
+        return _Compiled(logical_and)
+
+    def visit_UnaryExpr(self, expr):
+        operator = expr.operator
+        right_fn = self._expr_fn(expr.right)
+
+        if operator.type == TokenType.MINUS:
+            def negate(env):
+                right = right_fn(env)
+                if type(right) is not float:
+                    raise LoxRuntimeError(operator, "Operand must be a number")
+                return right * -1
+            return _Compiled(negate)
+
+        def not_(env):
+            right = right_fn(env)
+            return right is None or right is False
+        return _Compiled(not_)
+
+    def visit_VariableExpr(self, expr):
+        if expr.depth is not None:
+            return _Compiled(_local_getter(expr.depth, expr.slot))
+
+        globals_ = self.globals
+        name = expr.name
+
+        def get_global(env):
+            try:
+                return globals_[name.lexeme]
+            except KeyError:
+                raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
+        return _Compiled(get_global)
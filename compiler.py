@@ -0,0 +1,380 @@
+from bytecode import *
+import expr as Expr
+from expr import Visitor as ExprVisitor
+from stmt import Visitor as StmtVisitor
+from tokentype import TokenType
+
+UINT8_COUNT = 256
+UINT16_MAX = 65535
+
+BINARY_OPS = {
+    TokenType.PLUS: OP_ADD,
+    TokenType.MINUS: OP_SUBTRACT,
+    TokenType.STAR: OP_MULTIPLY,
+    TokenType.SLASH: OP_DIVIDE,
+    TokenType.EQUAL_EQUAL: OP_EQUAL,
+    TokenType.BANG_EQUAL: OP_NOT_EQUAL,
+    TokenType.GREATER: OP_GREATER,
+    TokenType.GREATER_EQUAL: OP_GREATER_EQUAL,
+    TokenType.LESS: OP_LESS,
+    TokenType.LESS_EQUAL: OP_LESS_EQUAL,
+}
+
+
+class _Local():
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class _FunctionState():
+    """Per-function compilation state: the locals on the stack and the upvalues."""
+
+    def __init__(self, enclosing, function):
+        self.enclosing = enclosing
+        self.function = function
+        # slot 0 holds the closure being called
+        self.locals = [_Local("", 0)]
+        self.upvalues = []
+        self.scope_depth = 0
+
+
+class Compiler(ExprVisitor, StmtVisitor):
+    """
+    Lowers a resolved statement list into bytecode for the VM.
+
+    Static errors (returning from top-level code, reading a local in its own
+    initializer...) are the resolver's job; this only reports limits of the
+    bytecode format, such as too many locals or too large a jump.
+    """
+
+    def __init__(self, set_error):
+        self.error_handler = set_error
+        self.state = None
+        self.line = 0
+        self.token = None
+
+    def compile(self, statements):
+        """Returns the top-level script as a VMFunction."""
+        self.state = _FunctionState(None, VMFunction(None))
+        for statement in statements:
+            self._compile_stmt(statement)
+        return self._end_function()
+
+    def _compile_stmt(self, stmt):
+        stmt.accept(self)
+
+    def _compile_expr(self, expr):
+        expr.accept(self)
+
+    def _error(self, message):
+        self.error_handler(self.token, message)
+
+    def _at(self, token):
+        self.token = token
+        self.line = token.line
+
+    # -- emitting -------------------------------------------------------
+
+    @property
+    def _chunk(self):
+        return self.state.function.chunk
+
+    def _emit(self, *bytes_):
+        chunk = self._chunk
+        for byte in bytes_:
+            chunk.write(byte, self.line)
+
+    def _emit_short(self, op, operand):
+        self._emit(op, (operand >> 8) & 0xff, operand & 0xff)
+
+    def _make_constant(self, value):
+        index = self._chunk.add_constant(value)
+        if index > UINT16_MAX:
+            self._error("Too many constants in one chunk.")
+            return 0
+        return index
+
+    def _emit_constant(self, value):
+        self._emit_short(OP_CONSTANT, self._make_constant(value))
+
+    def _emit_jump(self, op):
+        self._emit(op, 0xff, 0xff)
+        return len(self._chunk.code) - 2
+
+    def _patch_jump(self, offset):
+        code = self._chunk.code
+        jump = len(code) - offset - 2
+        if jump > UINT16_MAX:
+            self._error("Too much code to jump over.")
+
+        code[offset] = (jump >> 8) & 0xff
+        code[offset + 1] = jump & 0xff
+
+    def _emit_loop(self, loop_start):
+        offset = len(self._chunk.code) - loop_start + 3
+        if offset > UINT16_MAX:
+            self._error("Loop body too large.")
+        self._emit_short(OP_LOOP, offset)
+
+    def _end_function(self):
+        self._emit(OP_NIL, OP_RETURN)
+        function = self.state.function
+        function.chunk.freeze()
+        self.state = self.state.enclosing
+        return function
+
+    # -- scopes and variables -------------------------------------------
+
+    def _begin_scope(self):
+        self.state.scope_depth += 1
+
+    def _end_scope(self):
+        state = self.state
+        state.scope_depth -= 1
+
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals.pop().is_captured:
+                self._emit(OP_CLOSE_UPVALUE)
+            else:
+                self._emit(OP_POP)
+
+    def _declare_variable(self, name):
+        """Adds a local for `name` if we are in a scope; globals need nothing."""
+        if self.state.scope_depth == 0:
+            return
+
+        if len(self.state.locals) == UINT8_COUNT:
+            self._error("Too many local variables in function.")
+            return
+        self.state.locals.append(_Local(name.lexeme, self.state.scope_depth))
+
+    def _define_variable(self, name):
+        if self.state.scope_depth > 0:
+            # the value is already sitting in the local's stack slot
+            return
+        self._emit_short(OP_DEFINE_GLOBAL, self._make_constant(name.lexeme))
+
+    def _resolve_local(self, state, name):
+        for index in range(len(state.locals) - 1, -1, -1):
+            if state.locals[index].name == name.lexeme:
+                return index
+        return -1
+
+    def _add_upvalue(self, state, index, is_local):
+        upvalue = (index, is_local)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        if len(state.upvalues) == UINT8_COUNT:
+            self._error("Too many closure variables in function.")
+            return 0
+
+        state.upvalues.append(upvalue)
+        state.function.upvalue_count = len(state.upvalues)
+        return len(state.upvalues) - 1
+
+    def _resolve_upvalue(self, state, name):
+        if state.enclosing is None:
+            return -1
+
+        local = self._resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self._add_upvalue(state, local, True)
+
+        upvalue = self._resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self._add_upvalue(state, upvalue, False)
+
+        return -1
+
+    def _named_variable(self, name, can_assign):
+        """Emits a get (or, with `can_assign`, a set) of the variable `name`."""
+        slot = self._resolve_local(self.state, name)
+        if slot != -1:
+            self._emit(OP_SET_LOCAL if can_assign else OP_GET_LOCAL, slot)
+            return
+
+        slot = self._resolve_upvalue(self.state, name)
+        if slot != -1:
+            self._emit(OP_SET_UPVALUE if can_assign else OP_GET_UPVALUE, slot)
+            return
+
+        self._emit_short(OP_SET_GLOBAL if can_assign else OP_GET_GLOBAL, self._make_constant(name.lexeme))
+
+    # -- statements -----------------------------------------------------
+
+    def visit_BlockStmt(self, stmt):
+        self._begin_scope()
+        for statement in stmt.statements:
+            self._compile_stmt(statement)
+        self._end_scope()
+
+    def visit_ExpressionStmt(self, stmt):
+        self._compile_expr(stmt.expression)
+        self._emit(OP_POP)
+
+    def visit_ForStmt(self, stmt):
+        self._begin_scope()
+        if stmt.initializer is not None:
+            self._compile_stmt(stmt.initializer)
+
+        loop_start = len(self._chunk.code)
+        self._compile_expr(stmt.condition)
+        exit_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+        self._emit(OP_POP)
+        self._compile_stmt(stmt.body)
+        if stmt.increment is not None:
+            self._compile_expr(stmt.increment)
+            self._emit(OP_POP)
+        self._emit_loop(loop_start)
+
+        self._patch_jump(exit_jump)
+        self._emit(OP_POP)
+        self._end_scope()
+
+    def visit_FunctionStmt(self, stmt):
+        self._at(stmt.name)
+        self._declare_variable(stmt.name)
+
+        self.state = _FunctionState(self.state, VMFunction(stmt.name.lexeme, len(stmt.params)))
+        self._begin_scope()
+        for param in stmt.params:
+            self._at(param)
+            self._declare_variable(param)
+        for statement in stmt.body:
+            self._compile_stmt(statement)
+
+        upvalues = self.state.upvalues
+        function = self._end_function()
+
+        self._at(stmt.name)
+        self._emit_short(OP_CLOSURE, self._make_constant(function))
+        for index, is_local in upvalues:
+            self._emit(1 if is_local else 0, index)
+
+        self._define_variable(stmt.name)
+
+    def visit_IfStmt(self, stmt):
+        self._compile_expr(stmt.condition)
+
+        then_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+        self._emit(OP_POP)
+        self._compile_stmt(stmt.then_branch)
+        else_jump = self._emit_jump(OP_JUMP)
+
+        self._patch_jump(then_jump)
+        self._emit(OP_POP)
+        if stmt.else_branch is not None:
+            self._compile_stmt(stmt.else_branch)
+        self._patch_jump(else_jump)
+
+    def visit_PrintStmt(self, stmt):
+        self._compile_expr(stmt.expression)
+        self._emit(OP_PRINT)
+
+    def visit_ReturnStmt(self, stmt):
+        if isinstance(stmt.value, Expr.Call):
+            # `return f(...)` reuses this function's frame for the call. The
+            # OP_RETURN after it is only reached when f is a native.
+            call = stmt.value
+            self._compile_expr(call.callee)
+            for argument in call.arguments:
+                self._compile_expr(argument)
+            self._at(call.paren)
+            self._emit(OP_TAIL_CALL, len(call.arguments))
+            self._emit(OP_RETURN)
+            return
+
+        self._at(stmt.keyword)
+        if stmt.value is None:
+            self._emit(OP_NIL)
+        else:
+            self._compile_expr(stmt.value)
+        self._emit(OP_RETURN)
+
+    def visit_VarStmt(self, stmt):
+        self._at(stmt.name)
+        if stmt.initializer is None:
+            self._emit(OP_NIL)
+        else:
+            self._compile_expr(stmt.initializer)
+
+        # declared after the initializer so that `var a = a;` in a block
+        # still refers to the enclosing `a` (the resolver rejects it anyway)
+        self._declare_variable(stmt.name)
+        self._define_variable(stmt.name)
+
+    def visit_WhileStmt(self, stmt):
+        loop_start = len(self._chunk.code)
+        self._compile_expr(stmt.condition)
+
+        exit_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+        self._emit(OP_POP)
+        self._compile_stmt(stmt.body)
+        self._emit_loop(loop_start)
+
+        self._patch_jump(exit_jump)
+        self._emit(OP_POP)
+
+    # -- expressions ----------------------------------------------------
+
+    def visit_AssignExpr(self, expr):
+        self._compile_expr(expr.value)
+        self._at(expr.name)
+        self._named_variable(expr.name, True)
+
+    def visit_BinaryExpr(self, expr):
+        self._compile_expr(expr.left)
+        self._compile_expr(expr.right)
+        self._at(expr.operator)
+        self._emit(BINARY_OPS[expr.operator.type])
+
+    def visit_CallExpr(self, expr):
+        self._compile_expr(expr.callee)
+        for argument in expr.arguments:
+            self._compile_expr(argument)
+        self._at(expr.paren)
+        self._emit(OP_CALL, len(expr.arguments))
+
+    def visit_GroupingExpr(self, expr):
+        self._compile_expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        if expr.value is None:
+            self._emit(OP_NIL)
+        elif expr.value is True:
+            self._emit(OP_TRUE)
+        elif expr.value is False:
+            self._emit(OP_FALSE)
+        else:
+            self._emit_constant(expr.value)
+
+    def visit_LogicalExpr(self, expr):
+        self._compile_expr(expr.left)
+        self._at(expr.operator)
+
+        if expr.operator.type == TokenType.OR:
+            else_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+            end_jump = self._emit_jump(OP_JUMP)
+            self._patch_jump(else_jump)
+        else:
+            end_jump = self._emit_jump(OP_JUMP_IF_FALSE)
+
+        self._emit(OP_POP)
+        self._compile_expr(expr.right)
+        self._patch_jump(end_jump)
+
+    def visit_UnaryExpr(self, expr):
+        self._compile_expr(expr.right)
+        self._at(expr.operator)
+        if expr.operator.type == TokenType.MINUS:
+            self._emit(OP_NEGATE)
+        else:
+            self._emit(OP_NOT)
+
+    def visit_VariableExpr(self, expr):
+        self._at(expr.name)
+        self._named_variable(expr.name, False)
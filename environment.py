@@ -1,20 +1,70 @@
+import itertools
+
+from runtime_error import LoxRuntimeError
+
+# Epochs are unique across all GlobalEnvironments, so an inline cache filled
+# by one interpreter never validates against another one's globals.
+_epochs = itertools.count()
+
+# most spare Environments kept for reuse by one block or function; more are
+# only needed while it recurses
+FREE_LIST_SIZE = 16
+
+
 class Environment():
-    values = {}
+    """
+    A local scope. The resolver has already worked out which slot each local
+    variable lives in, so the values are kept in a fixed-size list and a lookup
+    is a number of hops up the enclosing chain plus an index.
+    """
+    __slots__ = ('enclosing', 'values')
 
-    def __init__(self, enclosing=None):
+    def __init__(self, enclosing=None, size=0):
         self.enclosing = enclosing
+        self.values = [None] * size
+
+    def define(self, slot, value):
+        self.values[slot] = value
+
+    def ancestor(self, distance):
+        environment = self
+        while distance:
+            environment = environment.enclosing
+            distance -= 1
+        return environment
+
+    def get_at(self, distance, slot):
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance, slot, value):
+        self.ancestor(distance).values[slot] = value
+
+
+class GlobalEnvironment():
+    """
+    Globals are late bound (a function body may refer to a global that is
+    declared after it), so they stay in a dict keyed by name.
+
+    Inline caches in the interpreter remember what a global name resolved to
+    together with `epoch`, and add the name to `watched`. Redefining or
+    assigning a watched name moves to a new epoch, invalidating them all.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.epoch = next(_epochs)
+        self.watched = set()
 
     def define(self, name, value):
         self.values[name] = value
+        if name in self.watched:
+            self.epoch = next(_epochs)
 
     def get(self, name):
         if name.lexeme in self.values:
             return self.values[name.lexeme]
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-
-        raise RuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
+        raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
 
     def assign(self, name, value):
         """
@@ -23,10 +73,8 @@ class Environment():
         """
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
+            if name.lexeme in self.watched:
+                self.epoch = next(_epochs)
             return
 
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-
-        raise RuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
\ No newline at end of file
+        raise LoxRuntimeError(name, "Undefined variable '{}'.".format(name.lexeme))
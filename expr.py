@@ -32,22 +32,28 @@ class Visitor(ABC):
         pass
 
 class Expr(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor):
         '''Call a method on the visitor based on your class name'''
         pass
 
 class Assign(Expr):
+    __slots__ = ('name', 'value', 'depth', 'slot')
 
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_AssignExpr(self)
 
 
 class Binary(Expr):
+    __slots__ = ('left', 'operator', 'right')
 
     def __init__(self, left, operator, right):
         self.left = left
@@ -59,17 +65,22 @@ class Binary(Expr):
 
 
 class Call(Expr):
+    __slots__ = ('callee', 'paren', 'arguments', 'cache_callee', 'cache_arity', 'cache_epoch')
 
     def __init__(self, callee, paren, arguments):
         self.callee = callee
         self.paren = paren
         self.arguments = arguments
+        self.cache_callee = None
+        self.cache_arity = None
+        self.cache_epoch = None
 
     def accept(self, visitor):
         return visitor.visit_CallExpr(self)
 
 
 class Grouping(Expr):
+    __slots__ = ('expression',)
 
     def __init__(self, expression):
         self.expression = expression
@@ -79,6 +90,7 @@ class Grouping(Expr):
 
 
 class Literal(Expr):
+    __slots__ = ('value',)
 
     def __init__(self, value):
         self.value = value
@@ -88,6 +100,7 @@ class Literal(Expr):
 
 
 class Logical(Expr):
+    __slots__ = ('left', 'operator', 'right')
 
     def __init__(self, left, operator, right):
         self.left = left
@@ -99,6 +112,7 @@ class Logical(Expr):
 
 
 class Unary(Expr):
+    __slots__ = ('operator', 'right')
 
     def __init__(self, operator, right):
         self.operator = operator
@@ -109,11 +123,33 @@ class Unary(Expr):
 
 
 class Variable(Expr):
+    __slots__ = ('name', 'depth', 'slot')
 
     def __init__(self, name):
         self.name = name
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_VariableExpr(self)
 
 
+VISIT_METHODS = {
+    Assign: 'visit_AssignExpr',
+    Binary: 'visit_BinaryExpr',
+    Call: 'visit_CallExpr',
+    Grouping: 'visit_GroupingExpr',
+    Literal: 'visit_LiteralExpr',
+    Logical: 'visit_LogicalExpr',
+    Unary: 'visit_UnaryExpr',
+    Variable: 'visit_VariableExpr',
+}
+
+
+def dispatch_table(visitor):
+    '''
+    Maps each node class to the matching bound visit method of `visitor`, so
+    a visitor can dispatch with `table[node.__class__](node)` instead of
+    going through accept().
+    '''
+    return {cls: getattr(visitor, name) for cls, name in VISIT_METHODS.items()}
@@ -1,16 +1,55 @@
+import expr as Expr
+import stmt as Stmt
 from expr import Visitor as ExprVisitor
 from lox_callable import LoxCallable, _Clock, LoxFunction
 from stmt import Visitor as StmtVisitor
 from runtime_error import LoxRuntimeError
 from tokentype import TokenType
-from environment import Environment
+from environment import FREE_LIST_SIZE, Environment, GlobalEnvironment
+from return_value import Return
+from memo import MemoizedFunction
+from output import OutputSink
+import quickening
+from rope import STRING_TYPES, Rope, concat
 
 GLOBALS = {"clock": _Clock}
 
+def stringify(obj):
+    if obj is None:
+        return 'None'
+
+    if isinstance(obj, float):
+        str_obj = str(obj)
+        if str_obj.endswith('.0'):
+            str_obj = str_obj[:-2]
+
+        return str_obj
+
+    return str(obj)
+
 class Interpreter(ExprVisitor, StmtVisitor):
-    def __init__(self):
-        self.globals = Environment()
+    def __init__(self, compile_closures=False, memo=None, output=None, jit=None):
+        """
+        With `compile_closures`, interpret() first turns the program into
+        nested Python closures (see closure_compiler) and runs those instead
+        of walking the AST. With a memo.Memo, the pure functions it wants
+        remember their results; the program must have been through
+        purity.PurityAnalyzer. `output` is the output.OutputSink `print`
+        writes to, by default one for sys.stdout. With a jit.Jit, functions
+        and loops that get hot run compiled to Python (see jit).
+        """
+        self.globals = GlobalEnvironment()
         self.environment = self.globals
+        self.compile_closures = compile_closures
+        self.memo = memo
+        self.jit = jit
+        self.output = OutputSink() if output is None else output
+        # node class -> bound visit method, used instead of accept()
+        self._visit = {**Expr.dispatch_table(self), **Stmt.dispatch_table(self),
+                       **quickening.dispatch_table(self)}
+
+        for name, native in GLOBALS.items():
+            self.globals.define(name, native())
 
     def visit_LiteralExpr(self, expr):
         return expr.value
@@ -28,10 +67,10 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return self._evaluate(expr.right)
 
     def _evaluate(self, expr):
-        return expr.accept(self)
+        return self._visit[expr.__class__](expr)
 
     def execute(self, stmt):
-        stmt.accept(self)
+        self._visit[stmt.__class__](stmt)
 
     def execute_block(self, statements, environment):
         previous_environment = self.environment
@@ -44,16 +83,119 @@ class Interpreter(ExprVisitor, StmtVisitor):
             self.environment = previous_environment
 
     def visit_BlockStmt(self, stmt):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        if not stmt.scope_size:
+            # declares nothing, so it has no scope of its own
+            visit = self._visit
+            for statement in stmt.statements:
+                visit[statement.__class__](statement)
+            return None
+
+        environment = self._new_scope(stmt)
+        try:
+            self.execute_block(stmt.statements, environment)
+        finally:
+            self._free_scope(stmt, environment)
+        return None
+
+    def _new_scope(self, stmt):
+        """An Environment for the scope of a Block or For, reused when no closure can capture it."""
+        if stmt.captured:
+            return Environment(self.environment, stmt.scope_size)
+
+        frames = stmt.frames
+        if frames:
+            environment = frames.pop()
+            environment.enclosing = self.environment
+            return environment
+        if frames is None:
+            stmt.frames = []
+        return Environment(self.environment, stmt.scope_size)
+
+    def _free_scope(self, stmt, environment):
+        if not stmt.captured and len(stmt.frames) < FREE_LIST_SIZE:
+            stmt.frames.append(environment)
+
+    def visit_ForStmt(self, stmt):
+        if not stmt.scope_size:
+            self._run_for(stmt)
+            return None
+
+        previous_environment = self.environment
+        environment = self._new_scope(stmt)
+        try:
+            self.environment = environment
+            self._run_for(stmt)
+        finally:
+            self.environment = previous_environment
+            self._free_scope(stmt, environment)
         return None
 
+    def _run_for(self, stmt):
+        visit = self._visit
+        initializer = stmt.initializer
+        if initializer is not None:
+            visit[initializer.__class__](initializer)
+        if self.jit is not None and self._run_tiered(stmt):
+            return
+
+        counter = stmt.counter
+        if counter is None:
+            counter = stmt.counter = quickening.counting_loop(stmt)
+        if counter:
+            self._run_counting_loop(stmt, *counter)
+            return
+
+        condition, increment, body = stmt.condition, stmt.increment, stmt.body
+        run_body = visit[body.__class__]
+        while True:
+            # (condition and increment are looked up every time round, since
+            # quickening changes node classes)
+            value = visit[condition.__class__](condition)
+            if value is None or value is False:
+                return
+            run_body(body)
+            if increment is not None:
+                visit[increment.__class__](increment)
+
+    def _run_counting_loop(self, stmt, slot, limit, step):
+        """
+        Runs `for (var i = ...; i < limit; i = i + step)` reading and writing
+        i directly. Whenever i or the limit is not a number, the condition or
+        increment falls back to the generic path.
+        """
+        visit = self._visit
+        condition, increment, body = stmt.condition, stmt.increment, stmt.body
+        run_body = visit[body.__class__]
+        values = self.environment.values
+        constant = limit.value if isinstance(limit, Expr.Literal) and limit.value.__class__ is float else None
+
+        while True:
+            i = values[slot]
+            bound = constant if constant is not None else visit[limit.__class__](limit)
+            if i.__class__ is not float or bound.__class__ is not float:
+                # (raises the error `<` gives for anything but numbers)
+                self._binary(condition, i, bound)
+            if not i < bound:
+                return
+            run_body(body)
+            i = values[slot]
+            if i.__class__ is float:
+                values[slot] = i + step
+            else:
+                visit[increment.__class__](increment)
+
     def visit_ExpressionStmt(self, stmt):
         self._evaluate(stmt.expression)
         return None
 
     def visit_FunctionStmt(self, stmt):
-        func = LoxFunction(stmt, self.environment)
-        self.environment.define(stmt.name.lexeme, func)
+        if self.memo is not None and self.memo.wants(stmt):
+            func = MemoizedFunction(stmt, self.environment, self.memo, self.globals)
+        elif self.jit is not None:
+            func = self.jit.function(stmt, self.environment)
+        else:
+            func = LoxFunction(stmt, self.environment)
+        self._define(stmt, func)
         return None
 
     def visit_IfStmt(self, stmt):
@@ -66,27 +208,80 @@ class Interpreter(ExprVisitor, StmtVisitor):
 
     def visit_PrintStmt(self, stmt):
         value = self._evaluate(stmt.expression)
-        print(self._stringify(value))
+        self.output.write_line(self._stringify(value))
         return None
 
+    def visit_ReturnStmt(self, stmt):
+        value = None
+        if stmt.value is not None:
+            value = self._evaluate(stmt.value)
+
+        raise Return(value)
+
     def visit_VarStmt(self, stmt):
         value = None
         if stmt.initializer is not None:
             value = self._evaluate(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        self._define(stmt, value)
         return None
 
+    def _define(self, declaration, value):
+        if declaration.slot is None:
+            self.globals.define(declaration.name.lexeme, value)
+        else:
+            self.environment.define(declaration.slot, value)
+
     def visit_WhileStmt(self, stmt):
-        while self._is_truthy(self._evaluate(stmt.condition)):
-            self.execute(stmt.body)
+        if self.jit is not None and self._run_tiered(stmt):
+            return None
+
+        condition, body = stmt.condition, stmt.body
+        # looked up every time round, since quickening changes node classes
+        visit = self._visit
+        while self._is_truthy(visit[condition.__class__](condition)):
+            visit[body.__class__](body)
 
         return None
 
+    def _run_tiered(self, stmt):
+        """
+        Runs a While or For loop (past its initializer) for the jit: walked,
+        counting backedges, until it is hot, then compiled. Returns False,
+        leaving the rest of the loop to the caller, if it cannot be compiled.
+        """
+        jit = self.jit
+        tier = jit.tier(stmt)
+        if tier.code is None:
+            if tier.count >= jit.threshold:
+                return False
+
+            visit = self._visit
+            condition, body = stmt.condition, stmt.body
+            increment = stmt.increment if stmt.__class__ is Stmt.For else None
+            while True:
+                value = visit[condition.__class__](condition)
+                if value is None or value is False:
+                    return True
+                visit[body.__class__](body)
+                if increment is not None:
+                    visit[increment.__class__](increment)
+                tier.count += 1
+                if tier.count == jit.threshold:
+                    if not jit.compile(tier, stmt):
+                        return False
+                    break
+
+        tier.code(self, self.environment)
+        return True
+
     def visit_AssignExpr(self, expr):
         value = self._evaluate(expr.value)
 
-        self.environment.assign(expr.name, value)
+        if expr.depth is None:
+            self.globals.assign(expr.name, value)
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
         return value
 
     def _is_truthy(self, right):
@@ -102,9 +297,110 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return left == right
 
     def visit_BinaryExpr(self, expr):
-        left = self._evaluate(expr.left)
-        right = self._evaluate(expr.right)
+        # the first run takes the generic path, then specializes the node for
+        # this operator and these operand types (see quickening)
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        value = self._binary(expr, left, right)
+        expr.__class__ = quickening.binary_form(expr.operator.type, left, right)
+        return value
 
+    def visit_GenericBinaryExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        return self._binary(expr, left, right)
+
+    def _deoptimize_binary(self, expr, left, right):
+        expr.__class__ = quickening.GenericBinary
+        return self._binary(expr, left, right)
+
+    def visit_NumberAddExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left + right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_StringAddExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if (left.__class__ is str or left.__class__ is Rope) and (right.__class__ is str or right.__class__ is Rope):
+            return concat(left, right)
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberSubtractExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left - right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberMultiplyExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left * right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberDivideExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left / right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberGreaterExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left > right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberGreaterEqualExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left >= right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberLessExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left < right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_NumberLessEqualExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        if left.__class__ is float and right.__class__ is float:
+            return left <= right
+        return self._deoptimize_binary(expr, left, right)
+
+    def visit_EqualExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        return self._is_equal(left, right)
+
+    def visit_NotEqualExpr(self, expr):
+        visit = self._visit
+        left = visit[expr.left.__class__](expr.left)
+        right = visit[expr.right.__class__](expr.right)
+        return not self._is_equal(left, right)
+
+    def _binary(self, expr, left, right):
         op_type = expr.operator.type
 
         if op_type == TokenType.GREATER:
@@ -126,8 +422,8 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if op_type == TokenType.PLUS:
             if isinstance(left, float) & isinstance(right, float):
                 return float(left) + float(right)
-            if isinstance(left, str) & isinstance(right, str):
-                return str(left) + str(right)
+            if isinstance(left, STRING_TYPES) & isinstance(right, STRING_TYPES):
+                return concat(left, right)
             raise LoxRuntimeError(expr.operator, "Operands must be two numbers or two strings")
         if op_type == TokenType.SLASH:
             self._check_number_operands(expr.operator, left, right)
@@ -139,30 +435,77 @@ class Interpreter(ExprVisitor, StmtVisitor):
         if op_type == TokenType.BANG_EQUAL:
             return not self._is_equal(left, right)
         if op_type == TokenType.EQUAL_EQUAL:
-            return not self._is_equal(left, right)
+            return self._is_equal(left, right)
 
         return None
 
     def visit_CallExpr(self, expr):
-        callee = self._evaluate(expr.callee)
-        arguments = [self._evaluate(arg) for arg in expr.arguments]
-        if not isinstance(callee, LoxCallable):
-            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
-
-        if len(arguments) != callee.arity():
+        # Inline cache: a call site remembers the last callable it called and
+        # that callable's arity. A global callee is trusted without even
+        # looking it up while the globals' epoch is unchanged; any other
+        # callee skips the checks when it is the same object as last time.
+        # The callee is still only checked once the arguments have run.
+        globals_ = self.globals
+        if expr.cache_epoch == globals_.epoch:
+            callee = expr.cache_callee
+            arguments = [self._evaluate(arg) for arg in expr.arguments]
+        else:
+            callee = self._evaluate(expr.callee)
+            arguments = [self._evaluate(arg) for arg in expr.arguments]
+            # (a global callee also refills when only its epoch went stale; an
+            # empty cache has no arity, and must check even a nil callee)
+            if callee is not expr.cache_callee or expr.cache_epoch is not None or expr.cache_arity is None:
+                self._fill_call_cache(expr, callee)
+
+        if len(arguments) != expr.cache_arity:
             raise LoxRuntimeError(
-                expr.callee,
-                f"Function {callee} called with {len(args)} arguments, expected {len(arity())}",
+                expr.paren,
+                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
             )
 
-        return callee.call(self, arguments)
+        try:
+            return callee.call(self, arguments)
+        except RecursionError:
+            # the tree-walker nests Python frames for every Lox call
+            raise LoxRuntimeError(expr.paren, "Stack overflow.")
+
+    def _fill_call_cache(self, expr, callee):
+        if not isinstance(callee, LoxCallable):
+            raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
+
+        expr.cache_callee = callee
+        expr.cache_arity = callee.arity()
+        expr.cache_epoch = None
+        if isinstance(expr.callee, Expr.Variable) and expr.callee.depth is None:
+            name = expr.callee.name.lexeme
+            # (unless the arguments just reassigned it, before it was watched)
+            if self.globals.values.get(name) is callee:
+                self.globals.watched.add(name)
+                expr.cache_epoch = self.globals.epoch
 
     def visit_GroupingExpr(self, expr):
         return self._evaluate(expr.expression)
 
     def visit_UnaryExpr(self, expr):
         right = self._evaluate(expr.right)
+        value = self._unary(expr, right)
+        expr.__class__ = quickening.unary_form(expr.operator.type, right)
+        return value
+
+    def visit_GenericUnaryExpr(self, expr):
+        return self._unary(expr, self._evaluate(expr.right))
+
+    def visit_NumberNegateExpr(self, expr):
+        right = self._visit[expr.right.__class__](expr.right)
+        if right.__class__ is float:
+            return right * -1
+        expr.__class__ = quickening.GenericUnary
+        return self._unary(expr, right)
+
+    def visit_NotExpr(self, expr):
+        return not self._is_truthy(self._visit[expr.right.__class__](expr.right))
 
+    def _unary(self, expr, right):
         op_type = expr.operator.type
 
         if op_type == TokenType.MINUS:
@@ -174,7 +517,15 @@ class Interpreter(ExprVisitor, StmtVisitor):
         return None
 
     def visit_VariableExpr(self, expr):
-        return self.environment.get(expr.name)
+        depth = expr.depth
+        if depth is None:
+            return self.globals.get(expr.name)
+
+        environment = self.environment
+        while depth:
+            environment = environment.enclosing
+            depth -= 1
+        return environment.values[expr.slot]
 
     def _check_number_operands(self, operator, left, right):
         if isinstance(left, float) and isinstance(right, float):
@@ -188,23 +539,31 @@ class Interpreter(ExprVisitor, StmtVisitor):
         raise LoxRuntimeError(operator, "Operand must be a number")
 
     def _stringify(self, obj):
-        if obj is None:
-            return 'None'
-
-        if isinstance(obj, float):
-            str_obj = str(obj)
-            if str_obj.endswith('.0'):
-                str_obj = str_obj.rstrip('.0')
-
-            return str_obj
-
-        return str(obj)
-
-    def interpret(self, statements):
+        return stringify(obj)
+
+    def interpret(self, statements, flush=True):
+        """
+        Runs `statements`; False if a runtime error stopped them. What they
+        printed is flushed when they end, unless `flush` is false because
+        more of the program follows (see main.run_stream).
+        """
         from main import run_time_error
 
         try:
-            for statement in statements:
-                self.execute(statement)
+            if self.compile_closures:
+                from closure_compiler import ClosureCompiler
+
+                for statement in ClosureCompiler(self).compile(statements):
+                    statement(self.environment)
+            else:
+                for statement in statements:
+                    self.execute(statement)
         except LoxRuntimeError as e:
+            # what the program printed comes before the error
+            self.output.flush()
             run_time_error(e)
+            return False
+        finally:
+            if flush:
+                self.output.flush()
+        return True
@@ -0,0 +1,433 @@
+"""
+Tiered execution for the tree-walking Interpreter, used by `main.py --jit`.
+
+Functions and loops start out tree-walked, counting their calls, or a
+loop's backedges (iterations). When a declaration's or loop's count reaches
+the threshold, its body is compiled to a Python function with the
+transpiler's code generator (see transpiler): a function runs compiled from
+its next call on, a loop from its next iteration, and both stay compiled.
+
+Compiled code shares every variable with the tree-walker. Locals of the
+compiled function or loop become Python locals, locals of enclosing scopes
+are read and written in their Environments, and globals in the
+interpreter's GlobalEnvironment. Calls go through LoxCallable.call(), so
+compiled code calls natives, walked functions and compiled ones alike.
+
+A function or loop that declares a function, which would close over Python
+locals, is not compiled and stays with the interpreter.
+"""
+import ast
+import time
+import warnings
+
+import expr as Expr
+import stmt as Stmt
+from lox_callable import LoxCallable, LoxFunction
+from return_value import Return
+from rope import STRING_TYPES, concat
+from source_lines import first_line
+import transpiler
+from transpiler import _helper_call, _is_type, _load, _store
+
+DEFAULT_THRESHOLD = 500
+FILENAME = '<lox jit>'
+
+
+class Unsupported(Exception):
+    """Raised for code the jit leaves to the interpreter."""
+
+
+class _OuterDecl(transpiler._Decl):
+    """A local of an Environment enclosing the compiled function or loop."""
+
+    def __init__(self, name, depth, slot):
+        super().__init__(name, None, False)
+        # Environments above the innermost enclosing one
+        self.depth = depth
+        self.slot = slot
+
+
+class _Analyzer(transpiler._Analyzer):
+    def __init__(self):
+        super().__init__()
+        self.outer = {}
+
+    def _declare(self, node, slot, is_function=False):
+        if slot is None:
+            raise Unsupported("declares global '{}'".format(node.name.lexeme))
+        super()._declare(node, slot, is_function)
+
+    def _reference(self, node, assign):
+        if node.depth is None or node.depth < len(self.scopes):
+            super()._reference(node, assign)
+            return
+
+        key = (node.depth - len(self.scopes), node.slot)
+        decl = self.outer.get(key)
+        if decl is None:
+            decl = self.outer[key] = _OuterDecl(node.name.lexeme, *key)
+        self.decls[id(node)] = decl
+
+    def visit_FunctionStmt(self, stmt):
+        raise Unsupported("declares function '{}'".format(stmt.name.lexeme))
+
+
+def _env_values(base, depth):
+    # _env.enclosing. ... .values
+    node = _load('_env')
+    for _ in range(base + depth):
+        node = ast.Attribute(value=node, attr='enclosing', ctx=ast.Load())
+    return ast.Attribute(value=node, attr='values', ctx=ast.Load())
+
+
+def _slot(decl, ctx):
+    return ast.Subscript(value=_load('_e{}'.format(decl.depth)), slice=ast.Constant(decl.slot), ctx=ctx)
+
+
+class _Transpiler(transpiler.Transpiler):
+    """
+    Emits one Lox function body or loop as a Python function taking the
+    interpreter, the Environment it runs in and the function's arguments.
+    """
+
+    def __init__(self, analyzer, in_loop):
+        self.main = None
+        self.decls = analyzer.decls
+        self.functions = analyzer.functions
+        self.function = analyzer.function
+        self.line = 0
+        self.arities = {}
+        self.defined_globals = set()
+        self.in_loop = in_loop
+        self.uses_globals = False
+
+    def function_def(self, name, analyzer, body, params=(), base=0, locals_=()):
+        """
+        Wraps `body`. `base` Environments above `_env` are the unit's own,
+        and `locals_` lists (slot, decl) pairs of `_env` loaded into Python
+        locals first.
+        """
+        prologue = [ast.Assign(targets=[_store(decl.py_name)], value=ast.Subscript(
+            value=_env_values(0, 0), slice=ast.Constant(slot), ctx=ast.Load())) for slot, decl in locals_]
+        for depth in sorted({decl.depth for decl in analyzer.outer.values()}):
+            prologue.append(ast.Assign(targets=[_store('_e{}'.format(depth))], value=_env_values(base, depth)))
+        if self.uses_globals:
+            prologue.append(ast.Assign(targets=[_store('_GE')], value=ast.Attribute(
+                value=_load('_I'), attr='globals', ctx=ast.Load())))
+            for local, attr in (('_GV', 'values'), ('_GW', 'watched')):
+                prologue.append(ast.Assign(targets=[_store(local)], value=ast.Attribute(
+                    value=_load('_GE'), attr=attr, ctx=ast.Load())))
+
+        args = ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg=arg) for arg in ('_I', '_env')] +
+            [ast.arg(arg=decl.py_name) for decl in params],
+            vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        for node in prologue:
+            node.lineno = transpiler.LINE_OFFSET
+        return ast.FunctionDef(name=name, args=args, body=prologue + body or [ast.Pass()],
+                               decorator_list=[], returns=None, lineno=transpiler.LINE_OFFSET)
+
+    def _global(self, name):
+        self.uses_globals = True
+        return ast.Constant(name)
+
+    # -- statements -----------------------------------------------------
+
+    def visit_PrintStmt(self, stmt):
+        value = self._expr(stmt.expression)
+        return [self._locate(ast.Expr(value=_helper_call('_print', _load('_I'), value)))]
+
+    def visit_ReturnStmt(self, stmt):
+        if not self.in_loop:
+            return super().visit_ReturnStmt(stmt)
+        # the loop's function returns through the tree-walker's Return
+        self._at(stmt.keyword)
+        value = ast.Constant(None) if stmt.value is None else self._expr(stmt.value)
+        return [self._locate(ast.Raise(exc=_helper_call('_Return', value), cause=None))]
+
+    # -- expressions ----------------------------------------------------
+
+    def _assign_statement(self, expr):
+        decl = self.decls.get(id(expr))
+        if decl is not None and not isinstance(decl, _OuterDecl):
+            return super()._assign_statement(expr)
+
+        value = self._expr(expr.value)
+        self._at(expr.name)
+        if decl is not None:
+            return [self._locate(ast.Assign(targets=[_slot(decl, ast.Store())], value=value))]
+
+        # a defined global nothing watches is just stored (see GlobalEnvironment)
+        name = self._global(expr.name.lexeme)
+        temp = self._temp()
+        plain = ast.BoolOp(op=ast.And(), values=[
+            ast.Compare(left=name, ops=[ast.In()], comparators=[_load('_GV')]),
+            ast.Compare(left=name, ops=[ast.NotIn()], comparators=[_load('_GW')]),
+        ])
+        return [
+            self._locate(ast.Assign(targets=[_store(temp)], value=value)),
+            self._locate(ast.If(
+                test=plain,
+                body=[ast.Assign(
+                    targets=[ast.Subscript(value=_load('_GV'), slice=name, ctx=ast.Store())],
+                    value=_load(temp))],
+                orelse=[ast.Expr(value=_helper_call(
+                    '_assign_global', _load('_GE'), name, _load(temp), ast.Constant(self.line)))])),
+        ]
+
+    def visit_AssignExpr(self, expr):
+        decl = self.decls.get(id(expr))
+        if decl is not None and not isinstance(decl, _OuterDecl):
+            return super().visit_AssignExpr(expr)
+
+        value = self._expr(expr.value)
+        self._at(expr.name)
+        if decl is not None:
+            return _helper_call('_set_slot', _load('_e{}'.format(decl.depth)), ast.Constant(decl.slot), value)
+        return _helper_call('_assign_global', _load('_GE'), self._global(expr.name.lexeme), value,
+                            ast.Constant(self.line))
+
+    def _plus(self, left, right, result, line):
+        # numbers are added here, strings (which may be ropes) by _add
+        left_temp, right_temp = self._temp(), self._temp()
+        numbers = ast.BinOp(
+            left=_is_type(ast.NamedExpr(target=_store(left_temp), value=self._expr(left)), 'float'),
+            op=ast.BitAnd(),
+            right=_is_type(ast.NamedExpr(target=_store(right_temp), value=self._expr(right)), 'float'))
+        return ast.IfExp(
+            test=numbers,
+            body=result(_load(left_temp), _load(right_temp)),
+            orelse=_helper_call('_add', _load(left_temp), _load(right_temp), ast.Constant(line)))
+
+    def visit_CallExpr(self, expr):
+        callee = self._expr(expr.callee)
+        self._at(expr.paren)
+        line = self.line
+        temp = self._temp()
+        callable_ = ast.IfExp(
+            test=_helper_call('isinstance', ast.NamedExpr(target=_store(temp), value=callee), _load('_LoxCallable')),
+            body=_load(temp),
+            orelse=self._fail('_not_callable', line))
+        arguments = [self._expr(argument) for argument in expr.arguments]
+        self._at(expr.paren)
+        return self._locate(_helper_call(
+            '_invoke', _load('_I'), callable_, ast.List(elts=arguments, ctx=ast.Load()), ast.Constant(line)))
+
+    def visit_VariableExpr(self, expr):
+        decl = self.decls.get(id(expr))
+        if decl is not None and not isinstance(decl, _OuterDecl):
+            return super().visit_VariableExpr(expr)
+
+        self._at(expr.name)
+        if decl is not None:
+            return _slot(decl, ast.Load())
+        name = self._global(expr.name.lexeme)
+        return self._locate(ast.IfExp(
+            test=ast.Compare(left=name, ops=[ast.In()], comparators=[_load('_GV')]),
+            body=ast.Subscript(value=_load('_GV'), slice=name, ctx=ast.Load()),
+            orelse=_helper_call('_undefined', name, ast.Constant(self.line))))
+
+
+# -- runtime support ------------------------------------------------------
+
+def _undefined(name, line):
+    raise transpiler._error(line, "Undefined variable '{}'.".format(name))
+
+
+def _not_callable(line):
+    raise transpiler._error(line, "Can only call functions and classes.")
+
+
+def _assign_global(globals_, name, value, line):
+    if name not in globals_.values:
+        _undefined(name, line)
+    # (define() moves a watched name to a new epoch, as assign() does)
+    globals_.define(name, value)
+    return value
+
+
+def _set_slot(values, slot, value):
+    values[slot] = value
+    return value
+
+
+def _add(left, right, line):
+    if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+        return concat(left, right)
+    transpiler._plus_error(line)
+
+
+def _print(interpreter, value):
+    interpreter.output.write_line(interpreter._stringify(value))
+
+
+def _invoke(interpreter, callee, args, line):
+    if len(args) != callee.arity():
+        raise transpiler._error(line, "Expected {} arguments but got {}.".format(callee.arity(), len(args)))
+    try:
+        return callee.call(interpreter, args)
+    except RecursionError:
+        raise transpiler._error(line, "Stack overflow.")
+
+
+_NAMESPACE = {
+    '_undefined': _undefined,
+    '_not_callable': _not_callable,
+    '_assign_global': _assign_global,
+    '_set_slot': _set_slot,
+    '_add': _add,
+    '_print': _print,
+    '_invoke': _invoke,
+    '_numbers_error': transpiler._numbers_error,
+    '_plus_error': transpiler._plus_error,
+    '_number_error': transpiler._number_error,
+    '_LoxCallable': LoxCallable,
+    '_Return': Return,
+}
+
+
+def _build(name, function_def):
+    module = ast.fix_missing_locations(ast.Module(body=[function_def], type_ignores=[]))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', SyntaxWarning)
+        code = compile(module, FILENAME, 'exec')
+    namespace = dict(_NAMESPACE)
+    exec(code, namespace)
+    return namespace[name]
+
+
+def compile_function(declaration):
+    """
+    A Python function running the body of the Lox function `declaration`,
+    called as f(interpreter, closure, *args). Raises Unsupported.
+    """
+    analyzer = _Analyzer()
+    scope = [None] * declaration.scope_size
+    params = [analyzer._new_decl(param) for param in declaration.params]
+    scope[:len(params)] = params
+    analyzer.scopes.append(scope)
+    for statement in declaration.body:
+        statement.accept(analyzer)
+
+    emitter = _Transpiler(analyzer, in_loop=False)
+    body = emitter._block(declaration.body)
+    name = 'lox_' + declaration.name.lexeme
+    return _build(name, emitter.function_def(name, analyzer, body, params))
+
+
+def compile_loop(stmt):
+    """
+    A Python function running the While or For loop `stmt` from the start of
+    an iteration (a For's initializer has run), called as f(interpreter,
+    environment) with the interpreter's current environment. A `return` in
+    the loop raises Return. Raises Unsupported.
+    """
+    analyzer = _Analyzer()
+    analyzer.loop_depth = 1
+    increment = stmt.increment if isinstance(stmt, Stmt.For) else None
+    locals_ = []
+    if isinstance(stmt, Stmt.For) and stmt.scope_size:
+        # the loop variable's Environment is only the loop's: nothing else
+        # can see the variable, so it moves into a Python local
+        scope = [None] * stmt.scope_size
+        var = stmt.initializer
+        scope[var.slot] = analyzer._new_decl(var.name)
+        locals_.append((var.slot, scope[var.slot]))
+        analyzer.scopes.append(scope)
+    stmt.condition.accept(analyzer)
+    stmt.body.accept(analyzer)
+    if increment is not None:
+        increment.accept(analyzer)
+
+    emitter = _Transpiler(analyzer, in_loop=True)
+    test = emitter._truthy(stmt.condition)
+    body = emitter._block([stmt.body])
+    if increment is not None:
+        body.extend(emitter.visit_ExpressionStmt(Stmt.Expression(increment)))
+    loop = emitter._locate(ast.While(test=test, body=body or [ast.Pass()], orelse=[]))
+    return _build('lox_loop', emitter.function_def('lox_loop', analyzer, [loop], base=len(locals_), locals_=locals_))
+
+
+# -- tiering ---------------------------------------------------------------
+
+class Tier():
+    """The call or backedge count of one declaration or loop, and its compiled code."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.code = None
+        self.seconds = 0.0
+        # why it could not be compiled
+        self.reason = None
+
+
+class Jit():
+    """
+    Settings and compile statistics shared by the functions and loops of one
+    interpreter. A function declaration or loop is compiled once it has been
+    called or gone round `threshold` times, counting all its closures or
+    runs together.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        # declaration or loop -> Tier
+        self.tiers = {}
+
+    def tier(self, node):
+        tier = self.tiers.get(node)
+        if tier is None:
+            if isinstance(node, Stmt.Function):
+                name = "{}:{}".format(node.name.lexeme, node.name.line)
+            else:
+                name = "{} loop:{}".format('for' if isinstance(node, Stmt.For) else 'while', first_line(node))
+            tier = self.tiers[node] = Tier(name)
+        return tier
+
+    def function(self, declaration, closure):
+        return TieredFunction(declaration, closure, self)
+
+    def compile(self, tier, node):
+        """Compiles `node` into `tier.code`; returns False if it cannot be."""
+        start = time.perf_counter()
+        try:
+            if isinstance(node, Stmt.Function):
+                tier.code = compile_function(node)
+            else:
+                tier.code = compile_loop(node)
+        except Unsupported as e:
+            tier.reason = str(e)
+        tier.seconds = time.perf_counter() - start
+        return tier.code is not None
+
+
+class TieredFunction(LoxFunction):
+    """A LoxFunction that counts its calls and runs compiled once its declaration is hot."""
+
+    def __init__(self, declaration, closure, jit):
+        super().__init__(declaration, closure)
+        self.jit = jit
+        self.tier = jit.tier(declaration)
+
+    def call(self, interpreter, args):
+        tier = self.tier
+        if tier.code is None:
+            tier.count += 1
+            if tier.count != self.jit.threshold or not self.jit.compile(tier, self.declaration):
+                return super().call(interpreter, args)
+        return tier.code(interpreter, self.closure, *args)
+
+
+def report(jit, out):
+    tiers = [tier for tier in jit.tiers.values() if tier.count >= jit.threshold]
+    out.write("{:>10}  {}\n".format("compile ms", "function or loop"))
+    for tier in sorted(tiers, key=lambda tier: -tier.seconds):
+        note = "" if tier.reason is None else "  (interpreted: {})".format(tier.reason)
+        out.write("{:>10.2f}  {}{}\n".format(tier.seconds * 1000, tier.name, note))
+
+    compiled = [tier for tier in tiers if tier.code is not None]
+    functions = sum(1 for tier in compiled if ' loop:' not in tier.name)
+    out.write("{} functions and {} loops tiered up, {} left interpreted, {:.2f} ms compiling\n".format(
+        functions, len(compiled) - functions, len(tiers) - len(compiled),
+        sum(tier.seconds for tier in tiers) * 1000))
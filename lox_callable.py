@@ -2,10 +2,16 @@ import time
 
 from abc import ABC
 
-from environment import Environment
+from environment import FREE_LIST_SIZE, Environment
+from rope import flatten
+from return_value import Return
 
 
 class LoxCallable(ABC):
+    # natives set this when calling them has no effects and their result
+    # depends only on the arguments (see purity)
+    pure = False
+
     def call(self, interpreter, args):
         raise NotImplementedError()
 
@@ -22,20 +28,60 @@ class _Clock(LoxCallable):
     def to_string(self):
         return "<native fn>"
 
+def to_lox(value):
+    """A Python value handed to Lox, with ints (but not bools) made Lox numbers."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+class NativeFunction(LoxCallable):
+    """A Python function made callable from Lox, for embedders (see lox_runtime)."""
+
+    def __init__(self, name, function, arity, pure=False):
+        self.name = name
+        self.function = function
+        self._arity = arity
+        self.pure = pure
+
+    def call(self, interpreter, args):
+        return to_lox(self.function(*[flatten(arg) for arg in args]))
+
+    def arity(self):
+        return self._arity
+
+    def __repr__(self):
+        return f"<native fn {self.name}>"
+
 class LoxFunction(LoxCallable):
     def __init__(self, declaration, closure):
         self.declaration = declaration
         self.closure = closure
+        # spare environments for calls, unless a closure might capture one
+        self.frames = [] if declaration.captured is False else None
 
     def arity(self):
         return len(self.declaration.params)
 
     def call(self, interpreter, args):
-        env = Environment(self.closure)
-        for param, arg in zip([p.lexeme for p in self.declaration.params], args):
-            env.define(param, arg)
+        frames = self.frames
+        if frames:
+            # (leftover values are harmless: every slot is defined before it is read)
+            env = frames.pop()
+        else:
+            env = Environment(self.closure, self.declaration.scope_size)
+        # parameters occupy the first slots of the function's scope
+        env.values[:len(args)] = args
+
+        try:
+            interpreter.execute_block(self.declaration.body, env)
+        except Return as return_value:
+            return return_value.value
+        finally:
+            if frames is not None and len(frames) < FREE_LIST_SIZE:
+                frames.append(env)
 
-        interpreter.execute_block(self.declaration.body, env)
+        return None
 
     def __repr__(self):
         return f"<fn {self.declaration.name.lexeme} >"
@@ -0,0 +1,188 @@
+"""
+An embedding API: LoxRuntime runs Lox snippets from Python and hands back
+their value, output and errors instead of printing them.
+
+    runtime = LoxRuntime(globals={'rate': 0.2})
+    runtime.define_native('round', lambda x: float(round(x)), 1, pure=True)
+    result = runtime.eval('round(100 * rate);')
+    result.value     # 20.0
+    result.output    # what the snippet printed
+    result.errors    # LoxErrors, empty when it ran to the end
+"""
+import inspect
+from collections import OrderedDict
+
+import stmt as Stmt
+from environment import GlobalEnvironment
+from interpreter import Interpreter
+from lox_callable import NativeFunction, to_lox
+from optimizer import Optimizer
+from output import OutputSink
+from parse import Parser
+from resolver import Resolver
+from rope import flatten
+from runtime_error import LoxRuntimeError
+from scanner import Scanner
+from tokentype import TokenType
+
+DEFAULT_CACHE_SIZE = 256
+
+SYNTAX = 'syntax'
+RUNTIME = 'runtime'
+
+
+class LoxError():
+    def __init__(self, kind, line, message, where=""):
+        # SYNTAX (scanner, parser and resolver errors) or RUNTIME
+        self.kind = kind
+        self.line = line
+        self.message = message
+        self.where = where
+
+    def __str__(self):
+        if self.kind == RUNTIME:
+            return '{}\n[line {}]'.format(self.message, self.line)
+        return '[line {}] Error{}: {}'.format(self.line, self.where, self.message)
+
+    def __repr__(self):
+        return '<LoxError {} line {}: {}>'.format(self.kind, self.line, self.message)
+
+
+class Result():
+    def __init__(self, value, output, errors):
+        # the value of a trailing expression statement, else None
+        self.value = value
+        self.output = output
+        self.errors = errors
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class _Compiled():
+    __slots__ = ('statements', 'last_expression', 'errors')
+
+    def __init__(self, statements, last_expression, errors):
+        self.statements = statements
+        self.last_expression = last_expression
+        self.errors = errors
+
+
+class LoxRuntime():
+    """
+    One warm tree-walking Interpreter, reused by every call to eval().
+
+    `globals` (name -> value) and `natives` (name -> Python function, see
+    define_native) pre-populate the globals every snippet starts with. Each
+    compiled snippet is kept in an LRU cache of `cache_size` entries keyed by
+    its source, so evaluating the same source again skips the scanner,
+    parser and resolver.
+    """
+
+    def __init__(self, globals=None, natives=None, cache_size=DEFAULT_CACHE_SIZE, optimize=False):
+        self.cache_size = cache_size
+        self.optimize = optimize
+        self._cache = OrderedDict()
+        self._interpreter = Interpreter()
+        self._base = dict(self._interpreter.globals.values)
+        # what the interpreter's globals were left holding by the last
+        # non-isolated eval()
+        self._session = None
+
+        for name, value in (globals or {}).items():
+            self.define(name, value)
+        for name, function in (natives or {}).items():
+            self.define_native(name, function)
+
+    def define(self, name, value):
+        """Adds a global every later snippet can see. An int becomes a Lox number."""
+        value = to_lox(value)
+        self._base[name] = value
+        if self._session is not None:
+            self._session.define(name, value)
+
+    def define_native(self, name, function, arity=None, pure=False):
+        """
+        Makes the Python `function` callable from Lox as `name`. Its arity is
+        taken from its signature unless given. Mark it `pure` when its result
+        depends only on its arguments, so Lox functions calling it can still
+        be memoized. An int it returns becomes a Lox number.
+        """
+        if arity is None:
+            arity = len(inspect.signature(function).parameters)
+        self.define(name, NativeFunction(name, function, arity, pure))
+
+    def compile(self, source):
+        """The cached compilation of `source`."""
+        compiled = self._cache.get(source)
+        if compiled is not None:
+            self._cache.move_to_end(source)
+            return compiled
+
+        errors = []
+
+        def scan_error(line, message):
+            errors.append(LoxError(SYNTAX, line, message))
+
+        def parse_error(token, message):
+            where = " at end" if token.type == TokenType.EOF else " at '{}'".format(token.lexeme)
+            errors.append(LoxError(SYNTAX, token.line, message, where))
+
+        statements = Parser(Scanner(source, scan_error).scan_tokens(), parse_error).parse()
+        if not errors:
+            Resolver(parse_error).resolve(statements)
+        if errors:
+            compiled = _Compiled([], None, errors)
+        else:
+            last = statements[-1] if statements and isinstance(statements[-1], Stmt.Expression) else None
+            if self.optimize:
+                # (this may drop `last`, when it folds to a literal)
+                statements = Optimizer().optimize(statements)
+                Resolver(parse_error).resolve(statements)
+            if last is not None and statements and statements[-1] is last:
+                statements.pop()
+            compiled = _Compiled(statements, None if last is None else last.expression, errors)
+
+        self._cache[source] = compiled
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return compiled
+
+    def eval(self, source, isolated=True):
+        """
+        Runs `source` and returns a Result. Output and errors go in the
+        Result, never to stdout.
+
+        An isolated snippet starts from the runtime's globals and its own
+        definitions and assignments are thrown away afterwards. Otherwise
+        they stay for the next non-isolated eval(), as in a session.
+        """
+        compiled = self.compile(source)
+        if compiled.errors:
+            return Result(None, "", list(compiled.errors))
+
+        interpreter = self._interpreter
+        if isolated or self._session is None:
+            globals_ = GlobalEnvironment()
+            globals_.values.update(self._base)
+            if not isolated:
+                self._session = globals_
+        else:
+            globals_ = self._session
+        interpreter.globals = interpreter.environment = globals_
+        output = interpreter.output = OutputSink.in_memory()
+
+        value = None
+        errors = []
+        try:
+            for statement in compiled.statements:
+                interpreter.execute(statement)
+            if compiled.last_expression is not None:
+                value = interpreter._evaluate(compiled.last_expression)
+        except LoxRuntimeError as error:
+            errors.append(LoxError(RUNTIME, error.token.line, str(error)))
+        finally:
+            interpreter.environment = interpreter.globals
+
+        return Result(flatten(value), output.getvalue(), errors)
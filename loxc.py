@@ -0,0 +1,173 @@
+"""
+On-disk cache of resolved programs, so running an unchanged script skips the
+scanner, parser, resolver and optimizer.
+
+`foo.lox` is cached in `foo.loxc` next to it. The file starts with a header:
+
+    MAGIC | fingerprint (32 bytes) | sha256 of the source (32 bytes) | flags (1 byte)
+
+followed by the pickled statement list. The fingerprint hashes VERSION, the
+Python version and the source of every module that produces or defines what
+is pickled, so editing the front end invalidates old caches. Anything that
+does not match, or fails to load, is treated as a miss and the cache is
+rewritten.
+
+The python backend also keeps the code object it compiled from the program
+in `foo.loxpyc`: the same header, fingerprinted over the transpiler as well,
+followed by the marshalled code. A .loxpyc hit skips the transpiler and
+compile() too.
+
+Like a .pyc file, a .loxc file is trusted: loading one can run arbitrary code.
+"""
+import contextlib
+import gc
+import hashlib
+import importlib
+import marshal
+import os
+import pickle
+import sys
+import types
+
+VERSION = 1
+MAGIC = b'LOXC'
+SUFFIX = '.loxc'
+CODE_SUFFIX = '.loxpyc'
+
+FLAG_OPTIMIZED = 1
+
+# everything whose behaviour ends up in the cached statements
+FRONT_END_MODULES = ('scanner', 'tokens', 'tokentype', 'parse', 'expr', 'stmt', 'resolver', 'optimizer')
+# ...and in the cached code objects (the Python version is hashed anyway, and
+# marshal and bytecode only change with it)
+CODE_MODULES = FRONT_END_MODULES + ('transpiler',)
+
+_HEADER_SIZE = len(MAGIC) + 32 + 32 + 1
+_fingerprints = {}
+
+
+def fingerprint(modules=FRONT_END_MODULES):
+    if modules not in _fingerprints:
+        digest = hashlib.sha256(f"{VERSION}:{sys.version_info[:2]}".encode('utf-8'))
+        for name in modules:
+            with open(importlib.import_module(name).__file__, 'rb') as f:
+                digest.update(f.read())
+        _fingerprints[modules] = digest.digest()
+    return _fingerprints[modules]
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    # (un)pickling a large AST allocates many objects at once, each batch of
+    # which would otherwise trigger a pointless collection
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def cache_path(script):
+    root, _ = os.path.splitext(script)
+    return root + SUFFIX
+
+
+def code_path(path):
+    """Where the code object goes for the program cached in the .loxc `path`."""
+    root, _ = os.path.splitext(path)
+    return root + CODE_SUFFIX
+
+
+def _header(source, optimized, modules=FRONT_END_MODULES):
+    # (`source` is a str, or its UTF-8 bytes, which hash the same)
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    return (MAGIC + fingerprint(modules) + hashlib.sha256(source).digest()
+            + bytes([FLAG_OPTIMIZED if optimized else 0]))
+
+
+def _payload(path, header):
+    """What follows `header` in `path`, or None if it is missing or has another header."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) <= _HEADER_SIZE or data[:_HEADER_SIZE] != header:
+        return None
+    return data[_HEADER_SIZE:]
+
+
+def load(path, source, optimized):
+    """The statements cached in `path` for `source`, or None on any kind of miss."""
+    payload = _payload(path, _header(source, optimized))
+    if payload is None:
+        return None
+
+    try:
+        with _gc_paused():
+            statements = pickle.loads(payload)
+    except Exception:
+        # truncated or otherwise corrupt
+        return None
+    if not isinstance(statements, list):
+        return None
+    return statements
+
+
+def load_code(path, source, optimized):
+    """The code object cached in the .loxpyc `path` for `source`, or None on any kind of miss."""
+    payload = _payload(path, _header(source, optimized, CODE_MODULES))
+    if payload is None:
+        return None
+
+    try:
+        code = marshal.loads(payload)
+    except Exception:
+        return None
+    if not isinstance(code, types.CodeType):
+        return None
+    return code
+
+
+def store(path, source, optimized, statements):
+    """
+    Writes the cache for `source`. Failing to write (read-only directory, a
+    program too deeply nested to pickle...) is not an error; the next run
+    simply misses again.
+    """
+    try:
+        with _gc_paused():
+            payload = pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, RecursionError):
+        return
+    _write(path, _header(source, optimized), payload)
+
+
+def store_code(path, source, optimized, code):
+    """Writes the .loxpyc cache for `source`; like store(), failing to is not an error."""
+    try:
+        payload = marshal.dumps(code)
+    except ValueError:
+        # too deeply nested to marshal
+        return
+    _write(path, _header(source, optimized, CODE_MODULES), payload)
+
+
+def _write(path, header, payload):
+    # write to a temporary file and rename it into place, so a concurrent run
+    # never sees a half-written cache
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
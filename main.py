@@ -1,24 +1,245 @@
+import argparse
+import mmap
 import sys
+import time
+from collections import OrderedDict
 
-from interpreter import Interpreter
-from scanner import Scanner
+# (the modules only some backends and flags need, such as asyncio, are
+# imported where they are used, so the others don't pay for them at startup)
+from interpreter import GLOBALS, Interpreter
+import memo as memoization
+from optimizer import NodeCounter, Optimizer
+from output import DEFAULT_FLUSH_BYTES, FLUSH_BYTES, FLUSH_POLICIES, OutputSink
+from scanner import scanner_for
 from tokentype import TokenType
-from parse import Parser
+from parse import ParseError, Parser
+from resolver import Resolver
+import stmt as Stmt
+import loxc
 
 hasError = False
 hasRuntimeError = False
 
-def run(s):
-    scanner = Scanner(s, error)
-    tokens = scanner.scan_tokens()
-    parser = Parser(tokens, parse_error)
-    statements = parser.parse()
-    if hasError:
+BACKENDS = ('tree', 'closure', 'vm', 'python')
+
+PROMPT = '> '
+CONTINUATION = '... '
+# distinct inputs the prompt keeps compiled
+PROMPT_CACHE_SIZE = 256
+
+def run(s, backend='tree', optimize=False, ast_stats=False, stream=False, cache_path=None,
+        memory_budget=None, profile_output=None, memo=None, use_async=False,
+        output=None, jit=None):
+    """
+    `s` is the source as a str, or as UTF-8 bytes (such as an mmap), which
+    are scanned without decoding them first; see scanner.ByteScanner. With
+    `cache_path`, the resolved program is loaded from (or saved to) that
+    .loxc file instead of scanning and parsing `s`, and the python backend's
+    code object from the .loxpyc file next to it; see loxc. `memory_budget`
+    bounds the vm backend's call depth (None for vm.DEFAULT_MEMORY_BUDGET);
+    see vm.VM. With `profile_output`, the
+    tree backend profiles the program (see profiler), prints a summary to
+    stderr and writes collapsed stacks to that file. With a memo.Memo, the
+    tree backend memoizes pure functions (see purity). With a jit.Jit, the
+    tree backend compiles functions and loops that get hot to Python (see
+    jit). With `use_async`, the
+    program runs on an AsyncInterpreter in an asyncio event loop. `output` is
+    the output.OutputSink the program prints to, except on the python
+    backend, which always prints to stdout.
+    """
+    if stream:
+        run_stream(s, backend, optimize, ast_stats, memory_budget, profile_output, memo, output, jit)
+        return
+
+    code_path = None
+    if backend == 'python':
+        import transpiler
+
+        code = None if ast_stats else transpiler.cached_code(s, optimize)
+        if code is None and cache_path is not None and not ast_stats:
+            code_path = loxc.code_path(cache_path)
+            code = loxc.load_code(code_path, s, optimize)
+            if code is not None:
+                transpiler.cache_code(s, optimize, code)
+        if code is not None:
+            transpiler.execute(code)
+            return
+
+    statements = None
+    if cache_path is not None and not ast_stats:
+        statements = loxc.load(cache_path, s, optimize)
+
+    if statements is None:
+        scanner = scanner_for(s, error)
+        tokens = scanner.scan_tokens()
+        parser = Parser(tokens, parse_error)
+        statements = parser.parse()
+        if hasError:
+            return
+        if hasRuntimeError:
+            return
+
+        node_counts = [0, 0]
+        statements = resolve(statements, optimize, node_counts)
+        if statements is None:
+            return
+        if ast_stats:
+            report_ast_stats(node_counts, optimize)
+        if cache_path is not None:
+            loxc.store(cache_path, s, optimize, statements)
+
+    if backend == 'python':
+        code = transpiler.compile_program(statements)
+        transpiler.cache_code(s, optimize, code)
+        if code_path is not None:
+            loxc.store_code(code_path, s, optimize, code)
+        transpiler.execute(code)
+        return
+
+    if backend == 'vm':
+        from compiler import Compiler
+        from vm import VM
+
+        function = Compiler(parse_error).compile(statements)
+        if hasError:
+            return
+        VM(memory_budget, output).interpret(function)
         return
-    if hasRuntimeError:
+
+    if use_async:
+        import asyncio
+        from async_interpreter import AsyncInterpreter
+
+        asyncio.run(AsyncInterpreter(output=output).interpret_async(statements))
         return
-    interpreter = Interpreter()
+
+    if memo is not None:
+        from purity import PurityAnalyzer
+
+        PurityAnalyzer(GLOBALS).analyze(statements)
+    interpreter = make_interpreter(backend, profile_output, memo, output, jit)
     interpreter.interpret(statements)
+    if profile_output is not None:
+        report_profile(interpreter, profile_output)
+
+def run_stream(s, backend='tree', optimize=False, ast_stats=False, memory_budget=None,
+               profile_output=None, memo=None, output=None, jit=None):
+    """
+    Parses and runs one top-level declaration at a time, so the tokens and
+    AST of statements that already ran can be freed. Unlike run(), the
+    statements before a syntax error have already run when it is reported.
+    What they print is flushed by the output's policy and at the end, not
+    after each one.
+    """
+    if backend == 'vm':
+        from compiler import Compiler
+        from vm import VM
+
+        vm = VM(memory_budget, output)
+        sink = vm.output
+
+        def execute(statements):
+            function = Compiler(static_error).compile(statements)
+            # a compile error is reported, but only a runtime error stops the rest
+            if hasError:
+                return True
+            return vm.interpret(function, flush=False)
+    else:
+        interpreter = make_interpreter(backend, profile_output, memo, output, jit)
+        sink = interpreter.output
+
+        def execute(statements):
+            return interpreter.interpret(statements, flush=False)
+    # one analyzer for the whole program, so it knows the earlier functions
+    analyzer = None
+    if memo is not None:
+        from purity import PurityAnalyzer
+
+        analyzer = PurityAnalyzer(GLOBALS)
+
+    # errors are printed straight away, after what the statements before
+    # them printed
+    def scan_error(line, message):
+        sink.flush()
+        error(line, message)
+
+    def static_error(token, message):
+        sink.flush()
+        parse_error(token, message)
+
+    # a statement that failed to parse can hold None in place of its broken
+    # parts, so after a syntax error only the parser goes on, as in run()
+    syntax_errors = []
+
+    def syntax_error(token, message):
+        syntax_errors.append(token)
+        static_error(token, message)
+
+    node_counts = [0, 0]
+    failed = False
+    parser = Parser(scanner_for(s, scan_error).iter_tokens(), syntax_error)
+    try:
+        for statement in parser.parse_iter():
+            # after an error, keep going only to report the remaining static errors
+            # (the executor says so itself: under `python main.py` the interpreters
+            # set hasRuntimeError on the imported main, not on this __main__)
+            if statement is None or failed or syntax_errors:
+                continue
+
+            statements = resolve([statement], optimize, node_counts, static_error)
+            if statements is not None:
+                if analyzer is not None:
+                    analyzer.analyze(statements)
+                failed = not execute(statements)
+    finally:
+        sink.flush()
+
+    if ast_stats:
+        report_ast_stats(node_counts, optimize)
+    if profile_output is not None:
+        report_profile(interpreter, profile_output)
+
+def make_interpreter(backend, profile_output, memo=None, output=None, jit=None):
+    if profile_output is not None:
+        import profiler
+
+        return profiler.ProfilingInterpreter(output)
+    return Interpreter(compile_closures=(backend == 'closure'), memo=memo, output=output, jit=jit)
+
+def report_profile(interpreter, profile_output):
+    import profiler
+
+    profiler.report(interpreter.profile, sys.stderr)
+    profiler.write_collapsed(interpreter.profile, profile_output)
+    print('collapsed stacks written to {}'.format(profile_output), file=sys.stderr)
+
+def resolve(statements, optimize, node_counts, report=None):
+    """
+    Runs the resolver (and the optimizer, with `optimize`) over parsed
+    statements, adding their node counts before and after to `node_counts`.
+    Errors go to `report`, parse_error by default. Returns the statements to
+    run, or None on error.
+    """
+    report = parse_error if report is None else report
+    resolver = Resolver(report)
+    resolver.resolve(statements)
+    if hasError:
+        return None
+
+    node_counts[0] += NodeCounter().count(statements)
+    if optimize:
+        # optimizing removes scopes, so resolve again for the new depths and slots;
+        # resolving the original tree first still reports errors in dead code
+        statements = Optimizer().optimize(statements)
+        Resolver(report).resolve(statements)
+    node_counts[1] += NodeCounter().count(statements)
+    return statements
+
+def report_ast_stats(node_counts, optimize):
+    if optimize:
+        print('AST nodes: {} before, {} after optimizing'.format(*node_counts), file=sys.stderr)
+    else:
+        print('AST nodes: {}'.format(node_counts[0]), file=sys.stderr)
 
 def error(line, message):
     global hasError
@@ -39,27 +260,321 @@ def report(lineno, where, message):
 
 def run_time_error(error):
     global hasRuntimeError
-    print('[line {}]'.format(error.token.line))
+    print('{}\n[line {}]'.format(error, error.token.line))
     hasRuntimeError = True
 
-def run_file(filename):
-    with open(filename) as f:
-        s = f.read()
-    run(s)
+def run_file(filename, cache=True, map_source=False, **options):
+    """With `map_source`, the file is scanned from an mmap of its bytes instead of read into a str."""
+    if map_source:
+        with open(filename, 'rb') as f:
+            try:
+                s = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # an empty file cannot be mapped
+                s = b''
+    else:
+        with open(filename) as f:
+            s = f.read()
+    run(s, cache_path=loxc.cache_path(filename) if cache else None, **options)
+
+def run_prompt(backend='tree', optimize=False, ast_stats=False, stream=False,
+               memory_budget=None, profile_output=None, memo=None, use_async=False,
+               output=None, jit=None, read=input):
+    """
+    The interactive prompt. One interpreter (or VM) and its globals last the
+    whole session, so what one input defines the next can use. Each input is
+    scanned, parsed and resolved on its own, and the last PROMPT_CACHE_SIZE
+    distinct inputs stay compiled: entering one again runs it straight away,
+    on nodes the interpreter has already specialized. (`stream` makes no
+    difference here.)
+
+    An input goes on over more lines while it leaves a string, brace or
+    parenthesis open; an empty line ends it regardless. An expression
+    entered without a `;` has its value printed. `:time INPUT` runs INPUT and
+    prints how long compiling and running it took to stderr; `:time` alone
+    turns that on or off for every input. `read` is called with the prompt
+    for each line, and end of file ends the session.
+    """
+    global hasError, hasRuntimeError
+
+    if backend == 'vm':
+        from compiler import Compiler
+        from vm import VM
+
+        vm = VM(memory_budget, output)
+        prepare = Compiler(parse_error).compile
+        execute = vm.interpret
+    elif use_async:
+        import asyncio
+        from async_interpreter import AsyncInterpreter, calling_expressions
+
+        interpreter = AsyncInterpreter(calling=set(), output=output)
+
+        def prepare(statements):
+            interpreter.calling.update(calling_expressions(statements))
+            return statements
+
+        def execute(statements):
+            return asyncio.run(interpreter.interpret_async(statements))
+    else:
+        interpreter = make_interpreter(backend, profile_output, memo, output, jit)
+        analyzer = None
+        if memo is not None:
+            from purity import PurityAnalyzer
+
+            analyzer = PurityAnalyzer(GLOBALS)
+
+        def prepare(statements):
+            if analyzer is not None:
+                analyzer.analyze(statements)
+            return statements
+        execute = interpreter.interpret
 
-def run_prompt():
+    compiled = OrderedDict()
+    node_counts = [0, 0]
+    time_all = False
     while True:
-        inp = input('> ')
-        run(inp)
+        source = read_input(read)
+        if source is None:
+            break
+        source = source.strip()
+        timed = time_all
+        if source.startswith(':'):
+            command, _, source = source.replace('\n', ' ', 1).partition(' ')
+            if command != ':time':
+                print('Unknown command {}; try :time INPUT, or :time alone.'.format(command), file=sys.stderr)
+                continue
+            source = source.strip()
+            if not source:
+                time_all = not time_all
+                print('Timing every input {}.'.format('on' if time_all else 'off'), file=sys.stderr)
+                continue
+            timed = True
+        if not source:
+            continue
+
+        hasError = hasRuntimeError = False
+        start = time.perf_counter()
+        program = compiled.get(source)
+        if program is not None:
+            compiled.move_to_end(source)
+        else:
+            statements = compile_input(source, optimize, node_counts)
+            if statements is None:
+                continue
+            program = prepare(statements)
+            if hasError:
+                continue
+            compiled[source] = program
+            if len(compiled) > PROMPT_CACHE_SIZE:
+                compiled.popitem(last=False)
+
+        ran = time.perf_counter()
+        try:
+            execute(program)
+        except KeyboardInterrupt:
+            print('Interrupted.', file=sys.stderr)
+        if timed:
+            print('compile {:.3f} ms, run {:.3f} ms'.format(
+                (ran - start) * 1000, (time.perf_counter() - ran) * 1000), file=sys.stderr)
+
+    if ast_stats:
+        report_ast_stats(node_counts, optimize)
+    if profile_output is not None:
+        report_profile(interpreter, profile_output)
+
+def read_input(read):
+    """Reads one prompt input, over as many lines as it needs; None at end of file."""
+    try:
+        lines = [read(PROMPT)]
+        while is_incomplete('\n'.join(lines)):
+            line = read(CONTINUATION)
+            if not line.strip():
+                break
+            lines.append(line)
+    except EOFError:
+        return None
+    return '\n'.join(lines)
+
+def is_incomplete(source):
+    """True if `source` leaves a string, brace or parenthesis open."""
+    if '"' not in source and '/' not in source:
+        # no strings or comments whose brackets would not count
+        return source.count('(') + source.count('{') > source.count(')') + source.count('}')
+
+    messages = []
+    tokens = scanner_for(source, lambda line, message: messages.append(message)).scan_tokens()
+    if any(message.startswith('Unterminated string') for message in messages):
+        return True
+
+    depth = 0
+    for token in tokens:
+        if token.type in (TokenType.LEFT_PAREN, TokenType.LEFT_BRACE):
+            depth += 1
+        elif token.type in (TokenType.RIGHT_PAREN, TokenType.RIGHT_BRACE):
+            depth -= 1
+    return depth > 0
+
+def compile_input(source, optimize, node_counts):
+    """
+    The resolved statements of one prompt input, or None on error. An input
+    that is a lone expression becomes a `print` of it.
+    """
+    tokens = scanner_for(source, error).scan_tokens()
+    if hasError:
+        return None
+
+    expression = lone_expression(tokens)
+    if expression is not None:
+        statements = [Stmt.Print(expression)]
+    else:
+        statements = Parser(tokens, parse_error).parse()
+        if hasError:
+            return None
+    return resolve(statements, optimize, node_counts)
+
+def lone_expression(tokens):
+    """`tokens` parsed as a single expression with nothing after it, else None."""
+    messages = []
+    parser = Parser(tokens, lambda token, message: messages.append(message))
+    try:
+        expression = parser.expression()
+    except ParseError:
+        return None
+    if messages or not parser.is_at_end():
+        return None
+    return expression
 
 
 if __name__ == '__main__':
-    _, *args = sys.argv
+    arg_parser = argparse.ArgumentParser(prog='tlox')
+    arg_parser.add_argument('scripts', nargs='*', metavar='script',
+                            help='the script to run; with --batch, any number of scripts, '
+                                 'glob patterns or directories')
+    arg_parser.add_argument('--backend', choices=BACKENDS, default='tree',
+                            help="'tree' walks the AST, 'closure' compiles it to Python closures "
+                                 "first, 'vm' compiles it to bytecode first, 'python' transpiles "
+                                 "it to Python and runs that")
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='fold constants and prune dead branches before running')
+    arg_parser.add_argument('--ast-stats', action='store_true',
+                            help='print the number of AST nodes (before and after --optimize) to stderr')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='parse and run one top-level declaration at a time, so very '
+                                 'large scripts never hold all their tokens or AST in memory')
+    arg_parser.add_argument('--no-cache', dest='cache', action='store_false',
+                            help="don't load or save the resolved program in a .loxc file "
+                                 "next to the script")
+    # (the defaults of --memory-budget and --jit-threshold are vm's and jit's,
+    # which are not imported unless used)
+    arg_parser.add_argument('--memory-budget', type=int, metavar='MB',
+                            help='megabytes of call frames and stack the vm backend may use, '
+                                 'which bounds how deep Lox calls can recurse (default 64)')
+    arg_parser.add_argument('--profile', action='store_true',
+                            help='print per-function and per-line counts and times to stderr, '
+                                 'and write collapsed stacks for flamegraph tools (tree backend only)')
+    arg_parser.add_argument('--profile-output', metavar='FILE', default='lox.collapsed',
+                            help='where --profile writes collapsed stacks (default %(default)s)')
+    arg_parser.add_argument('--memoize', action='store_true',
+                            help='cache the results of pure functions (tree backend only)')
+    arg_parser.add_argument('--memoize-only', metavar='NAMES',
+                            help='like --memoize, for the pure functions among the comma-separated NAMES')
+    arg_parser.add_argument('--memo-size', type=int, metavar='N', default=memoization.DEFAULT_SIZE,
+                            help='results each memoized function keeps (default %(default)s)')
+    arg_parser.add_argument('--memo-stats', action='store_true',
+                            help='print memoization hits and misses to stderr')
+    arg_parser.add_argument('--jit', action='store_true',
+                            help='compile functions and loops to Python once they get hot '
+                                 '(tree backend only)')
+    arg_parser.add_argument('--jit-threshold', type=int, metavar='N',
+                            help='calls, or loop iterations, before --jit compiles a function or '
+                                 'loop (default 500)')
+    arg_parser.add_argument('--jit-stats', action='store_true',
+                            help='print what --jit compiled and the time it took to stderr')
+    arg_parser.add_argument('--async', dest='use_async', action='store_true',
+                            help='run on an asyncio event loop, where natives such as sleep() can '
+                                 'be coroutines (tree backend only)')
+    arg_parser.add_argument('--batch', action='store_true',
+                            help='run every script in a pool of worker processes, each with its '
+                                 'output captured, and print a summary to stderr')
+    arg_parser.add_argument('--jobs', type=int, metavar='N',
+                            help='worker processes for --batch (default: one per CPU)')
+    arg_parser.add_argument('--mmap', dest='map_source', action='store_true',
+                            help='scan the script from a memory map of its bytes instead of '
+                                 'reading it into a string, for very large scripts')
+    arg_parser.add_argument('--output', metavar='FILE',
+                            help='write what the program prints to FILE instead of stdout')
+    arg_parser.add_argument('--flush', choices=FLUSH_POLICIES,
+                            help="when printed output is written out: after every 'line', every "
+                                 "--flush-bytes 'bytes', or only at 'exit' (default: 'line' on a "
+                                 "terminal, else 'bytes')")
+    arg_parser.add_argument('--flush-bytes', type=int, metavar='N', default=DEFAULT_FLUSH_BYTES,
+                            help='bytes of output buffered by --flush bytes (default %(default)s)')
+    args = arg_parser.parse_args()
+    if args.stream and args.backend == 'python':
+        arg_parser.error("--stream does not support the 'python' backend")
+    if args.map_source and args.backend == 'python':
+        arg_parser.error("--mmap does not support the 'python' backend")
+    if args.profile and args.backend != 'tree':
+        arg_parser.error("--profile only works with the 'tree' backend")
+    if args.use_async and (args.backend != 'tree' or args.stream or args.profile
+                           or args.memoize or args.memoize_only is not None):
+        arg_parser.error("--async only works with the 'tree' backend, without --stream, "
+                         "--profile or --memoize")
+    memo = None
+    if args.memoize or args.memoize_only is not None:
+        if args.backend != 'tree':
+            arg_parser.error("--memoize only works with the 'tree' backend")
+        if args.profile:
+            arg_parser.error("--memoize cannot be combined with --profile")
+        names = None
+        if args.memoize_only is not None:
+            names = {name.strip() for name in args.memoize_only.split(',')}
+        memo = memoization.Memo(args.memo_size, names)
+    jit = None
+    if args.jit:
+        if args.backend != 'tree' or args.profile or args.use_async:
+            arg_parser.error("--jit only works with the 'tree' backend, without --profile or --async")
+        import jit as tiering
+
+        jit = tiering.Jit() if args.jit_threshold is None else tiering.Jit(args.jit_threshold)
+    output = None
+    if args.output is not None or args.flush is not None:
+        if args.backend == 'python':
+            arg_parser.error("--output and --flush don't work with the 'python' backend")
+        if args.batch:
+            arg_parser.error("--batch cannot be combined with --output or --flush")
+        if args.output is not None:
+            output = OutputSink.to_file(args.output, args.flush or FLUSH_BYTES, flush_bytes=args.flush_bytes)
+        else:
+            output = OutputSink(None, args.flush, flush_bytes=args.flush_bytes)
+    options = dict(backend=args.backend, optimize=args.optimize, ast_stats=args.ast_stats,
+                   stream=args.stream,
+                   memory_budget=None if args.memory_budget is None else args.memory_budget * 1024 * 1024,
+                   profile_output=args.profile_output if args.profile else None, memo=memo,
+                   use_async=args.use_async, jit=jit)
+
+    if args.batch:
+        if args.profile:
+            arg_parser.error("--batch cannot be combined with --profile")
+        import batch
 
-    if len(args) > 1:
-        print("Usage: tlox [script]")
-        sys.exit(64)
-    elif len(args) == 1:
-        run_file(args[0])
+        paths = batch.expand(args.scripts)
+        if not paths:
+            arg_parser.error("--batch needs at least one script")
+        results = batch.run_batch(paths, args.jobs, cache=args.cache, map_source=args.map_source, **options)
+        sys.exit(1 if any(result.status != batch.OK for result in results) else 0)
+    elif len(args.scripts) > 1:
+        arg_parser.error("more than one script needs --batch")
+    elif args.scripts:
+        run_file(args.scripts[0], cache=args.cache, map_source=args.map_source, output=output, **options)
     else:
-        run_prompt()
+        if args.backend == 'python':
+            arg_parser.error("the prompt does not support the 'python' backend")
+        run_prompt(output=output, **options)
+    if memo is not None and args.memo_stats:
+        memoization.report(memo, sys.stderr)
+    if jit is not None and args.jit_stats:
+        tiering.report(jit, sys.stderr)
+    if output is not None:
+        output.close()
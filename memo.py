@@ -0,0 +1,82 @@
+"""
+Memoization of pure Lox functions (see purity), used by `main.py --memoize`.
+"""
+from collections import OrderedDict
+
+from lox_callable import LoxFunction
+
+DEFAULT_SIZE = 1024
+
+
+class Memo():
+    """
+    Settings and hit/miss counts shared by the memoized functions of one
+    interpreter. With `names`, only pure functions with one of those names
+    are memoized; otherwise all of them are. Each function value (so each
+    closure) keeps its own cache of at most `size` results and evicts the
+    least recently used one.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, names=None):
+        self.size = size
+        self.names = names
+        # "name:line" -> [hits, misses]
+        self.stats = {}
+
+    def wants(self, declaration):
+        if declaration.pure_reads is None:
+            return False
+        return self.names is None or declaration.name.lexeme in self.names
+
+
+def _key(args):
+    # Python considers true == 1 and -0 == 0, Lox does not
+    key = []
+    for arg in args:
+        if arg.__class__ is float and arg == 0.0:
+            key.append((float, str(arg)))
+        else:
+            key.append((arg.__class__, arg))
+    return tuple(key)
+
+
+class MemoizedFunction(LoxFunction):
+    def __init__(self, declaration, closure, memo, globals_):
+        super().__init__(declaration, closure)
+        self.size = memo.size
+        self.cache = OrderedDict()
+        key = "{}:{}".format(declaration.name.lexeme, declaration.name.line)
+        self.stats = memo.stats.setdefault(key, [0, 0])
+
+        # purity only covers the code analyzed so far; changing one of the
+        # globals the result depends on moves the globals to a new epoch
+        globals_.watched.update(declaration.pure_reads)
+        self.epoch = globals_.epoch
+
+    def call(self, interpreter, args):
+        cache = self.cache
+        epoch = interpreter.globals.epoch
+        if epoch != self.epoch:
+            cache.clear()
+            self.epoch = epoch
+
+        key = _key(args)
+        if key in cache:
+            cache.move_to_end(key)
+            self.stats[0] += 1
+            return cache[key]
+
+        self.stats[1] += 1
+        # nothing is cached when the call fails
+        value = super().call(interpreter, args)
+        cache[key] = value
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+        return value
+
+
+def report(memo, out):
+    out.write("{:>10} {:>10} {:>8}  function\n".format("hits", "misses", "hit %"))
+    for key, (hits, misses) in sorted(memo.stats.items(), key=lambda item: -sum(item[1])):
+        calls = hits + misses
+        out.write("{:>10} {:>10} {:>8.1f}  {}\n".format(hits, misses, 100 * hits / calls if calls else 0.0, key))
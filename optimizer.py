@@ -0,0 +1,332 @@
+import expr as Expr
+import stmt as Stmt
+from expr import Visitor as ExprVisitor
+from stmt import Visitor as StmtVisitor
+from tokentype import TokenType
+
+# Folded only when both operands are number literals, and never when that
+# would raise (so division by zero still fails at runtime, as it did).
+NUMBER_FOLDS = {
+    TokenType.MINUS: lambda a, b: a - b,
+    TokenType.STAR: lambda a, b: a * b,
+    TokenType.SLASH: lambda a, b: a / b,
+    TokenType.GREATER: lambda a, b: a > b,
+    TokenType.GREATER_EQUAL: lambda a, b: a >= b,
+    TokenType.LESS: lambda a, b: a < b,
+    TokenType.LESS_EQUAL: lambda a, b: a <= b,
+}
+
+
+def _is_truthy(value):
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    return True
+
+
+def _is_number_literal(expr, value=None):
+    if not isinstance(expr, Expr.Literal) or type(expr.value) is not float:
+        return False
+    return value is None or expr.value == value
+
+
+def _is_number(expr):
+    """True if `expr` is statically known to evaluate to a number (or fail)."""
+    if isinstance(expr, Expr.Literal):
+        return type(expr.value) is float
+    if isinstance(expr, Expr.Binary):
+        return expr.operator.type in (TokenType.MINUS, TokenType.STAR, TokenType.SLASH)
+    if isinstance(expr, Expr.Unary):
+        return expr.operator.type == TokenType.MINUS
+    return False
+
+
+def _is_bool(expr):
+    """True if `expr` is statically known to evaluate to true or false."""
+    if isinstance(expr, Expr.Literal):
+        return type(expr.value) is bool
+    if isinstance(expr, Expr.Binary):
+        return expr.operator.type not in (TokenType.MINUS, TokenType.STAR, TokenType.SLASH, TokenType.PLUS)
+    if isinstance(expr, Expr.Unary):
+        return expr.operator.type == TokenType.BANG
+    return False
+
+
+def _declares(stmt):
+    return isinstance(stmt, (Stmt.Var, Stmt.Function))
+
+
+class Optimizer(ExprVisitor, StmtVisitor):
+    """
+    Rewrites the parsed program before it is resolved:
+
+    * folds arithmetic, comparisons and string concatenation of literals
+    * simplifies `x * 1`, `x / 1`, `x - 0` and `-(-x)` when x is a number,
+      and `!!x` when x is a boolean
+    * prunes `if`/`while`/`for` statements and `and`/`or` expressions whose
+      condition is a literal, statements after a `return`, and expression
+      statements that are just a literal
+    * drops Grouping nodes, and unwraps blocks that declare nothing
+
+    Every rewrite keeps the program's behaviour, including its runtime errors.
+    Statement visitors return the replacement statement, or None when the
+    statement disappears entirely.
+    """
+
+    def optimize(self, statements):
+        return self._statements(statements)
+
+    def _statements(self, statements):
+        optimized = []
+        for statement in statements:
+            statement = self._stmt(statement)
+            if statement is None:
+                continue
+
+            if isinstance(statement, Stmt.Block) and not any(_declares(s) for s in statement.statements):
+                optimized.extend(statement.statements)
+            else:
+                optimized.append(statement)
+
+            if isinstance(statement, Stmt.Return):
+                break
+        return optimized
+
+    def _stmt(self, stmt):
+        return stmt.accept(self)
+
+    def _branch(self, stmt):
+        """For statement slots that cannot be empty."""
+        stmt = self._stmt(stmt)
+        if stmt is None:
+            return Stmt.Block([])
+        return stmt
+
+    def _expr(self, expr):
+        return expr.accept(self)
+
+    # -- statements -----------------------------------------------------
+
+    def visit_BlockStmt(self, stmt):
+        stmt.statements = self._statements(stmt.statements)
+        if not stmt.statements:
+            return None
+        if len(stmt.statements) == 1 and not _declares(stmt.statements[0]):
+            return stmt.statements[0]
+        return stmt
+
+    def visit_ExpressionStmt(self, stmt):
+        stmt.expression = self._expr(stmt.expression)
+        if isinstance(stmt.expression, Expr.Literal):
+            return None
+        return stmt
+
+    def visit_ForStmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = self._stmt(stmt.initializer)
+        stmt.condition = self._expr(stmt.condition)
+        if isinstance(stmt.condition, Expr.Literal) and not _is_truthy(stmt.condition.value):
+            # only the initializer runs, still in a scope of its own
+            if stmt.initializer is None:
+                return None
+            return Stmt.Block([stmt.initializer])
+
+        if stmt.increment is not None:
+            stmt.increment = self._expr(stmt.increment)
+            if isinstance(stmt.increment, Expr.Literal):
+                stmt.increment = None
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    def visit_FunctionStmt(self, stmt):
+        stmt.body = self._statements(stmt.body)
+        return stmt
+
+    def visit_IfStmt(self, stmt):
+        stmt.condition = self._expr(stmt.condition)
+
+        if isinstance(stmt.condition, Expr.Literal):
+            if _is_truthy(stmt.condition.value):
+                return self._stmt(stmt.then_branch)
+            if stmt.else_branch is not None:
+                return self._stmt(stmt.else_branch)
+            return None
+
+        stmt.then_branch = self._branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self._stmt(stmt.else_branch)
+        return stmt
+
+    def visit_PrintStmt(self, stmt):
+        stmt.expression = self._expr(stmt.expression)
+        return stmt
+
+    def visit_ReturnStmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value = self._expr(stmt.value)
+        return stmt
+
+    def visit_VarStmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = self._expr(stmt.initializer)
+        return stmt
+
+    def visit_WhileStmt(self, stmt):
+        stmt.condition = self._expr(stmt.condition)
+        if isinstance(stmt.condition, Expr.Literal) and not _is_truthy(stmt.condition.value):
+            return None
+
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    # -- expressions ----------------------------------------------------
+
+    def visit_AssignExpr(self, expr):
+        expr.value = self._expr(expr.value)
+        return expr
+
+    def visit_BinaryExpr(self, expr):
+        expr.left = left = self._expr(expr.left)
+        expr.right = right = self._expr(expr.right)
+        op_type = expr.operator.type
+
+        if isinstance(left, Expr.Literal) and isinstance(right, Expr.Literal):
+            folded = self._fold(op_type, left.value, right.value)
+            if folded is not None:
+                return folded
+
+        if op_type == TokenType.STAR:
+            if _is_number_literal(right, 1.0) and _is_number(left):
+                return left
+            if _is_number_literal(left, 1.0) and _is_number(right):
+                return right
+        elif op_type == TokenType.SLASH:
+            if _is_number_literal(right, 1.0) and _is_number(left):
+                return left
+        elif op_type == TokenType.MINUS:
+            # not `x + 0`, which would turn -0 into 0
+            if _is_number_literal(right, 0.0) and _is_number(left):
+                return left
+
+        return expr
+
+    def _fold(self, op_type, left, right):
+        """The folded Literal, or None if the operation cannot be folded."""
+        if op_type == TokenType.EQUAL_EQUAL:
+            return Expr.Literal((left is None and right is None) or left == right)
+        if op_type == TokenType.BANG_EQUAL:
+            return Expr.Literal(not ((left is None and right is None) or left == right))
+
+        if op_type == TokenType.PLUS:
+            if (type(left) is float and type(right) is float) or (type(left) is str and type(right) is str):
+                return Expr.Literal(left + right)
+            return None
+
+        if op_type in NUMBER_FOLDS and type(left) is float and type(right) is float:
+            if op_type == TokenType.SLASH and right == 0.0:
+                return None
+            return Expr.Literal(NUMBER_FOLDS[op_type](left, right))
+
+        return None
+
+    def visit_CallExpr(self, expr):
+        expr.callee = self._expr(expr.callee)
+        expr.arguments = [self._expr(argument) for argument in expr.arguments]
+        return expr
+
+    def visit_GroupingExpr(self, expr):
+        return self._expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        return expr
+
+    def visit_LogicalExpr(self, expr):
+        expr.left = left = self._expr(expr.left)
+        expr.right = self._expr(expr.right)
+
+        if isinstance(left, Expr.Literal):
+            if expr.operator.type == TokenType.OR:
+                return left if _is_truthy(left.value) else expr.right
+            return expr.right if _is_truthy(left.value) else left
+        return expr
+
+    def visit_UnaryExpr(self, expr):
+        expr.right = right = self._expr(expr.right)
+
+        if expr.operator.type == TokenType.MINUS:
+            if isinstance(right, Expr.Literal) and type(right.value) is float:
+                return Expr.Literal(right.value * -1)
+            if isinstance(right, Expr.Unary) and right.operator.type == TokenType.MINUS and _is_number(right.right):
+                return right.right
+            return expr
+
+        if isinstance(right, Expr.Literal):
+            return Expr.Literal(not _is_truthy(right.value))
+        if isinstance(right, Expr.Unary) and right.operator.type == TokenType.BANG and _is_bool(right.right):
+            return right.right
+        return expr
+
+    def visit_VariableExpr(self, expr):
+        return expr
+
+
+class NodeCounter(ExprVisitor, StmtVisitor):
+    """Counts the expression and statement nodes of a program."""
+
+    def count(self, statements):
+        return sum(statement.accept(self) for statement in statements)
+
+    def _count(self, *nodes):
+        return sum(node.accept(self) for node in nodes if node is not None)
+
+    def visit_BlockStmt(self, stmt):
+        return 1 + self.count(stmt.statements)
+
+    def visit_ExpressionStmt(self, stmt):
+        return 1 + self._count(stmt.expression)
+
+    def visit_ForStmt(self, stmt):
+        return 1 + self._count(stmt.initializer, stmt.condition, stmt.increment, stmt.body)
+
+    def visit_FunctionStmt(self, stmt):
+        return 1 + self.count(stmt.body)
+
+    def visit_IfStmt(self, stmt):
+        return 1 + self._count(stmt.condition, stmt.then_branch, stmt.else_branch)
+
+    def visit_PrintStmt(self, stmt):
+        return 1 + self._count(stmt.expression)
+
+    def visit_ReturnStmt(self, stmt):
+        return 1 + self._count(stmt.value)
+
+    def visit_VarStmt(self, stmt):
+        return 1 + self._count(stmt.initializer)
+
+    def visit_WhileStmt(self, stmt):
+        return 1 + self._count(stmt.condition, stmt.body)
+
+    def visit_AssignExpr(self, expr):
+        return 1 + self._count(expr.value)
+
+    def visit_BinaryExpr(self, expr):
+        return 1 + self._count(expr.left, expr.right)
+
+    def visit_CallExpr(self, expr):
+        return 1 + self._count(expr.callee, *expr.arguments)
+
+    def visit_GroupingExpr(self, expr):
+        return 1 + self._count(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        return 1
+
+    def visit_LogicalExpr(self, expr):
+        return 1 + self._count(expr.left, expr.right)
+
+    def visit_UnaryExpr(self, expr):
+        return 1 + self._count(expr.right)
+
+    def visit_VariableExpr(self, expr):
+        return 1
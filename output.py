@@ -0,0 +1,103 @@
+"""
+OutputSink, where the interpreters write what `print` prints.
+
+A sink collects printed lines and hands them to its target in one write,
+instead of one print() call per Lox `print`. When it does that depends on
+its flush policy:
+
+    FLUSH_LINE   after every line, for interactive use
+    FLUSH_BYTES  once `flush_bytes` bytes are waiting
+    FLUSH_EXIT   only when flush() is called; Interpreter.interpret() calls
+                 it when the program ends or stops on a runtime error (and
+                 main.run_stream at the end of the whole program)
+
+The target is a binary stream (written to as encoded bytes), a text stream
+such as io.StringIO (written to as text), or None for whatever sys.stdout
+is at the time of the flush, so contextlib.redirect_stdout() still works.
+Text written to sys.stdout by other code, like error messages, is flushed
+first, so the two stay in order.
+"""
+import io
+import sys
+
+FLUSH_LINE = 'line'
+FLUSH_BYTES = 'bytes'
+FLUSH_EXIT = 'exit'
+FLUSH_POLICIES = (FLUSH_LINE, FLUSH_BYTES, FLUSH_EXIT)
+
+DEFAULT_FLUSH_BYTES = 64 * 1024
+
+
+class OutputSink():
+    def __init__(self, target=None, flush=None, flush_bytes=DEFAULT_FLUSH_BYTES, encoding='utf-8'):
+        """
+        `flush` defaults to FLUSH_LINE when the target is a terminal and to
+        FLUSH_BYTES otherwise. `encoding` is used for binary targets other
+        than sys.stdout's, which keeps its own.
+        """
+        self.target = target
+        self.encoding = encoding
+        if flush is None:
+            stream = sys.stdout if target is None else target
+            flush = FLUSH_LINE if getattr(stream, 'isatty', lambda: False)() else FLUSH_BYTES
+        if flush not in FLUSH_POLICIES:
+            raise ValueError("unknown flush policy {!r}".format(flush))
+        self.flush_policy = flush
+        # (lines are counted as one byte per character, which is exact for ASCII)
+        self._limit = {FLUSH_LINE: 0, FLUSH_BYTES: flush_bytes, FLUSH_EXIT: float('inf')}[flush]
+        self._lines = []
+        self._size = 0
+        self._owned = False
+
+    @classmethod
+    def to_file(cls, path, flush=FLUSH_BYTES, **options):
+        """A sink writing to a new file at `path`; close() closes it."""
+        sink = cls(open(path, 'wb'), flush, **options)
+        sink._owned = True
+        return sink
+
+    @classmethod
+    def in_memory(cls):
+        """A sink collecting everything in memory; see getvalue()."""
+        return cls(io.StringIO(), FLUSH_EXIT)
+
+    def write_line(self, text):
+        self._lines.append(text)
+        self._size += len(text) + 1
+        if self._size > self._limit:
+            self.flush()
+
+    def flush(self):
+        if not self._lines:
+            return
+        self._lines.append('')
+        data = '\n'.join(self._lines)
+        self._lines.clear()
+        self._size = 0
+
+        target = self.target
+        if target is None:
+            target = sys.stdout
+            buffer = getattr(target, 'buffer', None)
+            if buffer is None:
+                target.write(data)
+            else:
+                target.flush()
+                buffer.write(data.encode(target.encoding, target.errors))
+                buffer.flush()
+        elif isinstance(target, io.TextIOBase):
+            target.write(data)
+            target.flush()
+        else:
+            target.write(data.encode(self.encoding))
+            target.flush()
+
+    def getvalue(self):
+        """Everything written so far, for an in_memory() sink."""
+        self.flush()
+        return self.target.getvalue()
+
+    def close(self):
+        self.flush()
+        if self._owned:
+            self.target.close()
@@ -4,17 +4,23 @@ from tokentype import TokenType
 
 class Parser:
     def __init__(self, tokens, set_error):
-        self.tokens = tokens
-        self.current = 0
+        """
+        `tokens` can be any iterable ending with an EOF token, such as
+        Scanner.iter_tokens(); it is consumed one token at a time.
+        """
+        self.tokens = iter(tokens)
+        self.current_token = next(self.tokens)
+        self.previous_token = None
         self.error_handler = set_error
 
     def parse(self):
-        """Returns an Expr instance, or None on parsing error."""
-        statements = []
-        while not self.is_at_end():
-            statements.append(self.declaration())
+        """Returns the list of statements; those that failed to parse are None."""
+        return list(self.parse_iter())
 
-        return statements
+    def parse_iter(self):
+        """Yields each top-level declaration as soon as it has been parsed."""
+        while not self.is_at_end():
+            yield self.declaration()
 
     def expression(self):
         return self.assignment()
@@ -40,10 +46,13 @@ class Parser:
         if self.match(TokenType.PRINT):
             return self.print_statement()
 
+        if self.match(TokenType.RETURN):
+            return self.return_statement()
+
         if self.match(TokenType.WHILE):
             return self.while_statement()
 
-        if self.match(TokenType.LEFT_BRACE):
+        if self.check(TokenType.LEFT_BRACE):
             return Stmt.Block(self.block())
 
         return self.expression_statement()
@@ -69,17 +78,10 @@ class Parser:
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
 
         body = self.statement()
-        if increment is not None:
-            body = Stmt.Block(list(body), Stmt.Expression(increment))
-
         if condition is None:
             condition = Expr.Literal(True)
-        body = Stmt.While(condition, body)
-
-        if initializer is not None:
-            body = Stmt.Block(list(initializer), body)
 
-        return body
+        return Stmt.For(initializer, condition, increment, body)
 
     def if_statement(self):
         self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
@@ -98,6 +100,15 @@ class Parser:
         self.consume(TokenType.SEMICOLON, "Expect ';' after value.")
         return Stmt.Print(value)
 
+    def return_statement(self):
+        keyword = self.previous()
+        value = None
+        if not self.check(TokenType.SEMICOLON):
+            value = self.expression()
+
+        self.consume(TokenType.SEMICOLON, "Expect ';' after return value.")
+        return Stmt.Return(keyword, value)
+
     def var_declaration(self):
         name = self.consume(TokenType.IDENTIFIER, "Expect variable name.")
         initializer = None
@@ -285,17 +296,18 @@ class Parser:
 
     def advance(self):
         if not self.is_at_end():
-            self.current += 1
-        return self.previous()
+            self.previous_token = self.current_token
+            self.current_token = next(self.tokens)
+        return self.previous_token
 
     def is_at_end(self):
         return self.peek().type == TokenType.EOF
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.current_token
 
     def previous(self):
-        return self.tokens[self.current - 1]
+        return self.previous_token
 
     def consume(self, token_type, message):
         if self.check(token_type):
@@ -0,0 +1,263 @@
+import expr as Expr
+from expr import Visitor as ExprVisitor
+from stmt import Visitor as StmtVisitor
+
+
+class _Variable():
+    __slots__ = ('owner', 'function', 'assigned')
+
+    def __init__(self, owner, function=None):
+        # the _Function whose body declares the variable (None at top level)
+        self.owner = owner
+        # the _Function, for a variable declared with `fun`
+        self.function = function
+        self.assigned = False
+
+
+class _Function():
+    __slots__ = ('declaration', 'impure', 'captured', 'global_reads', 'calls')
+
+    def __init__(self, declaration):
+        self.declaration = declaration
+        self.impure = False
+        # _Variables of enclosing functions (or top-level blocks) it reads
+        self.captured = []
+        self.global_reads = set()
+        # each callee is a _Variable, or the name of a global
+        self.calls = []
+
+
+class PurityAnalyzer(ExprVisitor, StmtVisitor):
+    """
+    Static pass, run after the resolver, that decides which functions are
+    pure: calling one with the same arguments always returns the same value
+    and has no other effect, so its results can be memoized (see memo).
+
+    A function is pure when its body
+      * does not print,
+      * does not assign to a global or captured variable,
+      * reads no captured or global variable that is ever assigned or
+        redeclared,
+      * declares no nested function (each call would return a new closure),
+      * and only calls, by name, functions that are pure themselves or
+        natives marked `pure`.
+
+    The answer goes in `Function.pure_reads`: None for an impure function,
+    otherwise the global names its result depends on, directly or through
+    its callees. Code analyzed later (the next statement in --stream mode,
+    say) can still reassign those globals, so whoever memoizes has to watch
+    them at run time.
+
+    Globals are remembered across calls to analyze(), so one analyzer can
+    be fed a program one top-level statement at a time.
+    """
+
+    def __init__(self, natives):
+        # global name -> native callable class
+        self.natives = natives
+        # global name -> _Variable
+        self.globals = {}
+        # one list per scope, indexed by slot
+        self.scopes = []
+        self.current = None
+        self.functions = []
+
+    def analyze(self, statements):
+        self.functions = []
+        for statement in statements:
+            self._stmt(statement)
+
+        pure = [function for function in self.functions if self._direct_purity(function)]
+        # assume recursive and mutually recursive calls are pure, then drop
+        # functions calling an impure one until nothing changes
+        changed = True
+        while changed:
+            changed = False
+            for function in pure:
+                if not function.impure and not all(self._pure_callee(callee) for callee in function.calls):
+                    function.impure = changed = True
+            pure = [function for function in pure if not function.impure]
+
+        for function in self.functions:
+            function.declaration.pure_reads = None
+        for function in pure:
+            function.declaration.pure_reads = tuple(sorted(self._reads(function, set())))
+
+    def _direct_purity(self, function):
+        if function.impure:
+            return False
+        if any(variable.assigned for variable in function.captured):
+            function.impure = True
+        elif any(name in self.globals and self.globals[name].assigned for name in function.global_reads):
+            function.impure = True
+        return not function.impure
+
+    def _pure_callee(self, callee):
+        if isinstance(callee, str):
+            variable = self.globals.get(callee)
+            if variable is None:
+                native = self.natives.get(callee)
+                return native is not None and native.pure
+        else:
+            variable = callee
+        return variable.function is not None and not variable.assigned and not variable.function.impure
+
+    def _reads(self, function, seen):
+        """The global names `function` and everything it calls read."""
+        if function in seen:
+            return set()
+        seen.add(function)
+
+        reads = set(function.global_reads)
+        for callee in function.calls:
+            variable = self.globals.get(callee) if isinstance(callee, str) else callee
+            if variable is not None and variable.function is not None:
+                reads |= self._reads(variable.function, seen)
+        return reads
+
+    def _stmt(self, stmt):
+        stmt.accept(self)
+
+    def _expr(self, expr):
+        expr.accept(self)
+
+    def _declare(self, name, slot, function=None):
+        variable = _Variable(self.current, function)
+        if slot is None:
+            if name.lexeme in self.globals:
+                # redeclaring a global is as good as assigning it
+                variable.assigned = True
+            self.globals[name.lexeme] = variable
+        else:
+            self.scopes[-1][slot] = variable
+
+    def _variable(self, expr):
+        """The _Variable a resolved Variable or Assign refers to, or None for a global."""
+        if expr.depth is None:
+            return None
+        return self.scopes[-1 - expr.depth][expr.slot]
+
+    # -- statements -----------------------------------------------------
+
+    def visit_BlockStmt(self, stmt):
+        # (a block that declares nothing has no scope; see Resolver)
+        if stmt.scope_size:
+            self.scopes.append([None] * stmt.scope_size)
+        for statement in stmt.statements:
+            self._stmt(statement)
+        if stmt.scope_size:
+            self.scopes.pop()
+
+    def visit_ExpressionStmt(self, stmt):
+        self._expr(stmt.expression)
+
+    def visit_ForStmt(self, stmt):
+        # (the loop's scope only exists when it declares its variable; see Resolver)
+        if stmt.scope_size:
+            self.scopes.append([None] * stmt.scope_size)
+        if stmt.initializer is not None:
+            self._stmt(stmt.initializer)
+        self._expr(stmt.condition)
+        self._stmt(stmt.body)
+        if stmt.increment is not None:
+            self._expr(stmt.increment)
+        if stmt.scope_size:
+            self.scopes.pop()
+
+    def visit_FunctionStmt(self, stmt):
+        if self.current is not None:
+            self.current.impure = True
+        function = _Function(stmt)
+        self.functions.append(function)
+        self._declare(stmt.name, stmt.slot, function)
+
+        enclosing = self.current
+        self.current = function
+        self.scopes.append([_Variable(function) for _ in stmt.params]
+                           + [None] * (stmt.scope_size - len(stmt.params)))
+        for statement in stmt.body:
+            self._stmt(statement)
+        self.scopes.pop()
+        self.current = enclosing
+
+    def visit_IfStmt(self, stmt):
+        self._expr(stmt.condition)
+        self._stmt(stmt.then_branch)
+        if stmt.else_branch is not None:
+            self._stmt(stmt.else_branch)
+
+    def visit_PrintStmt(self, stmt):
+        if self.current is not None:
+            self.current.impure = True
+        self._expr(stmt.expression)
+
+    def visit_ReturnStmt(self, stmt):
+        if stmt.value is not None:
+            self._expr(stmt.value)
+
+    def visit_VarStmt(self, stmt):
+        if stmt.initializer is not None:
+            self._expr(stmt.initializer)
+        self._declare(stmt.name, stmt.slot)
+
+    def visit_WhileStmt(self, stmt):
+        self._expr(stmt.condition)
+        self._stmt(stmt.body)
+
+    # -- expressions ----------------------------------------------------
+
+    def visit_AssignExpr(self, expr):
+        self._expr(expr.value)
+
+        variable = self._variable(expr)
+        if variable is None:
+            variable = self.globals.get(expr.name.lexeme)
+            if variable is None:
+                # assigned before it is declared (a runtime error, unless an
+                # earlier statement declared it)
+                variable = self.globals[expr.name.lexeme] = _Variable(None)
+        variable.assigned = True
+
+        if self.current is not None and variable.owner is not self.current:
+            self.current.impure = True
+
+    def visit_BinaryExpr(self, expr):
+        self._expr(expr.left)
+        self._expr(expr.right)
+
+    def visit_CallExpr(self, expr):
+        self._expr(expr.callee)
+        for argument in expr.arguments:
+            self._expr(argument)
+
+        if self.current is None:
+            return
+        if not isinstance(expr.callee, Expr.Variable):
+            # calling whatever another call (or a grouping) returned
+            self.current.impure = True
+        else:
+            variable = self._variable(expr.callee)
+            self.current.calls.append(expr.callee.name.lexeme if variable is None else variable)
+
+    def visit_GroupingExpr(self, expr):
+        self._expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        pass
+
+    def visit_LogicalExpr(self, expr):
+        self._expr(expr.left)
+        self._expr(expr.right)
+
+    def visit_UnaryExpr(self, expr):
+        self._expr(expr.right)
+
+    def visit_VariableExpr(self, expr):
+        if self.current is None:
+            return
+
+        variable = self._variable(expr)
+        if variable is None:
+            self.current.global_reads.add(expr.name.lexeme)
+        elif variable.owner is not self.current:
+            self.current.captured.append(variable)
@@ -0,0 +1,172 @@
+"""
+Specialized ("quickened") forms of the Binary and Unary nodes, used by the
+tree-walking Interpreter.
+
+The first time the Interpreter evaluates a Binary or Unary node, it rewrites
+the node's class in place to one of the subclasses below. The choice depends
+on the operator and the types of the operands it just saw, so `a + b` on two
+numbers becomes a NumberAdd whose visit method only checks both operands
+are floats and adds them. When a specialized node meets operands it was not
+specialized for, it falls back to the Generic form for good.
+
+The subclasses add no slots, which is what lets `__class__` be reassigned.
+Every other visitor still sees a Binary or Unary, through isinstance() and
+accept().
+
+counting_loop() similarly recognizes the For loops the Interpreter can run
+as a plain numeric count.
+"""
+import expr as Expr
+import stmt as Stmt
+from rope import Rope
+from tokentype import TokenType
+
+
+class GenericBinary(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberAdd(Expr.Binary):
+    __slots__ = ()
+
+
+class StringAdd(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberSubtract(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberMultiply(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberDivide(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberGreater(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberGreaterEqual(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberLess(Expr.Binary):
+    __slots__ = ()
+
+
+class NumberLessEqual(Expr.Binary):
+    __slots__ = ()
+
+
+class Equal(Expr.Binary):
+    __slots__ = ()
+
+
+class NotEqual(Expr.Binary):
+    __slots__ = ()
+
+
+class GenericUnary(Expr.Unary):
+    __slots__ = ()
+
+
+class NumberNegate(Expr.Unary):
+    __slots__ = ()
+
+
+class Not(Expr.Unary):
+    __slots__ = ()
+
+
+# (operator, left operand type, right operand type) -> specialized class
+BINARY_FORMS = {
+    (TokenType.PLUS, float, float): NumberAdd,
+    (TokenType.PLUS, str, str): StringAdd,
+    (TokenType.PLUS, Rope, str): StringAdd,
+    (TokenType.PLUS, str, Rope): StringAdd,
+    (TokenType.PLUS, Rope, Rope): StringAdd,
+    (TokenType.MINUS, float, float): NumberSubtract,
+    (TokenType.STAR, float, float): NumberMultiply,
+    (TokenType.SLASH, float, float): NumberDivide,
+    (TokenType.GREATER, float, float): NumberGreater,
+    (TokenType.GREATER_EQUAL, float, float): NumberGreaterEqual,
+    (TokenType.LESS, float, float): NumberLess,
+    (TokenType.LESS_EQUAL, float, float): NumberLessEqual,
+}
+
+# operators that work the same on any operands
+UNTYPED_FORMS = {
+    TokenType.EQUAL_EQUAL: Equal,
+    TokenType.BANG_EQUAL: NotEqual,
+    TokenType.BANG: Not,
+}
+
+
+def binary_form(operator_type, left, right):
+    form = UNTYPED_FORMS.get(operator_type)
+    if form is None:
+        form = BINARY_FORMS.get((operator_type, left.__class__, right.__class__), GenericBinary)
+    return form
+
+
+def unary_form(operator_type, right):
+    form = UNTYPED_FORMS.get(operator_type)
+    if form is None:
+        form = NumberNegate if operator_type == TokenType.MINUS and right.__class__ is float else GenericUnary
+    return form
+
+
+def _is_local(expr, slot):
+    return isinstance(expr, Expr.Variable) and expr.depth == 0 and expr.slot == slot
+
+
+def counting_loop(stmt):
+    """
+    For a For loop of the form `for (var i = ...; i < limit; i = i + step)`
+    with a number literal `step`: (slot of i, the limit expression, step).
+    False for any other loop.
+    """
+    initializer, condition, increment = stmt.initializer, stmt.condition, stmt.increment
+    if not isinstance(initializer, Stmt.Var) or initializer.slot is None:
+        return False
+    slot = initializer.slot
+    if not (isinstance(condition, Expr.Binary) and condition.operator.type == TokenType.LESS
+            and _is_local(condition.left, slot)):
+        return False
+    if not (isinstance(increment, Expr.Assign) and increment.depth == 0 and increment.slot == slot):
+        return False
+
+    value = increment.value
+    if not (isinstance(value, Expr.Binary) and value.operator.type == TokenType.PLUS
+            and _is_local(value.left, slot)
+            and isinstance(value.right, Expr.Literal) and value.right.value.__class__ is float):
+        return False
+    return slot, condition.right, value.right.value
+
+
+VISIT_METHODS = {
+    GenericBinary: 'visit_GenericBinaryExpr',
+    NumberAdd: 'visit_NumberAddExpr',
+    StringAdd: 'visit_StringAddExpr',
+    NumberSubtract: 'visit_NumberSubtractExpr',
+    NumberMultiply: 'visit_NumberMultiplyExpr',
+    NumberDivide: 'visit_NumberDivideExpr',
+    NumberGreater: 'visit_NumberGreaterExpr',
+    NumberGreaterEqual: 'visit_NumberGreaterEqualExpr',
+    NumberLess: 'visit_NumberLessExpr',
+    NumberLessEqual: 'visit_NumberLessEqualExpr',
+    Equal: 'visit_EqualExpr',
+    NotEqual: 'visit_NotEqualExpr',
+    GenericUnary: 'visit_GenericUnaryExpr',
+    NumberNegate: 'visit_NumberNegateExpr',
+    Not: 'visit_NotExpr',
+}
+
+
+def dispatch_table(visitor):
+    '''Like Expr.dispatch_table, for the specialized classes.'''
+    return {cls: getattr(visitor, name) for cls, name in VISIT_METHODS.items()}
@@ -0,0 +1,200 @@
+from enum import Enum, auto
+
+import stmt as Stmt
+from expr import Visitor as ExprVisitor
+from stmt import Visitor as StmtVisitor
+
+
+class FunctionType(Enum):
+    NONE = auto()
+    FUNCTION = auto()
+
+
+class Resolver(ExprVisitor, StmtVisitor):
+    """
+    Static pass run between the parser and the interpreter.
+
+    Works out, for every local variable reference, how many scopes up the
+    variable was declared (depth) and at which index of that scope (slot),
+    and stores the answer on the node. References that are not found in any
+    enclosing scope are left unresolved and treated as globals.
+
+    A block that declares nothing gets no scope at all (its scope_size is 0),
+    so the backends run it in the enclosing environment. Blocks and functions
+    are also marked `captured` when a function declared inside them might
+    keep their scope alive after they finish; the others can reuse their
+    environments.
+    """
+
+    def __init__(self, set_error):
+        # each scope maps a variable name to [slot, is_defined]
+        self.scopes = []
+        self.current_function = FunctionType.NONE
+        self.error_handler = set_error
+        # functions declared so far, to tell which scopes may be captured
+        self.function_count = 0
+
+    def resolve(self, statements):
+        for statement in statements:
+            self._resolve_stmt(statement)
+
+    def _resolve_stmt(self, stmt):
+        stmt.accept(self)
+
+    def _resolve_expr(self, expr):
+        expr.accept(self)
+
+    def _begin_scope(self):
+        self.scopes.append({})
+
+    def _end_scope(self):
+        return len(self.scopes.pop())
+
+    def _declare(self, name):
+        """Returns the slot the variable was given, or None for a global."""
+        if not self.scopes:
+            return None
+
+        scope = self.scopes[-1]
+        if name.lexeme in scope:
+            self.error_handler(name, "Already a variable with this name in this scope.")
+            return scope[name.lexeme][0]
+
+        slot = len(scope)
+        scope[name.lexeme] = [slot, False]
+        return slot
+
+    def _define(self, name):
+        if not self.scopes:
+            return
+        self.scopes[-1][name.lexeme][1] = True
+
+    def _resolve_local(self, expr, name):
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if name.lexeme in scope:
+                expr.depth = depth
+                expr.slot = scope[name.lexeme][0]
+                return
+
+    def _resolve_function(self, function, function_type):
+        enclosing_function = self.current_function
+        self.current_function = function_type
+
+        functions = self.function_count
+        self._begin_scope()
+        for param in function.params:
+            self._declare(param)
+            self._define(param)
+        self.resolve(function.body)
+        function.scope_size = self._end_scope()
+        function.captured = self.function_count != functions
+
+        self.current_function = enclosing_function
+
+    def visit_BlockStmt(self, stmt):
+        # (declarations can only appear directly in a block's statements)
+        if not any(isinstance(statement, (Stmt.Var, Stmt.Function)) for statement in stmt.statements):
+            self.resolve(stmt.statements)
+            stmt.scope_size = 0
+            stmt.captured = False
+            return
+
+        functions = self.function_count
+        self._begin_scope()
+        self.resolve(stmt.statements)
+        stmt.scope_size = self._end_scope()
+        stmt.captured = self.function_count != functions
+
+    def visit_ExpressionStmt(self, stmt):
+        self._resolve_expr(stmt.expression)
+
+    def visit_ForStmt(self, stmt):
+        # a `var` initializer gets a scope around the whole loop, shared by
+        # every iteration
+        if not isinstance(stmt.initializer, Stmt.Var):
+            if stmt.initializer is not None:
+                self._resolve_stmt(stmt.initializer)
+            self._resolve_loop(stmt)
+            stmt.scope_size = 0
+            stmt.captured = False
+            return
+
+        functions = self.function_count
+        self._begin_scope()
+        self._resolve_stmt(stmt.initializer)
+        self._resolve_loop(stmt)
+        stmt.scope_size = self._end_scope()
+        stmt.captured = self.function_count != functions
+
+    def _resolve_loop(self, stmt):
+        self._resolve_expr(stmt.condition)
+        self._resolve_stmt(stmt.body)
+        if stmt.increment is not None:
+            self._resolve_expr(stmt.increment)
+
+    def visit_FunctionStmt(self, stmt):
+        self.function_count += 1
+        stmt.slot = self._declare(stmt.name)
+        self._define(stmt.name)
+
+        self._resolve_function(stmt, FunctionType.FUNCTION)
+
+    def visit_IfStmt(self, stmt):
+        self._resolve_expr(stmt.condition)
+        self._resolve_stmt(stmt.then_branch)
+        if stmt.else_branch is not None:
+            self._resolve_stmt(stmt.else_branch)
+
+    def visit_PrintStmt(self, stmt):
+        self._resolve_expr(stmt.expression)
+
+    def visit_ReturnStmt(self, stmt):
+        if self.current_function == FunctionType.NONE:
+            self.error_handler(stmt.keyword, "Can't return from top-level code.")
+
+        if stmt.value is not None:
+            self._resolve_expr(stmt.value)
+
+    def visit_VarStmt(self, stmt):
+        stmt.slot = self._declare(stmt.name)
+        if stmt.initializer is not None:
+            self._resolve_expr(stmt.initializer)
+        self._define(stmt.name)
+
+    def visit_WhileStmt(self, stmt):
+        self._resolve_expr(stmt.condition)
+        self._resolve_stmt(stmt.body)
+
+    def visit_AssignExpr(self, expr):
+        self._resolve_expr(expr.value)
+        self._resolve_local(expr, expr.name)
+
+    def visit_BinaryExpr(self, expr):
+        self._resolve_expr(expr.left)
+        self._resolve_expr(expr.right)
+
+    def visit_CallExpr(self, expr):
+        self._resolve_expr(expr.callee)
+        for argument in expr.arguments:
+            self._resolve_expr(argument)
+
+    def visit_GroupingExpr(self, expr):
+        self._resolve_expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        pass
+
+    def visit_LogicalExpr(self, expr):
+        self._resolve_expr(expr.left)
+        self._resolve_expr(expr.right)
+
+    def visit_UnaryExpr(self, expr):
+        self._resolve_expr(expr.right)
+
+    def visit_VariableExpr(self, expr):
+        if self.scopes:
+            variable = self.scopes[-1].get(expr.name.lexeme)
+            if variable is not None and not variable[1]:
+                self.error_handler(expr.name, "Can't read local variable in its own initializer.")
+
+        self._resolve_local(expr, expr.name)
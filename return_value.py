@@ -0,0 +1,5 @@
+class Return(Exception):
+    """Unwinds the interpreter back to the LoxFunction.call that is returning."""
+
+    def __init__(self, value):
+        self.value = value
@@ -0,0 +1,98 @@
+"""
+Rope, the tree-walker's representation of long strings built by repeated
+concatenation, so that `s = s + x;` in a loop is linear instead of
+quadratic.
+
+A Rope is a view of a prefix of a shared, append-only _Builder. Appending to
+the view that owns the builder (the last one appended to) appends in place.
+Appending to any other view copies first, so `a = s + "x"; b = s + "y";`
+still gives two different strings. The text is only joined into a str
+(flattened) when something needs it: printing, comparing, hashing or
+handing it to a native. To Lox programs a Rope is just a string.
+"""
+
+# shorter results of `+` stay plain strs, which are cheaper to build
+ROPE_THRESHOLD = 1024
+
+# appended pieces are joined into one chunk this many at a time
+_TAIL_SIZE = 256
+
+
+class _Builder():
+    __slots__ = ('chunks', 'tail', 'length', 'owner')
+
+    def __init__(self, text):
+        self.chunks = [text]
+        self.tail = []
+        self.length = len(text)
+        # the Rope that may append in place
+        self.owner = None
+
+    def append(self, text):
+        self.tail.append(text)
+        self.length += len(text)
+        if len(self.tail) >= _TAIL_SIZE:
+            self.chunks.append(''.join(self.tail))
+            self.tail.clear()
+
+    def flatten(self):
+        if len(self.chunks) > 1 or self.tail:
+            self.chunks = [''.join(self.chunks) + ''.join(self.tail)]
+            self.tail.clear()
+        return self.chunks[0]
+
+
+class Rope():
+    __slots__ = ('builder', 'length', 'flat')
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.length = builder.length
+        builder.owner = self
+        self.flat = None
+
+    def append(self, text):
+        builder = self.builder
+        if builder.owner is not self:
+            builder = _Builder(str(self))
+        builder.append(text)
+        return Rope(builder)
+
+    def __str__(self):
+        if self.flat is None:
+            text = self.builder.flatten()
+            self.flat = text if len(text) == self.length else text[:self.length]
+        return self.flat
+
+    def __eq__(self, other):
+        if other.__class__ is Rope:
+            other = str(other)
+        return other.__class__ is str and str(self) == other
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+STRING_TYPES = (str, Rope)
+
+
+def concat(left, right):
+    """`left + right` for two Lox strings, each a str or a Rope."""
+    if right.__class__ is Rope:
+        right = str(right)
+    if left.__class__ is Rope:
+        return left.append(right)
+    if len(left) + len(right) < ROPE_THRESHOLD:
+        return left + right
+
+    builder = _Builder(left)
+    builder.append(right)
+    return Rope(builder)
+
+
+def flatten(value):
+    """`value`, with a Rope turned into the str it stands for."""
+    return str(value) if value.__class__ is Rope else value
@@ -1,4 +1,4 @@
 class LoxRuntimeError(RuntimeError):
     def __init__(self, token, message):
         self.token = token
-        super(LoxRuntimeError, self).__init__(message=message)
\ No newline at end of file
+        super(LoxRuntimeError, self).__init__(message)
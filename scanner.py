@@ -1,119 +1,171 @@
-from tokens import Token
+import re
+import sys
+
+from tokens import SpanToken, Token
 from tokentype import TokenType
 
+KEYWORDS = {
+    'and': TokenType.AND,
+    'class': TokenType.CLASS,
+    'else': TokenType.ELSE,
+    'false': TokenType.FALSE,
+    'for': TokenType.FOR,
+    'fun': TokenType.FUN,
+    'if': TokenType.IF,
+    'nil': TokenType.NIL,
+    'or': TokenType.OR,
+    'print': TokenType.PRINT,
+    'return': TokenType.RETURN,
+    'super': TokenType.SUPER,
+    'this': TokenType.THIS,
+    'true': TokenType.TRUE,
+    'var': TokenType.VAR,
+    'while': TokenType.WHILE,
+}
+
+OPERATORS = {
+    '(': TokenType.LEFT_PAREN,
+    ')': TokenType.RIGHT_PAREN,
+    '{': TokenType.LEFT_BRACE,
+    '}': TokenType.RIGHT_BRACE,
+    ',': TokenType.COMMA,
+    '.': TokenType.DOT,
+    '-': TokenType.MINUS,
+    '+': TokenType.PLUS,
+    ';': TokenType.SEMICOLON,
+    '/': TokenType.SLASH,
+    '*': TokenType.STAR,
+    '!': TokenType.BANG,
+    '!=': TokenType.BANG_EQUAL,
+    '=': TokenType.EQUAL,
+    '==': TokenType.EQUAL_EQUAL,
+    '>': TokenType.GREATER,
+    '>=': TokenType.GREATER_EQUAL,
+    '<': TokenType.LESS,
+    '<=': TokenType.LESS_EQUAL,
+}
+
+# One alternative per kind of lexeme, tried in order at each position. Whitespace
+# and comments are skipped as a single match; `lastgroup` says which one matched.
+TOKEN_PATTERN = re.compile(r'''
+    (?P<skip>(?:[ \t\r\n]|//[^\n]*)+)
+  | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<operator>[!=<>]=?|[(){},.\-+;/*])
+  | (?P<number>[0-9]+(?:\.[0-9]+)?)
+  | (?P<string>"[^"]*"?)
+  | (?P<error>.)
+''', re.VERBOSE | re.DOTALL)
+
+# TOKEN_PATTERN for UTF-8 bytes; a stray multi-byte character is one error
+BYTES_TOKEN_PATTERN = re.compile(
+    TOKEN_PATTERN.pattern.replace('(?P<error>.)', r'(?P<error>[\xc0-\xff][\x80-\xbf]*|.)').encode('ascii'),
+    re.VERBOSE | re.DOTALL)
+
+BYTES_KEYWORDS = {name.encode('ascii'): (token_type, name) for name, token_type in KEYWORDS.items()}
+BYTES_OPERATORS = {text.encode('ascii'): (token_type, text) for text, token_type in OPERATORS.items()}
+
+
 class Scanner():
+    """
+    Splits Lox source into Tokens with one compiled regex (TOKEN_PATTERN) and
+    lookup tables, instead of a branch per character.
+    """
+
     def __init__(self, source, errCallback):
         self.source = source
-        self.tokens = []
-        self.start = 0
-        self.current = 0
         self.line = 0
         self.error = errCallback
 
     def scan_tokens(self):
-        while not self.is_at_end:
-            self.start = self.current
-            self.scan_token()
-        self.tokens.append(Token(TokenType.EOF, "", None, self.line))
-        return self.tokens
-
-    def scan_token(self):
-        c = self.advance()
-        #TODO: large elif chainge -> move to a switch-like if perf ever matters
-
-        if c == '(': self.add_token(TokenType.LEFT_PAREN)
-        elif c == ')': self.add_token(TokenType.RIGHT_PAREN)
-        elif c == '{': self.add_token(TokenType.LEFT_BRACE)
-        elif c == '}': self.add_token(TokenType.RIGHT_BRACE)
-        elif c == ',': self.add_token(TokenType.COMMA)
-        elif c == '.': self.add_token(TokenType.DOT)
-        elif c == '-': self.add_token(TokenType.MINUS)
-        elif c == '+': self.add_token(TokenType.PLUS)
-        elif c == ';': self.add_token(TokenType.SEMICOLON)
-        elif c == '*': self.add_token(TokenType.STAR)
-        elif c == '!': self.add_token(TokenType.BANG_EQUAL if self.match('=') else TokenType.BANG)
-        elif c == '=': self.add_token(TokenType.EQUAL_EQUAL if self.match('=') else TokenType.EQUAL)
-        elif c == '<': self.add_token(TokenType.LESS_EQUAL if self.match('=') else TokenType.LESS)
-        elif c == '>': self.add_token(TokenType.GREATER_EQUAL if self.match('=') else TokenType.GREATER)
-
-        elif c == '/':
-            if self.match('/'):
-                # then this is a (c-style) line comment
-                while self.peek() != '\n' and not self.is_at_end:
-                    self.advance()
+        return list(self.iter_tokens())
+
+    def iter_tokens(self):
+        """Yields the tokens one at a time, ending with EOF."""
+        line = self.line
+        keywords = KEYWORDS
+        operators = OPERATORS
+        identifier = TokenType.IDENTIFIER
+        make_token = Token._make
+
+        for match in TOKEN_PATTERN.finditer(self.source):
+            kind = match.lastgroup
+            text = match.group()
+
+            if kind == 'skip':
+                line += text.count('\n')
+            elif kind == 'identifier':
+                yield make_token((keywords.get(text, identifier), text, None, line))
+            elif kind == 'operator':
+                yield make_token((operators[text], text, None, line))
+            elif kind == 'number':
+                yield make_token((TokenType.NUMBER, text, float(text), line))
+            elif kind == 'string':
+                line += text.count('\n')
+                if len(text) == 1 or text[-1] != '"':
+                    self.error(line, "Unterminated string")
+                else:
+                    yield make_token((TokenType.STRING, text, text[1:-1], line))
             else:
-                self.add_token(TokenType.SLASH)
-
-        elif c in {' ', '\r', '\t'}:
-            pass
-        elif c == '\n':
-            self.line += 1
-
-        elif c == '"': self.string()
-        elif c.isnumeric(): self.number()
-        elif c.isalpha(): self.identifier()
-
-
-        else:
-            self.error(self.line, "unexpected character: {}".format(c))
-
-    def string(self):
-        while self.peek() != '"' and not self.is_at_end:
-            if self.peek() == '\n':
-                self.line += 1
-            self.advance()
-
-        if self.is_at_end:
-            self.error(self.line, "Unterminated string")
-            return
-
-        self.advance()
-
-        self.add_token(TokenType.STRING, self.source[self.start+1:self.current-1])
-
-    def number(self):
-        while self.peek().isnumeric():
-            self.advance()
-
-        if self.peek() == '.' and self.peek(1).isdigit():
-            self.advance()
-
-            while self.peek().isnumeric():
-                self.advance()
-
-        self.add_token(TokenType.NUMBER, float(self.source[self.start:self.current]))
-
-    def identifier(self):
-        while self.peek().isalnum():
-            self.advance()
-
-        text = self.source[self.start:self.current]
-        if text.lower() == text and text.upper() in TokenType.__members__:
-            self.add_token(TokenType[text.upper()])
-        else:
-            self.add_token(TokenType.IDENTIFIER)
-
-    def match(self, expected):
-        if self.is_at_end: return False
-        if self.source[self.current] != expected: return False
-
-        self.current += 1
-        return True
-
-    def peek(self, ahead=0):
-        if self.current + ahead >= len(self.source):
-            return '\0'
-        return self.source[self.current]
-
-    def add_token(self, token_type, literal=None):
-        text = self.source[self.start:self.current]
-        self.tokens.append(Token(token_type, text, literal, self.line))
+                self.error(line, "unexpected character: {}".format(text))
+
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
+
+
+class ByteScanner(Scanner):
+    """
+    A Scanner over the UTF-8 bytes of the source, such as an mmap of the
+    file, so the source never has to be decoded into one big str.
+
+    Numbers and strings become SpanTokens, which only decode their lexeme
+    if something (usually an error message) asks for it. Keywords and
+    operators share one lexeme per kind, and identifiers are interned, so
+    every use of a name shares one str.
+    """
+
+    def iter_tokens(self):
+        line = self.line
+        source = self.source
+        keywords = BYTES_KEYWORDS
+        operators = BYTES_OPERATORS
+        identifier = TokenType.IDENTIFIER
+        make_token = Token._make
+        make_span = SpanToken._make
+        intern = sys.intern
+
+        for match in BYTES_TOKEN_PATTERN.finditer(source):
+            kind = match.lastgroup
+            text = match.group()
+
+            if kind == 'skip':
+                line += text.count(b'\n')
+            elif kind == 'identifier':
+                keyword = keywords.get(text)
+                if keyword is not None:
+                    yield make_token((keyword[0], keyword[1], None, line))
+                else:
+                    yield make_token((identifier, intern(text.decode('ascii')), None, line))
+            elif kind == 'operator':
+                token_type, lexeme = operators[text]
+                yield make_token((token_type, lexeme, None, line))
+            elif kind == 'number':
+                yield make_span((TokenType.NUMBER, float(text), line, source, match.start(), len(text)))
+            elif kind == 'string':
+                line += text.count(b'\n')
+                if len(text) == 1 or text[-1] != 0x22:
+                    self.error(line, "Unterminated string")
+                else:
+                    yield make_span((TokenType.STRING, text[1:-1].decode('utf-8', 'replace'), line,
+                                     source, match.start(), len(text)))
+            else:
+                self.error(line, "unexpected character: {}".format(text.decode('utf-8', 'replace')))
 
-    def advance(self):
-        self.current += 1
-        return self.source[self.current - 1]
+        self.line = line
+        yield Token(TokenType.EOF, "", None, line)
 
-    @property
-    def is_at_end(self):
-        return self.current >= len(self.source)
 
+def scanner_for(source, errCallback):
+    """A Scanner for a str `source`, or a ByteScanner for bytes, an mmap or the like."""
+    if isinstance(source, str):
+        return Scanner(source, errCallback)
+    return ByteScanner(source, errCallback)
@@ -0,0 +1,25 @@
+"""Where AST nodes come from in the source, for error messages and reports."""
+import expr as Expr
+import stmt as Stmt
+from tokens import SpanToken, Token
+
+
+def first_line(node):
+    """
+    The line of the first token in `node` (an Expr, a Stmt or a list of
+    them), or None when it holds none, as in `print 1;`. It walks the tree
+    without recursing, so it also works on one too deep to visit.
+    """
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (Token, SpanToken)):
+            return node.line
+        if isinstance(node, list):
+            pending.extend(reversed(node))
+        elif isinstance(node, (Expr.Expr, Stmt.Stmt)):
+            # the slots of every node are in source order; quickened nodes
+            # are subclasses adding no slots of their own
+            names = [name for cls in type(node).__mro__ for name in getattr(cls, '__slots__', ())]
+            pending.extend(getattr(node, name) for name in reversed(names))
+    return None
@@ -13,6 +13,9 @@ class Visitor(ABC):
     def visit_ExpressionStmt(self):
         pass
     @abstractmethod
+    def visit_ForStmt(self):
+        pass
+    @abstractmethod
     def visit_FunctionStmt(self):
         pass
     @abstractmethod
@@ -22,6 +25,9 @@ class Visitor(ABC):
     def visit_PrintStmt(self):
         pass
     @abstractmethod
+    def visit_ReturnStmt(self):
+        pass
+    @abstractmethod
     def visit_VarStmt(self):
         pass
     @abstractmethod
@@ -29,21 +35,28 @@ class Visitor(ABC):
         pass
 
 class Stmt(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def accept(self, visitor):
         '''Call a method on the visitor based on your class name'''
         pass
 
 class Block(Stmt):
+    __slots__ = ('statements', 'scope_size', 'captured', 'frames')
 
     def __init__(self, statements):
         self.statements = statements
+        self.scope_size = None
+        self.captured = None
+        self.frames = None
 
     def accept(self, visitor):
         return visitor.visit_BlockStmt(self)
 
 
 class Expression(Stmt):
+    __slots__ = ('expression',)
 
     def __init__(self, expression):
         self.expression = expression
@@ -52,18 +65,41 @@ class Expression(Stmt):
         return visitor.visit_ExpressionStmt(self)
 
 
+class For(Stmt):
+    __slots__ = ('initializer', 'condition', 'increment', 'body', 'scope_size', 'captured', 'frames', 'counter')
+
+    def __init__(self, initializer, condition, increment, body):
+        self.initializer = initializer
+        self.condition = condition
+        self.increment = increment
+        self.body = body
+        self.scope_size = None
+        self.captured = None
+        self.frames = None
+        self.counter = None
+
+    def accept(self, visitor):
+        return visitor.visit_ForStmt(self)
+
+
 class Function(Stmt):
+    __slots__ = ('name', 'params', 'body', 'slot', 'scope_size', 'pure_reads', 'captured')
 
     def __init__(self, name, params, body):
         self.name = name
         self.params = params
         self.body = body
+        self.slot = None
+        self.scope_size = None
+        self.pure_reads = None
+        self.captured = None
 
     def accept(self, visitor):
         return visitor.visit_FunctionStmt(self)
 
 
 class If(Stmt):
+    __slots__ = ('condition', 'then_branch', 'else_branch')
 
     def __init__(self, condition, then_branch, else_branch):
         self.condition = condition
@@ -75,6 +111,7 @@ class If(Stmt):
 
 
 class Print(Stmt):
+    __slots__ = ('expression',)
 
     def __init__(self, expression):
         self.expression = expression
@@ -83,17 +120,31 @@ class Print(Stmt):
         return visitor.visit_PrintStmt(self)
 
 
+class Return(Stmt):
+    __slots__ = ('keyword', 'value')
+
+    def __init__(self, keyword, value):
+        self.keyword = keyword
+        self.value = value
+
+    def accept(self, visitor):
+        return visitor.visit_ReturnStmt(self)
+
+
 class Var(Stmt):
+    __slots__ = ('name', 'initializer', 'slot')
 
     def __init__(self, name, initializer):
         self.name = name
         self.initializer = initializer
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_VarStmt(self)
 
 
 class While(Stmt):
+    __slots__ = ('condition', 'body')
 
     def __init__(self, condition, body):
         self.condition = condition
@@ -103,3 +154,23 @@ class While(Stmt):
         return visitor.visit_WhileStmt(self)
 
 
+VISIT_METHODS = {
+    Block: 'visit_BlockStmt',
+    Expression: 'visit_ExpressionStmt',
+    For: 'visit_ForStmt',
+    Function: 'visit_FunctionStmt',
+    If: 'visit_IfStmt',
+    Print: 'visit_PrintStmt',
+    Return: 'visit_ReturnStmt',
+    Var: 'visit_VarStmt',
+    While: 'visit_WhileStmt',
+}
+
+
+def dispatch_table(visitor):
+    '''
+    Maps each node class to the matching bound visit method of `visitor`, so
+    a visitor can dispatch with `table[node.__class__](node)` instead of
+    going through accept().
+    '''
+    return {cls: getattr(visitor, name) for cls, name in VISIT_METHODS.items()}
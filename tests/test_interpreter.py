@@ -0,0 +1,419 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from compiler import Compiler
+import expr as Expr
+from interpreter import Interpreter
+from jit import Jit
+import loxc
+from output import OutputSink
+from parse import Parser
+import quickening
+from resolver import Resolver
+from scanner import Scanner
+import stmt as Stmt
+from tokens import Token
+from tokentype import TokenType
+import transpiler
+from vm import VM
+
+# 'jit' is the tree-walker compiling every function and loop as soon as it runs
+BACKENDS = ('tree', 'closure', 'vm', 'python', 'jit')
+
+
+def _fail(*args):
+    raise AssertionError("failed to compile: {}".format(args))
+
+
+def parse(source):
+    statements = Parser(Scanner(source, _fail).scan_tokens(), _fail).parse()
+    Resolver(_fail).resolve(statements)
+    return statements
+
+
+def run(source, backend='tree', jit=None):
+    """What `backend` prints running `source` (or its statements), errors included."""
+    statements = parse(source) if isinstance(source, str) else source
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        if backend == 'vm':
+            VM(output=OutputSink(stdout)).interpret(Compiler(_fail).compile(statements))
+        elif backend == 'python':
+            transpiler.execute(transpiler.compile_program(statements))
+        else:
+            if backend == 'jit' and jit is None:
+                jit = Jit(threshold=1)
+            Interpreter(compile_closures=(backend == 'closure'), output=OutputSink(stdout),
+                        jit=jit).interpret(statements)
+    return stdout.getvalue()
+
+
+def test_calling_nil_is_a_runtime_error():
+    assert run("nil();") == "Can only call functions and classes.\n[line 0]\n"
+    assert run("var x;\nprint 1;\nx();") == "1\nCan only call functions and classes.\n[line 2]\n"
+
+
+def test_call_site_that_called_a_function_rejects_nil():
+    source = """
+var f;
+fun g() { return 1; }
+fun call() { return f(); }
+f = g;
+print call();
+f = nil;
+print call();
+"""
+    assert run(source) == "1\nCan only call functions and classes.\n[line 3]\n"
+
+
+def test_arguments_run_before_the_callee_is_checked():
+    source = 'var nf = nil; fun p() { print "side"; return 1; } nf(p());'
+    assert run(source) == "side\nCan only call functions and classes.\n[line 0]\n"
+    source = 'fun f() {} fun p() { print "side"; return 1; } f(p());'
+    assert run(source) == "side\nExpected 0 arguments but got 1.\n[line 0]\n"
+
+
+def test_arguments_that_reassign_the_callee_do_not_poison_the_cache():
+    source = """
+fun a(x) { print "a"; return x; }
+fun b(x) { print "b"; return x; }
+fun swap() { a = b; return 1; }
+for (var i = 0; i < 3; i = i + 1) a(swap());
+"""
+    assert run(source) == "a\nb\nb\n"
+
+
+def test_closure_compiler_reports_a_program_too_deep_to_compile():
+    # built directly: a program this deep is also too deep to parse
+    plus = Token(TokenType.PLUS, "+", None, 0)
+    expression = Expr.Literal(1.0)
+    for line in range(sys.getrecursionlimit()):
+        expression = Expr.Binary(expression, plus._replace(line=line + 2), Expr.Literal(1.0))
+    statements = [Stmt.Print(Expr.Literal(1.0)), Stmt.Print(expression)]
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        Interpreter(compile_closures=True, output=OutputSink(stdout)).interpret(statements)
+    # the statements before it still run, as on the other backends
+    assert stdout.getvalue() == "1\nStack overflow.\n[line 2]\n"
+
+
+PROGRAM = """
+fun makeCounter() {
+  var i = 0;
+  fun count() { i = i + 1; return i; }
+  return count;
+}
+var c = makeCounter();
+c();
+print c();
+var show = nil;
+{
+  var a = "before";
+  fun get() { print a; }
+  show = get;
+  a = "after";
+}
+show();
+fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }
+print fib(15);
+var s = "";
+for (var i = 0; i < 3; i = i + 1) { var j = i * 2; s = s + "x"; print j; }
+print s;
+var x = 1;
+{ var x = 2; { var x = 3; print x; } print x; }
+print x;
+print nil == false;
+print !nil;
+print "a" + "b" == "ab";
+print 7 / 2;
+print -(3 - 5);
+var u;
+print u;
+"""
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_run_programs_alike(backend):
+    assert run(PROGRAM, backend) == (
+        "2\nafter\n610\n0\n2\n4\nxxx\n3\n2\n1\nFalse\nTrue\nTrue\n3.5\n2\nNone\n")
+
+
+RUNTIME_ERRORS = [
+    ('print 1;\nprint -"a";', "1\nOperand must be a number\n[line 1]\n"),
+    ('print 1;\nprint 1 + "a";', "1\nOperands must be two numbers or two strings\n[line 1]\n"),
+    ('print 1;\nprint 1 < "a";', "1\nOperands must be numbers.\n[line 1]\n"),
+    ('print 1;\nprint nope;', "1\nUndefined variable 'nope'.\n[line 1]\n"),
+    ('print 1;\nnope = 2;', "1\nUndefined variable 'nope'.\n[line 1]\n"),
+    ('fun f(a, b) { return a; }\nprint 1;\nf(1);', "1\nExpected 2 arguments but got 1.\n[line 2]\n"),
+    ('var x = "str";\nprint 1;\nx();', "1\nCan only call functions and classes.\n[line 2]\n"),
+    ('fun f(n) {\n  return 1 + f(n + 1);\n}\nprint 1;\nf(0);', "1\nStack overflow.\n[line 1]\n"),
+    ('fun f(a) {\n  print 1;\n  return -a;\n}\nvar g = f;\n{\n  g("x");\n}', "1\nOperand must be a number\n[line 2]\n"),
+    ('fun f(a) {\n  fun h() {\n    return a();\n  }\n  return h();\n}\nf(1);',
+     "Can only call functions and classes.\n[line 2]\n"),
+    ('fun f(a) { return a * 2; }\nvar i = 0;\nwhile (i < 3) { print f(i); i = i + 1; }\nprint f("x");',
+     "0\n2\n4\nOperands must be numbers.\n[line 0]\n"),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source, output', RUNTIME_ERRORS)
+def test_backends_report_runtime_errors_alike(backend, source, output):
+    assert run(source, backend) == output
+
+
+SCOPING = """
+var f = nil;
+var g = nil;
+for (var i = 0; i < 3; i = i + 1) {
+  var j = i;
+  fun get() { return j; }
+  fun bump() { j = j + 10; return j; }
+  if (i == 1) { f = get; g = bump; }
+}
+print g();
+print f();
+fun outer() {
+  var a = 1;
+  fun inner() { a = a + 1; }
+  inner();
+  inner();
+  return a;
+}
+print outer();
+var v = "global";
+{
+  var v = "block";
+  { var v = "inner"; print v; }
+  print v;
+}
+print v;
+if (0) print "0 is truthy";
+if ("") print "empty string is truthy";
+if (nil) print "nil"; else print "nil is falsey";
+fun early(n) {
+  while (true) {
+    { if (n > 2) return "big"; }
+    n = n + 1;
+  }
+}
+print early(0);
+fun later() { return definedLater; }
+var definedLater = "seen";
+print later();
+print outer;
+print true and "x";
+print nil or "y";
+"""
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_scope_and_capture_variables_alike(backend):
+    # the python backend maps these onto Python locals, cells and globals
+    assert run(SCOPING, backend) == (
+        "11\n11\n3\ninner\nblock\nglobal\n0 is truthy\nempty string is truthy\n"
+        "nil is falsey\nbig\nseen\n<fn outer >\nx\ny\n")
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cached_statements_run_like_the_source(tmp_path, backend):
+    path = str(tmp_path / 'program.loxc')
+    loxc.store(path, PROGRAM, False, parse(PROGRAM))
+    statements = loxc.load(path, PROGRAM, False)
+    assert statements is not None
+    assert run(statements, backend) == run(PROGRAM, backend)
+
+
+def test_cached_statements_miss_for_other_source_or_flags(tmp_path):
+    path = str(tmp_path / 'program.loxc')
+    loxc.store(path, PROGRAM, False, parse(PROGRAM))
+    assert loxc.load(path, PROGRAM + " ", False) is None
+    assert loxc.load(path, PROGRAM, True) is None
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert loxc.load(path, PROGRAM, False) is None
+
+
+def test_cached_python_code_runs_like_the_source(tmp_path):
+    path = str(tmp_path / 'program.loxpyc')
+    loxc.store_code(path, SCOPING, False, transpiler.compile_program(parse(SCOPING)))
+    code = loxc.load_code(path, SCOPING, False)
+    assert code is not None
+    assert loxc.load_code(path, SCOPING + " ", False) is None
+    assert loxc.load_code(path, SCOPING, True) is None
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        transpiler.execute(code)
+    assert stdout.getvalue() == run(SCOPING, 'python')
+
+
+CALL_SITES = [
+    # a global function redefined after a call site has run
+    ('fun f() { print 1; }\nfun g() { f(); }\ng();\nfun f() { print 2; }\ng();', "1\n2\n"),
+    # a global callee reassigned after its call site has warmed up
+    ('fun a() { return 1; }\nfun b() { return 100; }\nvar f = a;\nvar s = 0;\n'
+     'for (var i = 0; i < 20; i = i + 1) {\n  if (i == 10) f = b;\n  s = s + f();\n}\nprint s;', "1010\n"),
+    # a callee reassigned to a function of another arity
+    ('fun one(a) { return a; }\nfun two(a, b) { return a + b; }\nvar h = one;\n'
+     'fun call() { return h(1, 2); }\nprint h(5);\nh = two;\nprint call();\nh = one;\nprint call();',
+     "5\n3\nExpected 1 arguments but got 2.\n[line 3]\n"),
+    # a local callee that is a new closure on every iteration
+    ('for (var i = 0; i < 3; i = i + 1) {\n  fun local(x) { return x + i; }\n  var k = local;\n'
+     '  if (i == 2) { fun other(x) { return x * 100; } k = other; }\n  print k(1);\n}', "1\n2\n100\n"),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source, output', CALL_SITES)
+def test_call_sites_see_the_current_callee(backend, source, output):
+    assert run(source, backend) == output
+
+
+# the same Binary or Unary node meeting operands of more than one type
+QUICKENED = [
+    ('fun add(a, b) { return a + b; }\nprint add(1, 2);\nprint add("a", "b");\n'
+     'print add(add("a", "b"), "c");\nprint add(1, 2);\nprint add(1, "b");',
+     "3\nab\nabc\n3\nOperands must be two numbers or two strings\n[line 0]\n"),
+    ('fun mul(a, b) { return a * b; }\nvar i = 0;\nwhile (i < 5) { print mul(i, 2); i = i + 1; }\nprint mul(2, nil);',
+     "0\n2\n4\n6\n8\nOperands must be numbers.\n[line 0]\n"),
+    ('fun less(a, b) { return a < b; }\nprint less(1, 2);\nprint less(2, 1);\nprint less("a", "b");',
+     "True\nFalse\nOperands must be numbers.\n[line 0]\n"),
+    ('fun eq(a, b) { return a == b; }\nprint eq(1, 1);\nprint eq("a", "a");\nprint eq(nil, false);\n'
+     'print eq(nil, nil);\nprint eq(1, "1");', "True\nTrue\nFalse\nTrue\nFalse\n"),
+    ('fun neg(a) { return -a; }\nprint neg(1);\nprint neg(-2);\nprint neg("a");',
+     "-1\n2\nOperand must be a number\n[line 0]\n"),
+    ('fun not(a) { return !a; }\nprint not(true);\nprint not(nil);\nprint not(0);', "False\nTrue\nFalse\n"),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source, output', QUICKENED)
+def test_operators_handle_operands_that_change_type(backend, source, output):
+    assert run(source, backend) == output
+
+
+def test_quickened_node_falls_back_to_the_generic_form():
+    statements = parse('fun add(a, b) { return a + b; }')
+    node = statements[0].body[0].value
+    run(statements + parse('print add(1, 2);'))
+    assert type(node) is quickening.NumberAdd
+    assert run(statements + parse('print add("a", "b");')) == "ab\n"
+    assert type(node) is quickening.GenericBinary
+    assert run(statements + parse('print add(1, 2);')) == "3\n"
+    assert type(node) is quickening.GenericBinary
+
+
+# programs that would go wrong if an environment in use were handed out again
+REUSED_SCOPES = [
+    # a recursive call while the caller's frame, or block, is still live
+    ('fun f(n) {\n  var a = n;\n  if (n > 0) f(n - 1);\n  print a;\n}\nf(3);', "0\n1\n2\n3\n"),
+    ('fun f(n) {\n  {\n    var a = n;\n    if (n > 0) f(n - 1);\n    print a;\n  }\n}\nf(3);', "0\n1\n2\n3\n"),
+    # a variable declared without a value is nil, whatever the last run left in its slot
+    ('for (var i = 0; i < 3; i = i + 1) {\n  var a;\n  print a;\n  a = i;\n}\n'
+     'fun g(x) {\n  var b;\n  print b;\n  b = x;\n}\ng(1);\ng(2);', "None\nNone\nNone\nNone\nNone\n"),
+    # closures keep the scope of the iteration, or the call, that made them
+    ('var prev = nil;\nfor (var i = 0; i < 3; i = i + 1) {\n  var j = i;\n  var p = prev;\n'
+     '  fun g() {\n    if (p != nil) p();\n    print j;\n  }\n  prev = g;\n}\nprev();', "0\n1\n2\n"),
+    ('fun outer(n) {\n  var a = n;\n  fun inner() { return a; }\n'
+     '  if (n > 0) { var r = outer(n - 1); print r() + a; }\n  return inner;\n}\nouter(2);', "1\n3\n"),
+    # returning from inside a block, then running it again
+    ('fun first(n) {\n  for (var i = 0; i < 10; i = i + 1) {\n    var k = i * n;\n    if (k > 5) return k;\n  }\n'
+     '  return -1;\n}\nprint first(2);\nprint first(3);\nprint first(0);', "6\n6\n-1\n"),
+    # a block that declares nothing runs in the enclosing scope
+    ('var x = 0;\nwhile (x < 3) {\n  { print x; }\n  x = x + 1;\n}', "0\n1\n2\n"),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source, output', REUSED_SCOPES)
+def test_reused_environments_keep_scopes_apart(backend, source, output):
+    assert run(source, backend) == output
+
+
+FOR_LOOPS = [
+    # the limit is read again every time round
+    ('var n = 5;\nfor (var i = 0; i < n; i = i + 1) {\n  n = n - 1;\n  print i;\n}', "0\n1\n2\n"),
+    # the body may assign the counter
+    ('for (var i = 0; i < 10; i = i + 1) {\n  if (i == 2) i = 7;\n  print i;\n}', "0\n1\n7\n8\n9\n"),
+    ('for (var i = 0; i < 1; i = i + 0.25) print i;\nfor (var i = 5; i < 3; i = i + 1) print i;',
+     "0\n0.25\n0.5\n0.75\n"),
+    # a counter or limit that is not a number
+    ('print 1;\nfor (var i = 0; i < 3; i = i + 1) {\n  i = "x";\n}',
+     "1\nOperands must be two numbers or two strings\n[line 1]\n"),
+    ('print 1;\nfor (var i = 0; i < "a"; i = i + 1) print i;', "1\nOperands must be numbers.\n[line 1]\n"),
+    ('print 1;\nfor (var i = "a"; i < 3; i = i + 1) print i;', "1\nOperands must be numbers.\n[line 1]\n"),
+    # there is one counter for the whole loop, but a new body scope every time round
+    ('var f = nil;\nfor (var i = 0; i < 3; i = i + 1) {\n  fun g() { print i; }\n  if (i == 0) f = g;\n}\nf();', "3\n"),
+    ('var f = nil;\nfor (var i = 0; i < 3; i = i + 1) {\n  var j = i;\n  fun g() { print j; }\n'
+     '  if (i == 1) f = g;\n}\nf();', "1\n"),
+    # loops the fast path does not take
+    ('var i;\nfor (i = 0; i < 3; i = i + 1) {}\nprint i;', "3\n"),
+    ('fun f() {\n  for (;;) return "out";\n}\nprint f();', "out\n"),
+    ('for (var i = 0; i < 2; i = i + 1)\n  for (var j = 0; j < 2; j = j + 1) print i * 10 + j;', "0\n1\n10\n11\n"),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source, output', FOR_LOOPS)
+def test_backends_run_for_loops_alike(backend, source, output):
+    assert run(source, backend) == output
+
+
+JIT_PROGRAMS = [
+    # compiled code calling a global that is reassigned, or redefined, later
+    ('fun helper() { return 1; }\nfun other() { return 100; }\nfun f() { return helper(); }\nvar s = 0;\n'
+     'for (var i = 0; i < 10; i = i + 1) {\n  if (i == 5) helper = other;\n  s = s + f();\n}\nprint s;', "505\n"),
+    ('fun helper() { return 1; }\nfun f() { return helper(); }\nprint f();\nprint f();\nprint f();\n'
+     'fun helper() { return "two"; }\nprint f();', "1\n1\n1\ntwo\n"),
+    ('fun a() { return "a"; }\nfun b() { return "b"; }\nfun swap() { a = b; }\n'
+     'fun f() { var r = a(); swap(); return r; }\nprint f();\nprint f();\nprint f();\nprint f();', "a\nb\nb\nb\n"),
+    ('var h = 1;\nfun f() { return h(); }\nprint 1;\nf();', "1\nCan only call functions and classes.\n[line 1]\n"),
+    # ...or a global that changes type
+    ('var g = 1;\nfun f() { return g + 1; }\nprint f();\nprint f();\nprint f();\ng = "a";\nprint f();',
+     "2\n2\n2\nOperands must be two numbers or two strings\n[line 1]\n"),
+    ('var n = 0;\nfor (var i = 0; i < 6; i = i + 1) {\n  if (i == 3) n = "s";\n  print n + n;\n}',
+     "0\n0\n0\nss\nss\nss\n"),
+    # closures made in a loop, each called compiled
+    ('var prev = nil;\nfor (var i = 0; i < 5; i = i + 1) {\n  var j = i;\n  var p = prev;\n'
+     '  fun g() {\n    var s = j;\n    if (p != nil) s = s + p();\n    return s;\n  }\n  prev = g;\n}\n'
+     'for (var k = 0; k < 4; k = k + 1) print prev();', "10\n10\n10\n10\n"),
+    ('fun makeCounter() {\n  var c = 0;\n  fun count() { c = c + 1; return c; }\n  return count;\n}\n'
+     'var a = makeCounter();\nvar b = makeCounter();\nfor (var i = 0; i < 5; i = i + 1) { a(); }\nprint a();\nprint b();',
+     "6\n1\n"),
+    ('var total = 0;\nfor (var i = 0; i < 5; i = i + 1) {\n  var j = 0;\n  while (j < i) { total = total + j; j = j + 1; }\n}\n'
+     'print total;', "10\n"),
+]
+
+
+@pytest.mark.parametrize('threshold', [1, 2, 3, 4])
+@pytest.mark.parametrize('source, output', JIT_PROGRAMS)
+def test_jit_runs_programs_like_the_interpreter(threshold, source, output):
+    assert run(source, 'tree') == output
+    assert run(source, 'jit', Jit(threshold=threshold)) == output
+
+
+@pytest.mark.parametrize('runs', [2, 3, 4])
+def test_jit_compiles_once_the_threshold_is_reached(runs):
+    source = ('fun f(n) { return n * 2; }\n' + 'print f(1);\n' * runs +
+              'for (var i = 0; i < {0}; i = i + 1) print i;\nvar k = 0;\nwhile (k < {0}) k = k + 1;\nprint k;'.format(runs))
+    jit = Jit(threshold=3)
+    assert run(source, 'jit', jit) == run(source, 'tree')
+    assert len(jit.tiers) == 3
+    for tier in jit.tiers.values():
+        assert tier.count == min(runs, 3)
+        assert (tier.code is not None) == (runs >= 3)
+
+
+def test_jit_leaves_a_loop_that_declares_a_function_to_the_interpreter():
+    source = JIT_PROGRAMS[6][0]
+    jit = Jit(threshold=3)
+    assert run(source, 'jit', jit) == JIT_PROGRAMS[6][1]
+    tiers = {tier.name: tier for tier in jit.tiers.values()}
+    assert tiers['for loop:1'].code is None and tiers['for loop:1'].reason == "declares function 'g'"
+    assert tiers['g:4'].code is not None
+    assert tiers['for loop:11'].code is not None
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lox_runtime import LoxRuntime
+
+
+def test_python_ints_are_lox_numbers():
+    runtime = LoxRuntime(globals={'m': 2})
+    runtime.define('n', 5)
+    runtime.define_native('rnd', lambda x: round(x))
+    result = runtime.eval('print n + 1; print m * n; rnd(2.4) + 1;')
+    assert result.ok, result.errors
+    assert result.output == "6\n10\n"
+    assert result.value == 3.0
+
+
+def test_python_bools_stay_booleans():
+    runtime = LoxRuntime(globals={'flag': True})
+    runtime.define_native('no', lambda: False)
+    result = runtime.eval('print flag; print no(); flag == true;')
+    assert result.output == "True\nFalse\n"
+    assert result.value is True
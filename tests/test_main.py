@@ -0,0 +1,115 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MAIN = os.path.join(ROOT, 'main.py')
+
+sys.path.insert(0, ROOT)
+
+import loxc
+import main
+from output import FLUSH_BYTES, OutputSink
+import transpiler
+
+
+def lox(tmp_path, source, *flags):
+    """What `python main.py FLAGS script` prints, stdout and stderr together."""
+    script = tmp_path / 'script.lox'
+    script.write_text(source)
+    result = subprocess.run([sys.executable, MAIN, *flags, str(script)], cwd=tmp_path,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return result.stdout
+
+
+@pytest.mark.parametrize('backend', ['tree', 'closure', 'vm'])
+def test_stream_stops_at_the_first_runtime_error(tmp_path, backend):
+    source = 'print 1;\nprint -"x";\nprint 2;\nprint -"y";\n'
+    output = lox(tmp_path, source, '--stream', '--no-cache', '--backend', backend)
+    assert output == "1\nOperand must be a number\n[line 1]\n"
+
+
+def test_stream_still_reports_later_syntax_errors(tmp_path):
+    output = lox(tmp_path, 'print -"x";\nprint 2;\nprint ;\n', '--stream', '--no-cache')
+    assert output.startswith("Operand must be a number\n[line 0]\n")
+    assert "2\n" not in output
+    assert "[line 2] Error  at ';'" in output
+
+
+def test_stream_stops_running_at_a_syntax_error_inside_a_block(tmp_path):
+    output = lox(tmp_path, 'print 1;\n{ print ; }\nprint 2;\nprint ;\n', '--stream', '--no-cache')
+    assert output == ("1\n[line 1] Error  at ';': Expected expresssion\n"
+                      "[line 3] Error  at ';': Expected expresssion\n")
+
+
+class CountingTarget(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+@pytest.mark.parametrize('backend', ['tree', 'vm'])
+def test_stream_does_not_flush_after_every_statement(backend):
+    target = CountingTarget()
+    source = ''.join('print {};\n'.format(n) for n in range(1000))
+    main.hasError = main.hasRuntimeError = False
+    main.run_stream(source, backend, output=OutputSink(target, FLUSH_BYTES))
+    assert target.getvalue().decode() == ''.join('{}\n'.format(n) for n in range(1000))
+    assert target.writes == 1
+
+
+def test_stream_prints_static_errors_after_the_output_before_them(tmp_path):
+    output = lox(tmp_path, 'print 1;\n{ var a = a; }\nprint 2;\n', '--stream', '--no-cache')
+    assert output == "1\n[line 1] Error  at 'a': Can't read local variable in its own initializer.\n"
+
+
+@pytest.mark.parametrize('flags', [['--backend', 'tree'], ['--backend', 'closure'], ['--backend', 'vm'],
+                                   ['--backend', 'python'], ['--async']])
+def test_arguments_run_before_calling_nil(tmp_path, flags):
+    source = 'var nf = nil; fun p() { print "side"; return 1; } nf(p());'
+    output = lox(tmp_path, source, '--no-cache', *flags)
+    assert output == "side\nCan only call functions and classes.\n[line 0]\n"
+
+
+def test_a_tree_run_does_not_import_other_backends(tmp_path):
+    script = tmp_path / 'script.lox'
+    script.write_text('print 1;')
+    check = ("import runpy, sys\n"
+             "sys.argv = [{main!r}, '--no-cache', {script!r}]\n"
+             "runpy.run_path({main!r}, run_name='__main__')\n"
+             "print(sorted(set(sys.modules) & {{'asyncio', 'async_interpreter', 'compiler', 'vm', "
+             "'jit', 'transpiler', 'profiler', 'purity'}}))\n").format(main=MAIN, script=str(script))
+    result = subprocess.run([sys.executable, '-c', check], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    assert result.stdout == "1\n[]\n"
+
+
+def test_help_shows_the_defaults_of_modules_it_does_not_import():
+    import jit
+    import vm
+
+    result = subprocess.run([sys.executable, MAIN, '--help'], stdout=subprocess.PIPE, text=True)
+    help_text = ' '.join(result.stdout.split())
+    assert "(default {})".format(vm.DEFAULT_MEMORY_BUDGET // (1024 * 1024)) in help_text
+    assert "(default {})".format(jit.DEFAULT_THRESHOLD) in help_text
+
+
+def test_python_backend_runs_the_code_cached_next_to_the_script(tmp_path):
+    source = 'print 1;'
+    assert lox(tmp_path, source, '--backend', 'python') == "1\n"
+    path = tmp_path / 'script.loxpyc'
+    assert loxc.load_code(str(path), source, False) is not None
+
+    # a hit runs the cached code without compiling the script again...
+    code = compile("def {}():\n    print('cached')\n".format(transpiler.MAIN), transpiler.FILENAME, 'exec')
+    loxc.store_code(str(path), source, False, code)
+    assert lox(tmp_path, source, '--backend', 'python') == "cached\n"
+    # ...but only for the same -O
+    assert lox(tmp_path, source, '--backend', 'python', '-O') == "1\n"
+    assert lox(tmp_path, source, '--backend', 'python', '--no-cache') == "1\n"
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import expr as Expr
+from parse import Parser
+from scanner import ByteScanner, Scanner
+from source_lines import first_line
+import stmt as Stmt
+from tokens import Token
+from tokentype import TokenType
+
+
+def _fail(*args):
+    raise AssertionError("failed to compile: {}".format(args))
+
+
+def parse(source, scanner=Scanner):
+    return Parser(scanner(source, _fail).scan_tokens(), _fail).parse()
+
+
+def test_first_line_is_the_leftmost_token():
+    statements = parse("var a = 1;\n\nprint\n(a\n + 2);\nfor (;;)\n  print a;\nprint 1;")
+    assert [first_line(statement) for statement in statements] == [0, 3, 6, None]
+    assert first_line(statements) == 0
+
+
+def test_first_line_of_byte_scanned_tokens():
+    statements = parse(b"\n\nprint \"s\" + x;", ByteScanner)
+    assert first_line(statements[0]) == 2
+
+
+def test_first_line_of_a_tree_too_deep_to_visit():
+    expression = Expr.Variable(Token(TokenType.IDENTIFIER, "x", None, 7))
+    for _ in range(sys.getrecursionlimit() * 2):
+        expression = Expr.Grouping(expression)
+    assert first_line(Stmt.Print(expression)) == 7
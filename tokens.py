@@ -5,3 +5,23 @@ class Token(namedtuple('Token', ['type', 'lexeme', 'literal', 'line'])):
     def str(self):
         return f"{self.type} {self.lexeme} {self.literal}"
 
+
+class SpanToken(namedtuple('SpanToken', ['type', 'literal', 'line', 'source', 'offset', 'length'])):
+    """
+    A Token that refers to its lexeme as (offset, length) in the bytes of the
+    source, and only decodes it when asked. Pickles as a plain Token.
+    """
+    __slots__ = ()
+
+    @property
+    def lexeme(self):
+        return self.source[self.offset:self.offset + self.length].decode('utf-8', 'replace')
+
+    def str(self):
+        return f"{self.type} {self.lexeme} {self.literal}"
+
+    def __reduce__(self):
+        return Token, (self.type, self.lexeme, self.literal, self.line)
+
+    def __repr__(self):
+        return repr(Token(self.type, self.lexeme, self.literal, self.line))
@@ -1,3 +1,4 @@
+import argparse
 import os
 
 template = """
@@ -11,63 +12,98 @@ class Visitor(ABC):
 {visitor_methods}
 
 class {base_class_name}(ABC):
+{base_slots}\
     @abstractmethod
     def accept(self, visitor):
         '''Call a method on the visitor based on your class name'''
         pass
 
 {classes_code}
+VISIT_METHODS = {{
+{visit_methods}
+}}
+
+
+def dispatch_table(visitor):
+    '''
+    Maps each node class to the matching bound visit method of `visitor`, so
+    a visitor can dispatch with `table[node.__class__](node)` instead of
+    going through accept().
+    '''
+    return {{cls: getattr(visitor, name) for cls, name in VISIT_METHODS.items()}}
 """
 
-def define_class(writer, base_class_name, class_name, fields):
+def define_class(writer, base_class_name, class_name, fields, resolved_fields, slots):
     newline = '\n'
+    slots_line = f"    __slots__ = {tuple(fields + resolved_fields)!r}\n" if slots else ""
     return f"""class {class_name}({base_class_name}):
-
+{slots_line}
     def __init__(self, {', '.join(fields)}):
-{''.join(f'        self.{field} = {field}{newline}' for field in fields)}
+{''.join(f'        self.{field} = {field}{newline}' for field in fields)}\
+{''.join(f'        self.{field} = None{newline}' for field in resolved_fields)}
     def accept(self, visitor):
         return visitor.visit_{class_name}{base_class_name}(self)
 
 """
 
-def define_ast(output_dir, filename, base_class_name, type_specs):
+def define_ast(output_dir, filename, base_class_name, type_specs, slots=True):
+    """
+    With `slots` the node classes get __slots__ (as does the base class), so
+    nodes carry no per-instance __dict__.
+    """
     path = os.path.join(output_dir, filename)
     class_strings = []
     visitor_method_strings = []
+    visit_method_strings = []
     for type_spec in type_specs:
         class_name = type_spec.split(':')[0].strip()
-        fields = type_spec.split(':')[1].strip().split(', ')
-        class_strings.append(define_class(class_name, base_class_name, class_name, fields))
+        # Fields after a '|' are not constructor arguments; they start out as
+        # None and are filled in later by the resolver.
+        field_spec, _, resolved_spec = type_spec.split(':')[1].partition('|')
+        fields = field_spec.strip().split(', ')
+        resolved_fields = resolved_spec.strip().split(', ') if resolved_spec.strip() else []
+        class_strings.append(define_class(class_name, base_class_name, class_name, fields, resolved_fields, slots))
         visitor_method_strings.append(
                 f"    @abstractmethod\n"
                 f"    def visit_{class_name}{base_class_name}(self):\n"
                 f"        pass")
+        visit_method_strings.append(f"    {class_name}: 'visit_{class_name}{base_class_name}',")
     with open(path, 'w') as f:
         f.write(template.format(
             base_class_name=base_class_name,
+            base_slots="    __slots__ = ()\n\n" if slots else "",
             classes_code='\n'.join(class_strings),
-            visitor_methods='\n'.join(visitor_method_strings)
+            visitor_methods='\n'.join(visitor_method_strings),
+            visit_methods='\n'.join(visit_method_strings)
         ))
 
 
 if __name__ == '__main__':
-    define_ast('..', 'expr.py', "Expr", [
-        "Assign   : name, value",
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('output_dir', nargs='?', default='..')
+    arg_parser.add_argument('--plain', action='store_true',
+                            help='emit classes with a per-instance __dict__ instead of __slots__')
+    args = arg_parser.parse_args()
+
+    define_ast(args.output_dir, 'expr.py', "Expr", [
+        "Assign   : name, value | depth, slot",
         "Binary   : left, operator, right",
-        "Call     : callee, paren, arguments",
+        "Call     : callee, paren, arguments | cache_callee, cache_arity, cache_epoch",
         "Grouping : expression",
         "Literal  : value",
         "Logical  : left, operator, right",
         "Unary    : operator, right",
-        "Variable : name"
-    ])
+        "Variable : name | depth, slot"
+    ], slots=not args.plain)
 
-    define_ast('..', 'stmt.py', "Stmt", [
-        "Block      : statements",
+    define_ast(args.output_dir, 'stmt.py', "Stmt", [
+        "Block      : statements | scope_size, captured, frames",
         "Expression : expression",
-        "Function   : name, params, body",
+        "For        : initializer, condition, increment, body | scope_size, captured, frames, counter",
+        "Function   : name, params, body | slot, scope_size, pure_reads, captured",
         "If         : condition, then_branch, else_branch",
         "Print      : expression",
-        "Var        : name, initializer",
+        "Return     : keyword, value",
+        "Var        : name, initializer | slot",
         "While      : condition, body",
-    ])
+    ], slots=not args.plain)
@@ -0,0 +1,838 @@
+"""
+Lox to Python transpiler.
+
+Turns a resolved statement list into a Python ast.Module, compiles it with
+compile() and runs it with exec(), so hot scripts run as ordinary CPython
+bytecode:
+
+* Lox locals become Python locals of the enclosing Python function, renamed
+  to v<N>_<name> so that shadowing and block scoping survive the move to
+  Python's function-level scopes. Locals that an inner function assigns are
+  declared nonlocal there.
+* Lox globals become module globals named L_<name>.
+* Lox functions become Python functions. The top level is wrapped in a
+  function of its own so its block locals are fast locals too.
+* A closure created in a loop must see the variables of *its* iteration, not
+  the last one. Captured locals declared inside a loop are therefore handed
+  to the inner function through keyword-only parameter defaults, and if they
+  are ever reassigned they live in a one-element list (a box) so that every
+  closure sharing them sees the update.
+
+Lox semantics are kept explicitly where Python's differ: truthiness (only
+nil and false are falsey), the number/string checks on operators, and
+runtime errors, which report the Lox line. Python line numbers of the
+generated code are Lox line numbers plus LINE_OFFSET, which lets errors that
+Python raises itself (undefined globals, bad calls, too deep recursion) be
+mapped back to a Lox line from the traceback.
+"""
+import ast
+import hashlib
+import re
+import sys
+import warnings
+from collections import OrderedDict
+from types import FunctionType
+
+from expr import Visitor as ExprVisitor
+from interpreter import GLOBALS, stringify
+from runtime_error import LoxRuntimeError
+from stmt import Visitor as StmtVisitor
+import expr as Expr
+import stmt as Stmt
+from tokens import Token
+from tokentype import TokenType
+
+VERSION = 1
+FILENAME = '<lox>'
+# Python line numbers start at 1, Lox ones at 0
+LINE_OFFSET = 1
+MAIN = '_lox_main'
+CACHE_SIZE = 64
+
+ARITHMETIC_OPS = {
+    TokenType.MINUS: ast.Sub,
+    TokenType.STAR: ast.Mult,
+    TokenType.SLASH: ast.Div,
+}
+
+COMPARISON_OPS = {
+    TokenType.GREATER: ast.Gt,
+    TokenType.GREATER_EQUAL: ast.GtE,
+    TokenType.LESS: ast.Lt,
+    TokenType.LESS_EQUAL: ast.LtE,
+    TokenType.EQUAL_EQUAL: ast.Eq,
+    TokenType.BANG_EQUAL: ast.NotEq,
+}
+
+
+class _Decl():
+    """A local variable (or parameter, or local function) of the Lox program."""
+
+    def __init__(self, name, owner, in_loop, is_function=False):
+        self.name = name
+        self.owner = owner
+        self.in_loop = in_loop
+        self.is_function = is_function
+        self.captured = False
+        self.assigned = False
+        self.py_name = None
+
+    @property
+    def by_default(self):
+        """Passed into inner functions as a keyword-only parameter default."""
+        return self.captured and self.in_loop
+
+    @property
+    def boxed(self):
+        return self.by_default and (self.assigned or self.is_function)
+
+
+class _FunctionInfo():
+    def __init__(self, parent, node):
+        self.parent = parent
+        self.node = node
+        # locals of enclosing functions this one (or a function nested in it) uses
+        self.free = []
+        # locals of enclosing functions this one assigns
+        self.assigned_free = []
+        self.assigned_globals = set()
+        self.params = []
+        self.temp_count = 0
+
+
+class _Analyzer(ExprVisitor, StmtVisitor):
+    """
+    First pass: gives every local a _Decl, links each Variable/Assign/
+    declaration node to it, and records which locals are captured or
+    assigned from inner functions.
+    """
+
+    def __init__(self):
+        self.decls = {}
+        self.functions = {}
+        self.scopes = []
+        self.function = _FunctionInfo(None, None)
+        self.loop_depth = 0
+        self.count = 0
+
+    def analyze(self, statements):
+        for statement in statements:
+            statement.accept(self)
+        return self.function
+
+    def _new_decl(self, name, is_function=False):
+        decl = _Decl(name.lexeme, self.function, self.loop_depth > 0, is_function)
+        self.count += 1
+        decl.py_name = f"v{self.count}_{name.lexeme}"
+        return decl
+
+    def _declare(self, node, slot, is_function=False):
+        if slot is None:
+            self.function.assigned_globals.add('L_' + node.name.lexeme)
+            return
+        decl = self._new_decl(node.name, is_function)
+        self.scopes[-1][slot] = decl
+        self.decls[id(node)] = decl
+
+    def _reference(self, node, assign):
+        if node.depth is None:
+            if assign:
+                self.function.assigned_globals.add('L_' + node.name.lexeme)
+            return
+
+        decl = self.scopes[-1 - node.depth][node.slot]
+        self.decls[id(node)] = decl
+        if assign:
+            decl.assigned = True
+
+        if decl.owner is not self.function:
+            decl.captured = True
+            if assign and decl not in self.function.assigned_free:
+                self.function.assigned_free.append(decl)
+
+            function = self.function
+            while function is not decl.owner:
+                if decl not in function.free:
+                    function.free.append(decl)
+                function = function.parent
+
+    def visit_BlockStmt(self, stmt):
+        # (a block that declares nothing has no scope; see Resolver)
+        if stmt.scope_size:
+            self.scopes.append([None] * stmt.scope_size)
+        for statement in stmt.statements:
+            statement.accept(self)
+        if stmt.scope_size:
+            self.scopes.pop()
+
+    def visit_ExpressionStmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_ForStmt(self, stmt):
+        if stmt.scope_size:
+            self.scopes.append([None] * stmt.scope_size)
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        stmt.condition.accept(self)
+        self.loop_depth += 1
+        stmt.body.accept(self)
+        if stmt.increment is not None:
+            stmt.increment.accept(self)
+        self.loop_depth -= 1
+        if stmt.scope_size:
+            self.scopes.pop()
+
+    def visit_FunctionStmt(self, stmt):
+        self._declare(stmt, stmt.slot, is_function=True)
+
+        enclosing, loop_depth = self.function, self.loop_depth
+        self.function = _FunctionInfo(enclosing, stmt)
+        self.functions[id(stmt)] = self.function
+        self.loop_depth = 0
+
+        scope = [None] * stmt.scope_size
+        for index, param in enumerate(stmt.params):
+            scope[index] = self._new_decl(param)
+        self.function.params = scope[:len(stmt.params)]
+        self.scopes.append(scope)
+        for statement in stmt.body:
+            statement.accept(self)
+        self.scopes.pop()
+
+        self.function, self.loop_depth = enclosing, loop_depth
+
+    def visit_IfStmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_PrintStmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_ReturnStmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_VarStmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        self._declare(stmt, stmt.slot)
+
+    def visit_WhileStmt(self, stmt):
+        stmt.condition.accept(self)
+        self.loop_depth += 1
+        stmt.body.accept(self)
+        self.loop_depth -= 1
+
+    def visit_AssignExpr(self, expr):
+        expr.value.accept(self)
+        self._reference(expr, assign=True)
+
+    def visit_BinaryExpr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_CallExpr(self, expr):
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_GroupingExpr(self, expr):
+        expr.expression.accept(self)
+
+    def visit_LiteralExpr(self, expr):
+        pass
+
+    def visit_LogicalExpr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_UnaryExpr(self, expr):
+        expr.right.accept(self)
+
+    def visit_VariableExpr(self, expr):
+        self._reference(expr, assign=False)
+
+
+def _load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _store(name):
+    return ast.Name(id=name, ctx=ast.Store())
+
+
+def _helper_call(helper, *args):
+    return ast.Call(func=_load(helper), args=list(args), keywords=[])
+
+
+def _type_of(value):
+    return _helper_call('type', value)
+
+
+def _is_type(value, type_name):
+    return ast.Compare(left=_type_of(value), ops=[ast.Is()], comparators=[_load(type_name)])
+
+
+def _is_number(expr):
+    """True if `expr` is statically known to evaluate to a number."""
+    if isinstance(expr, Expr.Grouping):
+        return _is_number(expr.expression)
+    if isinstance(expr, Expr.Literal):
+        return type(expr.value) is float
+    if isinstance(expr, Expr.Binary):
+        return expr.operator.type in ARITHMETIC_OPS
+    if isinstance(expr, Expr.Unary):
+        return expr.operator.type == TokenType.MINUS
+    return False
+
+
+def _is_bool(expr):
+    """True if `expr` is statically known to evaluate to true or false."""
+    if isinstance(expr, Expr.Grouping):
+        return _is_bool(expr.expression)
+    if isinstance(expr, Expr.Literal):
+        return type(expr.value) is bool
+    if isinstance(expr, Expr.Binary):
+        return expr.operator.type in COMPARISON_OPS
+    if isinstance(expr, Expr.Unary):
+        return expr.operator.type == TokenType.BANG
+    return False
+
+
+class Transpiler(ExprVisitor, StmtVisitor):
+    """Second pass: emits the Python AST using what _Analyzer found."""
+
+    def transpile(self, statements):
+        analyzer = _Analyzer()
+        self.main = analyzer.analyze(statements)
+        self.decls = analyzer.decls
+        self.functions = analyzer.functions
+        self.function = self.main
+        self.line = 0
+        self.arities = {}
+        # globals that a preceding top-level declaration has already defined
+        self.defined_globals = set()
+
+        body = self._function_prologue(self.main)
+        for statement in statements:
+            body.extend(statement.accept(self))
+            if isinstance(statement, (Stmt.Var, Stmt.Function)):
+                self.defined_globals.add('L_' + statement.name.lexeme)
+        main = ast.FunctionDef(
+            name=MAIN, args=self._arguments([], self.main), body=body or [ast.Pass()],
+            decorator_list=[], returns=None, lineno=LINE_OFFSET)
+        arities = ast.Assign(
+            targets=[_store('_ARITY')],
+            value=ast.Dict(
+                keys=[ast.Constant(name) for name in self.arities],
+                values=[ast.Constant(arity) for arity in self.arities.values()]),
+            lineno=LINE_OFFSET)
+
+        module = ast.Module(body=[arities, main], type_ignores=[])
+        return ast.fix_missing_locations(module)
+
+    # -- helpers --------------------------------------------------------
+
+    def _at(self, token):
+        self.line = token.line
+
+    def _locate(self, node):
+        node.lineno = node.end_lineno = self.line + LINE_OFFSET
+        node.col_offset = node.end_col_offset = 0
+        return node
+
+    def _is_defined_global(self, name):
+        # top-level code runs in order, so a global declared by an earlier
+        # top-level statement exists; function bodies may run at any time
+        return self.function is self.main and name in self.defined_globals
+
+    def _temp(self):
+        self.function.temp_count += 1
+        return f"_t{self.function.temp_count}"
+
+    def _fail(self, helper, line):
+        return _helper_call(helper, ast.Constant(line))
+
+    def _function_prologue(self, function):
+        prologue = []
+        if function.assigned_globals:
+            prologue.append(ast.Global(names=sorted(function.assigned_globals)))
+        nonlocals = [decl.py_name for decl in function.assigned_free if not decl.by_default]
+        if nonlocals:
+            prologue.append(ast.Nonlocal(names=nonlocals))
+        return prologue
+
+    def _arguments(self, params, function):
+        defaults = [decl for decl in function.free if decl.by_default]
+        return ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg=decl.py_name) for decl in params],
+            vararg=None,
+            kwonlyargs=[ast.arg(arg=decl.py_name) for decl in defaults],
+            kw_defaults=[_load(decl.py_name) for decl in defaults],
+            kwarg=None,
+            defaults=[])
+
+    def _block(self, statements):
+        body = []
+        for statement in statements:
+            body.extend(statement.accept(self))
+        return body
+
+    def _body(self, stmt):
+        return self._block([stmt]) or [ast.Pass()]
+
+    def _expr(self, expr):
+        return expr.accept(self)
+
+    def _truthy(self, expr):
+        """A Python expression that is true when `expr` is Lox-truthy."""
+        if _is_bool(expr):
+            return self._expr(expr)
+
+        temp = self._temp()
+        return ast.BoolOp(op=ast.And(), values=[
+            ast.Compare(
+                left=ast.NamedExpr(target=_store(temp), value=self._expr(expr)),
+                ops=[ast.IsNot()], comparators=[ast.Constant(None)]),
+            ast.Compare(left=_load(temp), ops=[ast.IsNot()], comparators=[ast.Constant(False)]),
+        ])
+
+    def _checked_operand(self, expr):
+        """
+        Returns (load, check) for an operand that has to be a number: `check`
+        evaluates it into a temporary and tests its type, `load` reads the
+        temporary back. Number literals need neither.
+        """
+        if isinstance(expr, Expr.Literal) and type(expr.value) is float:
+            return ast.Constant(expr.value), None
+
+        temp = self._temp()
+        return _load(temp), _is_type(ast.NamedExpr(target=_store(temp), value=self._expr(expr)), 'float')
+
+    def _checked(self, left, right, result, helper, line):
+        """`result(l, r) if l and r are numbers else helper(line)`."""
+        left_load, left_check = self._checked_operand(left)
+        right_load, right_check = self._checked_operand(right)
+        value = result(left_load, right_load)
+
+        checks = [check for check in (left_check, right_check) if check is not None]
+        if not checks:
+            return value
+        # '&' rather than 'and' so the right operand is always evaluated
+        test = checks[0] if len(checks) == 1 else ast.BinOp(left=checks[0], op=ast.BitAnd(), right=checks[1])
+        return ast.IfExp(test=test, body=value, orelse=self._fail(helper, line))
+
+    # -- statements -----------------------------------------------------
+
+    def visit_BlockStmt(self, stmt):
+        return self._block(stmt.statements)
+
+    def visit_ExpressionStmt(self, stmt):
+        expression = stmt.expression
+        while isinstance(expression, Expr.Grouping):
+            expression = expression.expression
+
+        if isinstance(expression, Expr.Assign):
+            return self._assign_statement(expression)
+        return [self._locate(ast.Expr(value=self._expr(expression)))]
+
+    def visit_FunctionStmt(self, stmt):
+        self._at(stmt.name)
+        function = self.functions[id(stmt)]
+        decl = self.decls.get(id(stmt))
+
+        enclosing = self.function
+        self.function = function
+        body = self._function_prologue(function) + self._block(stmt.body)
+        self.function = enclosing
+
+        if decl is None:
+            name = 'L_' + stmt.name.lexeme
+        elif decl.boxed:
+            name = 'd' + decl.py_name[1:]
+        else:
+            name = decl.py_name
+        self.arities[name] = len(stmt.params)
+
+        self._at(stmt.name)
+        statements = []
+        if decl is not None and decl.boxed:
+            # the box has to exist before the def so recursive calls can use it
+            statements.append(self._locate(ast.Assign(
+                targets=[_store(decl.py_name)], value=ast.List(elts=[ast.Constant(None)], ctx=ast.Load()))))
+
+        statements.append(self._locate(ast.FunctionDef(
+            name=name, args=self._arguments(function.params, function),
+            body=body or [ast.Pass()], decorator_list=[], returns=None)))
+
+        if decl is not None and decl.boxed:
+            statements.append(self._locate(ast.Assign(
+                targets=[ast.Subscript(value=_load(decl.py_name), slice=ast.Constant(0), ctx=ast.Store())],
+                value=_load(name))))
+        return statements
+
+    def visit_IfStmt(self, stmt):
+        test = self._truthy(stmt.condition)
+        node = self._locate(ast.If(test=test, body=self._body(stmt.then_branch), orelse=[]))
+        if stmt.else_branch is not None:
+            node.orelse = self._body(stmt.else_branch)
+        return [node]
+
+    def visit_PrintStmt(self, stmt):
+        value = _helper_call('_stringify', self._expr(stmt.expression))
+        return [self._locate(ast.Expr(value=_helper_call('print', value)))]
+
+    def visit_ReturnStmt(self, stmt):
+        self._at(stmt.keyword)
+        value = ast.Constant(None) if stmt.value is None else self._expr(stmt.value)
+        return [self._locate(ast.Return(value=value))]
+
+    def visit_VarStmt(self, stmt):
+        self._at(stmt.name)
+        value = ast.Constant(None) if stmt.initializer is None else self._expr(stmt.initializer)
+
+        decl = self.decls.get(id(stmt))
+        if decl is None:
+            name = 'L_' + stmt.name.lexeme
+        else:
+            name = decl.py_name
+            if decl.boxed:
+                value = ast.List(elts=[value], ctx=ast.Load())
+
+        self._at(stmt.name)
+        return [self._locate(ast.Assign(targets=[_store(name)], value=value))]
+
+    def visit_ForStmt(self, stmt):
+        statements = [] if stmt.initializer is None else stmt.initializer.accept(self)
+        test = self._truthy(stmt.condition)
+        body = self._block([stmt.body])
+        if stmt.increment is not None:
+            body.extend(self.visit_ExpressionStmt(Stmt.Expression(stmt.increment)))
+        statements.append(self._locate(ast.While(test=test, body=body or [ast.Pass()], orelse=[])))
+        return statements
+
+    def visit_WhileStmt(self, stmt):
+        test = self._truthy(stmt.condition)
+        return [self._locate(ast.While(test=test, body=self._body(stmt.body), orelse=[]))]
+
+    # -- expressions ----------------------------------------------------
+
+    def _assign_statement(self, expr):
+        value = self._expr(expr.value)
+        self._at(expr.name)
+        decl = self.decls.get(id(expr))
+
+        if decl is None:
+            name = 'L_' + expr.name.lexeme
+            if self._is_defined_global(name):
+                return [self._locate(ast.Assign(targets=[_store(name)], value=value))]
+
+            temp = self._temp()
+            return [
+                self._locate(ast.Assign(targets=[_store(temp)], value=value)),
+                self._locate(ast.If(
+                    test=ast.Compare(left=ast.Constant(name), ops=[ast.NotIn()], comparators=[_load('_G')]),
+                    body=[ast.Expr(value=_helper_call('_undefined', ast.Constant(name), ast.Constant(self.line)))],
+                    orelse=[])),
+                self._locate(ast.Assign(targets=[_store(name)], value=_load(temp))),
+            ]
+
+        if decl.boxed:
+            target = ast.Subscript(value=_load(decl.py_name), slice=ast.Constant(0), ctx=ast.Store())
+        else:
+            target = _store(decl.py_name)
+        return [self._locate(ast.Assign(targets=[target], value=value))]
+
+    def visit_AssignExpr(self, expr):
+        value = self._expr(expr.value)
+        self._at(expr.name)
+        decl = self.decls.get(id(expr))
+
+        if decl is None:
+            name = 'L_' + expr.name.lexeme
+            if self._is_defined_global(name):
+                return ast.NamedExpr(target=_store(name), value=value)
+            checked = _helper_call('_defined', value, ast.Constant(name), ast.Constant(self.line))
+            return ast.NamedExpr(target=_store(name), value=checked)
+        if decl.boxed:
+            return _helper_call('_box_set', _load(decl.py_name), value)
+        return ast.NamedExpr(target=_store(decl.py_name), value=value)
+
+    def visit_BinaryExpr(self, expr):
+        op_type = expr.operator.type
+
+        if op_type in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            left = self._expr(expr.left)
+            right = self._expr(expr.right)
+            self._at(expr.operator)
+            return ast.Compare(left=left, ops=[COMPARISON_OPS[op_type]()], comparators=[right])
+
+        self._at(expr.operator)
+        line = self.line
+
+        if op_type in ARITHMETIC_OPS:
+            result = lambda l, r: ast.BinOp(left=l, op=ARITHMETIC_OPS[op_type](), right=r)
+            return self._checked(expr.left, expr.right, result, '_numbers_error', line)
+
+        if op_type in COMPARISON_OPS:
+            result = lambda l, r: ast.Compare(left=l, ops=[COMPARISON_OPS[op_type]()], comparators=[r])
+            return self._checked(expr.left, expr.right, result, '_numbers_error', line)
+
+        if op_type == TokenType.PLUS:
+            result = lambda l, r: ast.BinOp(left=l, op=ast.Add(), right=r)
+            if _is_number(expr.left) or _is_number(expr.right):
+                # if either side is a number, both have to be
+                return self._checked(expr.left, expr.right, result, '_plus_error', line)
+            return self._plus(expr.left, expr.right, result, line)
+
+        return ast.Constant(None)
+
+    def _plus(self, left, right, result, line):
+        # (l + r) if type(l) is type(r) and (type(l) is float or type(l) is str) else error
+        left_temp, right_temp = self._temp(), self._temp()
+        same_type = ast.Compare(
+            left=_type_of(ast.NamedExpr(target=_store(left_temp), value=self._expr(left))),
+            ops=[ast.Is()],
+            comparators=[_type_of(ast.NamedExpr(target=_store(right_temp), value=self._expr(right)))])
+        supported = ast.BoolOp(op=ast.Or(), values=[
+            _is_type(_load(left_temp), 'float'),
+            _is_type(_load(left_temp), 'str'),
+        ])
+        return ast.IfExp(
+            test=ast.BoolOp(op=ast.And(), values=[same_type, supported]),
+            body=result(_load(left_temp), _load(right_temp)),
+            orelse=self._fail('_plus_error', line))
+
+    def visit_CallExpr(self, expr):
+        callee = self._expr(expr.callee)
+        arguments = [self._expr(argument) for argument in expr.arguments]
+        self._at(expr.paren)
+        return self._locate(ast.Call(func=callee, args=arguments, keywords=[]))
+
+    def visit_GroupingExpr(self, expr):
+        return self._expr(expr.expression)
+
+    def visit_LiteralExpr(self, expr):
+        return ast.Constant(expr.value)
+
+    def visit_LogicalExpr(self, expr):
+        left = self._expr(expr.left)
+        right = self._expr(expr.right)
+        temp = self._temp()
+        truthy = ast.BoolOp(op=ast.And(), values=[
+            ast.Compare(
+                left=ast.NamedExpr(target=_store(temp), value=left),
+                ops=[ast.IsNot()], comparators=[ast.Constant(None)]),
+            ast.Compare(left=_load(temp), ops=[ast.IsNot()], comparators=[ast.Constant(False)]),
+        ])
+        if expr.operator.type == TokenType.OR:
+            return ast.IfExp(test=truthy, body=_load(temp), orelse=right)
+        return ast.IfExp(test=truthy, body=right, orelse=_load(temp))
+
+    def visit_UnaryExpr(self, expr):
+        right = expr.right
+        self._at(expr.operator)
+        line = self.line
+
+        if expr.operator.type == TokenType.MINUS:
+            if _is_number(right):
+                return ast.UnaryOp(op=ast.USub(), operand=self._expr(right))
+
+            temp = self._temp()
+            return ast.IfExp(
+                test=_is_type(ast.NamedExpr(target=_store(temp), value=self._expr(right)), 'float'),
+                body=ast.UnaryOp(op=ast.USub(), operand=_load(temp)),
+                orelse=self._fail('_number_error', line))
+
+        if _is_bool(right):
+            return ast.UnaryOp(op=ast.Not(), operand=self._expr(right))
+        temp = self._temp()
+        return ast.BoolOp(op=ast.Or(), values=[
+            ast.Compare(
+                left=ast.NamedExpr(target=_store(temp), value=self._expr(right)),
+                ops=[ast.Is()], comparators=[ast.Constant(None)]),
+            ast.Compare(left=_load(temp), ops=[ast.Is()], comparators=[ast.Constant(False)]),
+        ])
+
+    def visit_VariableExpr(self, expr):
+        self._at(expr.name)
+        decl = self.decls.get(id(expr))
+        if decl is None:
+            return self._locate(_load('L_' + expr.name.lexeme))
+        if decl.boxed:
+            return ast.Subscript(value=_load(decl.py_name), slice=ast.Constant(0), ctx=ast.Load())
+        return _load(decl.py_name)
+
+
+# -- runtime support ------------------------------------------------------
+
+def _error(line, message):
+    return LoxRuntimeError(Token(TokenType.EOF, "", None, line), message)
+
+
+def _numbers_error(line):
+    raise _error(line, "Operands must be numbers.")
+
+
+def _plus_error(line):
+    raise _error(line, "Operands must be two numbers or two strings")
+
+
+def _number_error(line):
+    raise _error(line, "Operand must be a number")
+
+
+def _undefined(name, line):
+    raise _error(line, "Undefined variable '{}'.".format(name[2:]))
+
+
+def _box_set(box, value):
+    box[0] = value
+    return value
+
+
+def _lox_stringify(obj):
+    if type(obj) is FunctionType:
+        if obj.__name__.startswith('native_'):
+            return "<native fn>"
+        return f"<fn {obj.__name__.split('_', 1)[1]} >"
+    return stringify(obj)
+
+
+def _native(native):
+    arity = native.arity()
+
+    def native_(*args):
+        if len(args) != arity:
+            raise TypeError(f"native_() takes {arity} positional arguments but {len(args)} were given")
+        return native.call(None, list(args))
+    return native_
+
+
+def _namespace():
+    namespace = {
+        '_stringify': _lox_stringify,
+        '_numbers_error': _numbers_error,
+        '_plus_error': _plus_error,
+        '_number_error': _number_error,
+        '_undefined': _undefined,
+        '_box_set': _box_set,
+    }
+    namespace['_G'] = namespace
+
+    def _defined(value, name, line):
+        if name not in namespace:
+            _undefined(name, line)
+        return value
+    namespace['_defined'] = _defined
+
+    for name, native in GLOBALS.items():
+        namespace['L_' + name] = _native(native())
+    return namespace
+
+
+def _lox_line(traceback):
+    line = None
+    while traceback is not None:
+        if traceback.tb_frame.f_code.co_filename == FILENAME:
+            line = traceback.tb_lineno - LINE_OFFSET
+        traceback = traceback.tb_next
+    return line
+
+
+_MISSING = re.compile(r"^(?:[\w<>]+\.)*(\w+)\(\) missing (\d+) required positional")
+_TOO_MANY = re.compile(r"^[\w.<>]+\(\) takes (\d+) positional arguments? but (\d+) (?:was|were) given")
+
+
+def _translate(error, namespace):
+    """Turns an exception Python raised inside generated code into a Lox one."""
+    line = _lox_line(error.__traceback__)
+    if line is None:
+        return None
+
+    if isinstance(error, NameError) and error.name and error.name.startswith('L_'):
+        return _error(line, "Undefined variable '{}'.".format(error.name[2:]))
+
+    if isinstance(error, RecursionError):
+        return _error(line, "Stack overflow.")
+
+    if isinstance(error, TypeError):
+        message = str(error)
+        if message.endswith("object is not callable"):
+            return _error(line, "Can only call functions and classes.")
+
+        too_many = _TOO_MANY.match(message)
+        if too_many:
+            return _error(line, "Expected {} arguments but got {}.".format(*too_many.groups()))
+
+        missing = _MISSING.match(message)
+        if missing and missing.group(1) in namespace['_ARITY']:
+            arity = namespace['_ARITY'][missing.group(1)]
+            return _error(line, "Expected {} arguments but got {}.".format(arity, arity - int(missing.group(2))))
+
+    return None
+
+
+# -- entry points ---------------------------------------------------------
+
+_code_cache = OrderedDict()
+
+
+def compile_program(statements):
+    """Transpiles a resolved statement list into a Python code object."""
+    module = Transpiler().transpile(statements)
+    with warnings.catch_warnings():
+        # e.g. "'str' object is not callable" - that is a Lox runtime error
+        warnings.simplefilter('ignore', SyntaxWarning)
+        return compile(module, FILENAME, 'exec')
+
+
+def _cache_key(source, optimize):
+    # (`source` is a str, or its UTF-8 bytes, such as an mmap)
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    digest = hashlib.sha256(f"{VERSION}:{int(optimize)}:".encode('utf-8'))
+    digest.update(source)
+    return digest.digest()
+
+
+def cached_code(source, optimize):
+    """
+    The code object previously compiled in this process for `source`, or
+    None. (Across runs, loxc keeps it in a .loxpyc file.)
+    """
+    key = _cache_key(source, optimize)
+    code = _code_cache.get(key)
+    if code is not None:
+        _code_cache.move_to_end(key)
+    return code
+
+
+def cache_code(source, optimize, code):
+    _code_cache[_cache_key(source, optimize)] = code
+    if len(_code_cache) > CACHE_SIZE:
+        _code_cache.popitem(last=False)
+
+
+def execute(code):
+    from main import run_time_error
+
+    namespace = _namespace()
+    try:
+        exec(code, namespace)
+        namespace[MAIN]()
+    except LoxRuntimeError as e:
+        run_time_error(e)
+    except (NameError, TypeError, RecursionError) as e:
+        lox_error = _translate(e, namespace)
+        if lox_error is None:
+            raise
+        run_time_error(lox_error)
+
+
+def dump(statements, out=sys.stdout):
+    """Prints the generated Python source, for debugging."""
+    out.write(ast.unparse(Transpiler().transpile(statements)) + '\n')
@@ -0,0 +1,339 @@
+from bytecode import *
+from interpreter import GLOBALS, stringify
+from lox_callable import LoxCallable
+from output import OutputSink
+from runtime_error import LoxRuntimeError
+from tokens import Token
+from tokentype import TokenType
+
+# Lox calls never recurse in Python, so call depth is only limited by how much
+# memory the frames and value stack may use. The estimate counts one CallFrame
+# per call plus, per stack value, its list slot and a share of the (usually
+# boxed) value; calibrated with tracemalloc in bench/bench_recursion.py.
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+FRAME_BYTES = 96
+SLOT_BYTES = 16
+
+
+class Closure():
+    def __init__(self, function):
+        self.function = function
+        self.upvalues = [None] * function.upvalue_count
+
+    def __repr__(self):
+        return repr(self.function)
+
+
+class Upvalue():
+    """
+    A captured variable. While the variable is still on the stack `index`
+    points at it; once it goes out of scope the value moves into `value`
+    and `index` becomes None.
+    """
+    __slots__ = ('index', 'value')
+
+    def __init__(self, index):
+        self.index = index
+        self.value = None
+
+
+class CallFrame():
+    __slots__ = ('closure', 'ip', 'base')
+
+    def __init__(self, closure, ip, base):
+        self.closure = closure
+        self.ip = ip
+        self.base = base
+
+
+class VM():
+    """Runs the bytecode produced by compiler.Compiler on a value stack."""
+
+    def __init__(self, memory_budget=None, output=None):
+        """
+        `memory_budget` is roughly how many bytes of frames and stack a
+        program may use (None for DEFAULT_MEMORY_BUDGET). `output` is the
+        output.OutputSink `print` writes to.
+        """
+        self.stack = []
+        self.frames = []
+        self.open_upvalues = {}
+        self.globals = {}
+        self.memory_budget = DEFAULT_MEMORY_BUDGET if memory_budget is None else memory_budget
+        self.output = OutputSink() if output is None else output
+
+        for name, native in GLOBALS.items():
+            self.globals[name] = native()
+
+    def interpret(self, function, flush=True):
+        """
+        Runs the script `function`; False if a runtime error stopped it. What
+        it printed is flushed when it ends, unless `flush` is false because
+        more of the program follows (see main.run_stream).
+        """
+        from main import run_time_error
+
+        self.stack = [Closure(function)]
+        self.frames = [CallFrame(self.stack[0], 0, 0)]
+        try:
+            self._run()
+        except LoxRuntimeError as e:
+            self.stack.clear()
+            self.frames.clear()
+            self.open_upvalues.clear()
+            self.output.flush()
+            run_time_error(e)
+            return False
+        finally:
+            if flush:
+                self.output.flush()
+        return True
+
+    def _runtime_error(self, frame, ip, message):
+        line = frame.closure.function.chunk.lines[ip - 1]
+        return LoxRuntimeError(Token(TokenType.EOF, "", None, line), message)
+
+    def _call_native(self, callee, arg_count, frame, ip):
+        """Calls anything other than a Closure, replacing it and its arguments with the result."""
+        stack = self.stack
+        if not isinstance(callee, LoxCallable):
+            raise self._runtime_error(frame, ip, "Can only call functions and classes.")
+        if arg_count != callee.arity():
+            raise self._runtime_error(
+                frame, ip, f"Expected {callee.arity()} arguments but got {arg_count}.")
+        args = stack[len(stack) - arg_count:]
+        del stack[len(stack) - arg_count - 1:]
+        stack.append(callee.call(self, args))
+
+    def _capture_upvalue(self, index):
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.open_upvalues[index] = Upvalue(index)
+        return upvalue
+
+    def _close_upvalues(self, last):
+        stack = self.stack
+        for index in [index for index in self.open_upvalues if index >= last]:
+            upvalue = self.open_upvalues.pop(index)
+            upvalue.value = stack[index]
+            upvalue.index = None
+
+    def _run(self):
+        stack = self.stack
+        frames = self.frames
+        push = stack.append
+        pop = stack.pop
+        globals_ = self.globals
+        memory_budget = self.memory_budget
+        write_line = self.output.write_line
+
+        frame = frames[-1]
+        closure = frame.closure
+        code = closure.function.chunk.code
+        constants = closure.function.chunk.constants
+        ip = frame.ip
+        base = frame.base
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            # roughly ordered by how often each instruction runs
+            if op == OP_GET_LOCAL:
+                push(stack[base + code[ip]])
+                ip += 1
+            elif op == OP_CONSTANT:
+                push(constants[(code[ip] << 8) | code[ip + 1]])
+                ip += 2
+            elif op == OP_GET_GLOBAL:
+                name = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                try:
+                    push(globals_[name])
+                except KeyError:
+                    raise self._runtime_error(frame, ip, f"Undefined variable '{name}'.")
+            elif op == OP_POP:
+                pop()
+            elif op == OP_JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += ((code[ip] << 8) | code[ip + 1]) + 2
+                else:
+                    ip += 2
+            elif op == OP_LOOP:
+                ip -= ((code[ip] << 8) | code[ip + 1]) - 2
+            elif op == OP_JUMP:
+                ip += ((code[ip] << 8) | code[ip + 1]) + 2
+            elif op == OP_SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == OP_ADD:
+                right = pop()
+                left = stack[-1]
+                if type(left) is float and type(right) is float:
+                    stack[-1] = left + right
+                elif type(left) is str and type(right) is str:
+                    stack[-1] = left + right
+                else:
+                    raise self._runtime_error(frame, ip, "Operands must be two numbers or two strings")
+            elif op == OP_SUBTRACT:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left - right
+            elif op == OP_LESS:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left < right
+            elif op == OP_CALL:
+                arg_count = code[ip]
+                ip += 1
+                callee = stack[-1 - arg_count]
+                if type(callee) is Closure:
+                    function = callee.function
+                    if arg_count != function.arity:
+                        raise self._runtime_error(
+                            frame, ip, f"Expected {function.arity} arguments but got {arg_count}.")
+                    if len(frames) * FRAME_BYTES + len(stack) * SLOT_BYTES > memory_budget:
+                        raise self._runtime_error(frame, ip, "Stack overflow.")
+
+                    frame.ip = ip
+                    frame = CallFrame(callee, 0, len(stack) - arg_count - 1)
+                    frames.append(frame)
+                    closure = callee
+                    code = function.chunk.code
+                    constants = function.chunk.constants
+                    ip = 0
+                    base = frame.base
+                else:
+                    self._call_native(callee, arg_count, frame, ip)
+            elif op == OP_TAIL_CALL:
+                arg_count = code[ip]
+                ip += 1
+                callee = stack[-1 - arg_count]
+                if type(callee) is Closure:
+                    function = callee.function
+                    if arg_count != function.arity:
+                        raise self._runtime_error(
+                            frame, ip, f"Expected {function.arity} arguments but got {arg_count}.")
+
+                    # slide the callee and its arguments down over this frame's slots
+                    if self.open_upvalues:
+                        self._close_upvalues(base)
+                    stack[base:] = stack[len(stack) - arg_count - 1:]
+                    frame.closure = closure = callee
+                    code = function.chunk.code
+                    constants = function.chunk.constants
+                    ip = 0
+                else:
+                    self._call_native(callee, arg_count, frame, ip)
+            elif op == OP_RETURN:
+                result = pop()
+                if self.open_upvalues:
+                    self._close_upvalues(base)
+                frames.pop()
+                if not frames:
+                    pop()
+                    return
+
+                del stack[base:]
+                push(result)
+                frame = frames[-1]
+                closure = frame.closure
+                code = closure.function.chunk.code
+                constants = closure.function.chunk.constants
+                ip = frame.ip
+                base = frame.base
+            elif op == OP_GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                push(upvalue.value if upvalue.index is None else stack[upvalue.index])
+            elif op == OP_SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                ip += 1
+                if upvalue.index is None:
+                    upvalue.value = stack[-1]
+                else:
+                    stack[upvalue.index] = stack[-1]
+            elif op == OP_SET_GLOBAL:
+                name = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                if name not in globals_:
+                    raise self._runtime_error(frame, ip, f"Undefined variable '{name}'.")
+                globals_[name] = stack[-1]
+            elif op == OP_MULTIPLY:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left * right
+            elif op == OP_DIVIDE:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left / right
+            elif op == OP_GREATER:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left > right
+            elif op == OP_LESS_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left <= right
+            elif op == OP_GREATER_EQUAL:
+                right = pop()
+                left = stack[-1]
+                if type(left) is not float or type(right) is not float:
+                    raise self._runtime_error(frame, ip, "Operands must be numbers.")
+                stack[-1] = left >= right
+            elif op == OP_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == OP_NOT_EQUAL:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == OP_NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == OP_NEGATE:
+                if type(stack[-1]) is not float:
+                    raise self._runtime_error(frame, ip, "Operand must be a number")
+                stack[-1] = -stack[-1]
+            elif op == OP_NIL:
+                push(None)
+            elif op == OP_TRUE:
+                push(True)
+            elif op == OP_FALSE:
+                push(False)
+            elif op == OP_PRINT:
+                write_line(stringify(pop()))
+            elif op == OP_DEFINE_GLOBAL:
+                globals_[constants[(code[ip] << 8) | code[ip + 1]]] = pop()
+                ip += 2
+            elif op == OP_CLOSURE:
+                function = constants[(code[ip] << 8) | code[ip + 1]]
+                ip += 2
+                new_closure = Closure(function)
+                push(new_closure)
+                upvalues = new_closure.upvalues
+                for i in range(function.upvalue_count):
+                    is_local = code[ip]
+                    index = code[ip + 1]
+                    ip += 2
+                    if is_local:
+                        upvalues[i] = self._capture_upvalue(base + index)
+                    else:
+                        upvalues[i] = closure.upvalues[index]
+            elif op == OP_CLOSE_UPVALUE:
+                self._close_upvalues(len(stack) - 1)
+                pop()
+            else:
+                raise self._runtime_error(frame, ip, f"Unknown opcode {op}.")